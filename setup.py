@@ -20,6 +20,6 @@ setup(
     install_requires=install_requires,
     entry_points='''
         [console_scripts]
-        wa-cli=wa_cli:entry_point
+        wa-cli=wa_cli:main
     ''',
 )
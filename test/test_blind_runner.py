@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+
+from wa_cli.commands.wa_testing import blind_runner
+
+
+def test_metrics():
+    golden = np.array(['a', 'a', 'b', 'b', 'c'])
+    predicted = np.array(['a', 'b', 'b', 'b', 'a'])
+    result = blind_runner.metrics(golden, predicted)
+    assert list(result.labels) == ['a', 'b', 'c']
+    assert result.accuracy == 0.6
+    assert result.confusion.tolist() == [[1, 1, 0], [0, 2, 0], [1, 0, 0]]
+    assert result.precision.tolist() == [0.5, 2 / 3, 0.0]
+    assert result.recall.tolist() == [0.5, 1.0, 0.0]
+    assert result.support.tolist() == [2, 2, 1]
+
+
+def test_label():
+    labels = blind_runner.label(np.array(['a', '', 'b']), np.array([0.9, 1.0, 0.1]), 0.2)
+    assert labels.tolist() == ['a', blind_runner.OFFTOPIC_LABEL, blind_runner.OFFTOPIC_LABEL]
+
+
+def test_read_input(tmp_path):
+    input_file = tmp_path / 'input.csv'
+    input_file.write_text('utterance,golden intent\nhello,greet\n\n"yes, please",confirm\nweather?\n', encoding='utf-8')
+    assert blind_runner.read_input(str(input_file)) == [('hello', 'greet'), ('yes, please', 'confirm'),
+                                                        ('weather?', '')]
+
+
+def test_out_rows_in_input_order():
+    async def send(body):
+        text = body['input']['text']
+        await asyncio.sleep(0.01 if text == 'hello' else 0)
+        return {'intents': [{'intent': 'greet', 'confidence': 0.9 if text == 'hello' else 0.1}],
+                'entities': [], 'output': {'text': ['Hi']}}
+    rows = [('hello', 'greet'), ('weather?', '')]
+    results = asyncio.run(blind_runner.classify([utterance for utterance, _ in rows], send, 2))
+    out = blind_runner.out_rows(rows, results, 0.2)
+    assert [row['score'] for row in out] == [1, 1]
+    assert out[1][blind_runner.PREDICTED_INTENT_COLUMN] == 'greet'
+    result, predicted = blind_runner.out_metrics(out, 0.2)
+    assert predicted.tolist() == ['greet', blind_runner.OFFTOPIC_LABEL]
+    assert result.accuracy == 1.0
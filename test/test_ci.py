@@ -0,0 +1,71 @@
+import textwrap
+
+from wa_cli.commands import ci
+from wa_cli.commands.helpers import cfg, git
+from wa_cli.commands.sandbox import Sandbox
+from wa_cli.commands.wa.standin import StandIn
+from wa_cli.commands.wa.wa import Service
+
+# Stands in for WA-Testing-Tool's dialog_test/flowtest.py: logs how many of them are running when it starts
+FLOWTEST = textwrap.dedent('''
+    import os, sys, time
+    running = os.path.join(os.environ['RUNNING_FOLDER'], str(os.getpid()))
+    open(running, 'w').close()
+    with open(os.path.join(os.environ['RUNNING_FOLDER'], '..', 'running.log'), 'a') as log:
+        log.write(f'{len(os.listdir(os.environ["RUNNING_FOLDER"]))}\\n')
+    time.sleep(0.3)
+    os.remove(running)
+''')
+
+
+def make_project(tmp_path, monkeypatch, skill_names, files_per_skill=0):
+    scripts_folder = tmp_path / 'WA-Testing-Tool'
+    (scripts_folder / 'dialog_test').mkdir(parents=True)
+    (scripts_folder / 'dialog_test' / 'flowtest.py').write_text(FLOWTEST, encoding='utf-8')
+    (tmp_path / 'running').mkdir()
+    monkeypatch.setenv('RUNNING_FOLDER', str(tmp_path / 'running'))
+    monkeypatch.setattr(cfg, 'test_scripts_folder', lambda: str(scripts_folder))
+    monkeypatch.setattr(cfg, 'test_folder', lambda: str(tmp_path / 'test'))
+    monkeypatch.setattr(cfg, 'main_branch', lambda: 'main')
+    monkeypatch.setattr(git, 'current_branch', lambda: 'feature')
+    for skill_name in skill_names:
+        flow_folder = tmp_path / 'test' / 'flow' / skill_name
+        flow_folder.mkdir(parents=True)
+        for number in range(files_per_skill):
+            (flow_folder / f'flow{number}.tsv').write_text('', encoding='utf-8')
+
+
+def test_flowtest_processes_share_the_jobs(tmp_path, monkeypatch):
+    skill_names = ['Farewells', 'Greetings', 'Orders']
+    make_project(tmp_path, monkeypatch, skill_names, files_per_skill=3)
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        for skill_name in skill_names:
+            service.create_workspace(name=f'feature__{skill_name}')
+        assert ci.Pipeline('key', server.url, jobs=2).test()
+    finally:
+        server.shutdown()
+    running = [int(line) for line in (tmp_path / 'running.log').read_text().split()]
+    assert len(running) == 9
+    assert max(running) <= 2
+
+
+def test_cleanup_after_a_failed_deploy(tmp_path, monkeypatch):
+    make_project(tmp_path, monkeypatch, ['Greetings'])
+
+    def failing_push(self):
+        # Part of the skill has been deployed when it fails
+        Service(self.apikey, self.url).create_workspace(name=self.sandbox_name)
+        raise RuntimeError('Deploy failed')
+
+    monkeypatch.setattr(Sandbox, 'push', failing_push)
+    server = StandIn(training_delay=0).start()
+    try:
+        pipeline = ci.Pipeline('key', server.url, jobs=2)
+        assert pipeline.run(timeout=10, deploy_main=False, cleanup=True) == 1
+        assert Service('key', server.url).list_workspaces().get_result()['workspaces'] == []
+    finally:
+        server.shutdown()
+    assert [(timing['stage'], timing['success']) for timing in pipeline.timings] == \
+        [('deploy', False), ('cleanup', True)]
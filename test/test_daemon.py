@@ -0,0 +1,137 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from wa_cli import _command_name
+from wa_cli.commands.helpers import daemon
+from wa_cli.commands.wa import wa
+
+CLIENT = 'from wa_cli import main; main()'
+
+
+def run_git(*args, cwd):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def project(tmp_path):
+    folder = tmp_path / 'project'
+    (folder / '.wa-cli').mkdir(parents=True)
+    (folder / '.wa-cli' / 'main_branch.txt').write_text('main')
+    (folder / '.env').write_text('WA_APIKEY=key\nWA_URL=http://127.0.0.1:1\n')
+    (folder / 'sub').mkdir()
+    run_git('init', '-q', '-b', 'main', cwd=folder)
+    run_git('commit', '-q', '--allow-empty', '-m', 'first', cwd=folder)
+    return str(folder)
+
+
+@pytest.fixture
+def running_daemon(project):
+    process = subprocess.Popen([sys.executable, '-c', CLIENT, 'daemon', 'start', '--foreground'],
+                               cwd=project, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + daemon.START_TIMEOUT
+    while not daemon.request(project, {'command': 'status'}):
+        assert time.time() < deadline and process.poll() is None, 'The daemon did not start'
+        time.sleep(0.05)
+    yield process
+    daemon.request(project, {'command': 'stop'})
+    try:
+        process.wait(5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        raise
+
+
+def test_commands_run_in_the_daemon(project, running_daemon):
+    folder = os.path.join(project, 'sub')
+    result = subprocess.run([sys.executable, '-c', CLIENT, 'env'], cwd=folder,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 0
+    assert b'Enable command completion' in result.stdout
+    result = subprocess.run([sys.executable, '-c', CLIENT, 'skill', 'nosuch'], cwd=folder,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 2
+    assert b'No such command' in result.stderr
+    status = daemon.request(project, {'command': 'status'})
+    assert status['pid'] == running_daemon.pid
+    assert status['commands'] == 2
+    daemon.request(project, {'command': 'stop'})
+    assert running_daemon.wait(5) == 0
+    assert not os.path.exists(daemon.socket_path(project))
+    # Without a daemon, the commands run in the client
+    result = subprocess.run([sys.executable, '-c', CLIENT, 'env'], cwd=folder, stdout=subprocess.PIPE)
+    assert b'Enable command completion' in result.stdout
+
+
+def test_daemon_commands_are_not_forwarded(project, running_daemon):
+    for args in (['daemon', 'status'], ['--refresh', 'daemon', 'status']):
+        result = subprocess.run([sys.executable, '-c', CLIENT, *args], cwd=project,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
+        assert result.returncode == 0 and b'Running' in result.stdout
+    # Even if a client sends one, the daemon does not run it
+    code = 'from wa_cli.commands.helpers import daemon; print(daemon.forward(["--refresh", "daemon", "status"]))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=project, stdout=subprocess.PIPE, timeout=10)
+    assert result.stdout.strip() == b'None'
+    assert daemon.request(project, {'command': 'status'})['commands'] == 0
+
+
+def test_command_name():
+    assert _command_name(['--refresh', '--profile', 'trace.json', 'daemon', 'status']) == 'daemon'
+    assert _command_name(['skill', '--help']) == 'skill'
+    assert _command_name(['--help']) == ''
+
+
+def test_stamps_follow_env_and_head(project):
+    stamps = daemon._stamps(project)
+    with open(os.path.join(project, 'README.md'), 'w') as readme:
+        readme.write('unrelated')
+    assert daemon._stamps(project) == stamps
+    with open(os.path.join(project, '.env'), 'a') as env_file:
+        env_file.write('WA_INDEX_TTL=10\n')
+    changed = daemon._stamps(project)
+    assert changed['env'] != stamps['env'] and changed['git'] == stamps['git']
+    run_git('checkout', '-q', '-b', 'feature', cwd=project)
+    assert daemon._stamps(project)['git'] != changed['git']
+    changed = daemon._stamps(project)
+    run_git('commit', '-q', '--allow-empty', '-m', 'second', cwd=project)
+    assert daemon._stamps(project)['git'] != changed['git']
+
+
+def test_kept_services():
+    assert wa._service('key', 'http://127.0.0.1:1') is not wa._service('key', 'http://127.0.0.1:1')
+    wa.keep_services()
+    try:
+        service = wa._service('key', 'http://127.0.0.1:1')
+        assert wa._service('key', 'http://127.0.0.1:1') is service
+        assert wa._service('key', 'http://127.0.0.1:2') is not service
+    finally:
+        wa.keep_services(False)
+
+
+def test_finished_commands_are_not_interrupted(monkeypatch):
+    interrupted = []
+    monkeypatch.setattr(daemon._thread, 'interrupt_main', lambda: interrupted.append(True))
+    server = daemon.Daemon.__new__(daemon.Daemon)
+    server._running_lock = threading.Lock()
+    connection, client = socket.socketpair()
+    with connection, client:
+        running, watcher = server._watch(connection)
+        # The client is still connected: stopping wakes the watcher up
+        server._stop_watching(connection, running, watcher)
+        assert not watcher.is_alive()
+        connection.sendall(b'answer')
+        assert client.recv(6) == b'answer'
+    assert not interrupted
+    connection, client = socket.socketpair()
+    with connection:
+        running, watcher = server._watch(connection)
+        client.close()
+        watcher.join(5)
+        server._stop_watching(connection, running, watcher)
+    assert interrupted == [True]
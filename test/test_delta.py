@@ -0,0 +1,79 @@
+import copy
+
+from wa_cli.commands.wa import delta
+
+
+DEPLOYED = {
+    'name': 'Skill',
+    'language': 'en',
+    'description': '',
+    'updated': '2020-03-01T10:00:00.000Z',
+    'intents': [
+        {'intent': 'greet', 'examples': [{'text': 'hello'}]},
+        {'intent': 'bye', 'examples': [{'text': 'bye'}]}
+    ],
+    'entities': [
+        {'entity': 'color', 'values': [{'type': 'synonyms', 'value': 'red', 'synonyms': []}]}
+    ],
+    'counterexamples': [{'text': 'weather'}],
+    'dialog_nodes': [
+        {'dialog_node': 'node_1', 'conditions': '#greet', 'output': {'text': 'Hi'}},
+        {'dialog_node': 'node_2', 'conditions': '#bye', 'output': {'text': 'Bye'},
+         'previous_sibling': 'node_1'}
+    ]
+}
+
+
+def methods(changes):
+    return [operation.method for operation in changes.operations]
+
+
+def test_no_changes():
+    new_skill = copy.deepcopy(DEPLOYED)
+    new_skill['updated'] = '2020-03-02T10:00:00.000Z'
+    changes = delta.plan(DEPLOYED, new_skill)
+    assert changes.operations == []
+    assert changes.workspace_update == {}
+
+
+def test_element_changes():
+    new_skill = copy.deepcopy(DEPLOYED)
+    new_skill['intents'][0]['examples'].append({'text': 'hi'})
+    new_skill['intents'].pop(1)
+    new_skill['intents'].append({'intent': 'thanks', 'examples': [{'text': 'thank you'}]})
+    new_skill['counterexamples'] = [{'text': 'news'}]
+    new_skill['dialog_nodes'][0]['output'] = {'text': 'Hello'}
+    changes = delta.plan(DEPLOYED, new_skill)
+    assert changes.workspace_update == {}
+    assert sorted(methods(changes)) == sorted(['update_intent', 'create_intent', 'delete_intent',
+                                               'create_counterexample', 'delete_counterexample',
+                                               'update_dialog_node'])
+    update = next(op for op in changes.operations if op.method == 'update_intent')
+    assert update.kwargs == {'intent': 'greet', 'new_examples': [{'text': 'hello'}, {'text': 'hi'}]}
+    node = next(op for op in changes.operations if op.method == 'update_dialog_node')
+    assert node.kwargs == {'dialog_node': 'node_1', 'new_output': {'text': 'Hello'}}
+
+
+def test_audit_fields_are_ignored():
+    new_skill = copy.deepcopy(DEPLOYED)
+    new_skill['intents'][0]['updated'] = '2020-03-02T10:00:00.000Z'
+    assert delta.plan(DEPLOYED, new_skill).operations == []
+
+
+def test_removed_fields_replace_the_section():
+    new_skill = copy.deepcopy(DEPLOYED)
+    del new_skill['dialog_nodes'][1]['output']
+    new_skill['description'] = 'A skill'
+    changes = delta.plan(DEPLOYED, new_skill)
+    assert changes.operations == []
+    assert changes.workspace_update == {'description': 'A skill', 'dialog_nodes': new_skill['dialog_nodes']}
+
+
+def test_moved_or_added_nodes_replace_the_section():
+    new_skill = copy.deepcopy(DEPLOYED)
+    new_skill['dialog_nodes'][1]['previous_sibling'] = None
+    new_skill['dialog_nodes'][0]['previous_sibling'] = 'node_2'
+    assert delta.plan(DEPLOYED, new_skill).workspace_update == {'dialog_nodes': new_skill['dialog_nodes']}
+    new_skill = copy.deepcopy(DEPLOYED)
+    new_skill['dialog_nodes'].append({'dialog_node': 'node_3', 'previous_sibling': 'node_2'})
+    assert delta.plan(DEPLOYED, new_skill).workspace_update == {'dialog_nodes': new_skill['dialog_nodes']}
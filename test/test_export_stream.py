@@ -0,0 +1,56 @@
+import copy
+import io
+import json
+
+import pytest
+
+from wa_cli.commands.wa.export_stream import remove_audit, write_export
+
+
+EXPORT = {
+    'name': 'Skill "ñ"',
+    'workspace_id': 'abc',
+    'created': '2020-01-01T10:00:00.000Z',
+    'updated': '2020-03-01T10:00:00.000Z',
+    'system_settings': {'tooling': {'store_generic_responses': True}, 'updated': 'x'},
+    'learning_opt_out': False,
+    'metadata': None,
+    'counterexamples': [],
+    'intents': [
+        {'intent': 'greet', 'created': 'c', 'updated': 'u',
+         'examples': [{'text': 'hello\tthere\\', 'created': 'c'}, {'text': 'olá 😀'}]}
+    ],
+    'dialog_nodes': [
+        {'dialog_node': 'node_1', 'context': {'threshold': 1.5, 'big': 12345678901234567890, 'small': -2e-7},
+         'output': {}, 'updated': 'u'}
+    ]
+}
+
+
+def expected(export):
+    cleaned = {key: remove_audit(value) for key, value in copy.deepcopy(export).items()}
+    return json.dumps(cleaned, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 100000])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_same_output_as_json_dumps(chunk_size, indent):
+    raw = json.dumps(EXPORT, indent=indent).encode('utf-8')
+    out = io.BytesIO()
+    kept, digest = write_export([raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)],
+                                out, ['name', 'updated', 'system_settings', 'intents'])
+    assert out.getvalue() == expected(EXPORT)
+    assert kept == {'name': EXPORT['name'], 'updated': EXPORT['updated'],
+                    'system_settings': {'tooling': {'store_generic_responses': True}}}
+
+
+def test_empty_export():
+    out = io.BytesIO()
+    write_export([b' { } '], out)
+    assert out.getvalue() == b'{}'
+
+
+def test_truncated_export():
+    raw = json.dumps(EXPORT).encode('utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        write_export([raw[:-10]], io.BytesIO())
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import textwrap
+
+from wa_cli.commands.helpers import cfg
+from wa_cli.commands.wa.standin import StandIn
+from wa_cli.commands.wa.wa import wa
+from wa_cli.commands.wa_testing import flow_runner
+from wa_cli.commands.wa_testing.wa_testing import TestingToolFlowMode
+
+SKILL = {
+    'name': 'Greetings',
+    'language': 'en',
+    'intents': [{'intent': 'greet', 'examples': [{'text': 'hello'}]},
+                {'intent': 'bye', 'examples': [{'text': 'bye'}]}],
+    'entities': [{'entity': 'color', 'values': [{'value': 'red'}]}],
+    'dialog_nodes': [{'dialog_node': 'welcome', 'conditions': '#greet',
+                      'output': {'text': {'values': ['Hi there']}}},
+                     {'dialog_node': 'else', 'conditions': 'anything_else', 'previous_sibling': 'welcome',
+                      'output': {'text': {'values': ['Goodbye']}}}],
+    'counterexamples': [],
+}
+
+
+TEST_FILE = '\n'.join([
+    '\t'.join(flow_runner.INPUT_COLUMNS[:4]),
+    'hello\tHi there\t#greet\t',
+    'red please\t\t\t@color',
+    'NEWCONVERSATION',
+    'bye\tBye\tbye\t',
+])
+
+
+def fake_send(calls):
+    async def send(body):
+        calls.append(body)
+        text = body['input']['text']
+        turn = body['context'].get('turn', 0) + 1
+        return {'output': {'text': ['Hi there'] if text == 'hello' else ['Goodbye']},
+                'intents': [{'intent': 'greet' if text == 'hello' else 'bye', 'confidence': 1}],
+                'entities': [{'entity': 'color', 'value': 'red'}] if 'red' in text else [],
+                'context': {'turn': turn}}
+    return send
+
+
+def test_conversations(tmp_path):
+    test_file = tmp_path / 'greetings.tsv'
+    test_file.write_text(TEST_FILE, encoding='utf-8')
+    rows = flow_runner.read_test_file(str(test_file))
+    conversations = flow_runner.split_conversations(rows)
+    assert [[number for number, _ in conversation] for conversation in conversations] == [[0, 1], [3]]
+
+    calls = []
+    report = asyncio.run(flow_runner.run_conversations(conversations, fake_send(calls), 2))
+    assert [report[number]['Result'] for number in [0, 1, 3]] == ['PASS', 'PASS', 'FAIL']
+    assert report[3]['Error'] == 'Unexpected output'
+    # The context is carried within a conversation, and reset by NEWCONVERSATION
+    assert sorted(call['context'].get('turn', 0) for call in calls) == [0, 0, 1]
+
+    flow_runner.write_reports(rows, report, str(tmp_path), 'greetings')
+    lines = (tmp_path / 'greetings_report.tsv').read_text(encoding='utf-8').splitlines()
+    assert lines[0].split('\t') == flow_runner.REPORT_COLUMNS
+    assert lines[3].split('\t')[0] == 'NEWCONVERSATION'
+    assert len(json.loads((tmp_path / 'greetings_report.json').read_text(encoding='utf-8'))) == 4
+
+
+def test_failed_turn_stops_the_conversation():
+    async def send(body):
+        raise RuntimeError('HTTP 400')
+    rows = [{'User Input': 'one'}, {'User Input': 'two'}]
+    report = asyncio.run(flow_runner.run_conversations(flow_runner.split_conversations(rows), send, 1))
+    assert report[0]['Error'] == 'HTTP 400'
+    assert report[1]['Error'] == 'Not sent: turn 1 failed'
+
+
+def test_message_body():
+    row = {'User Input': 'hi', 'Alternate Intents?': 'TRUE', 'Context Variables': '{"a": 1}',
+           'Intents Object': '', 'Entities Object': '', 'System Object': ''}
+    body = flow_runner.message_body(row, {'conversation_id': 'c'})
+    assert body == {'input': {'text': 'hi'}, 'alternate_intents': True,
+                    'context': {'conversation_id': 'c', 'a': 1}}
+
+
+def test_run_against_the_stand_in(tmp_path):
+    server = StandIn(training_delay=0).start()
+    try:
+        workspace_id = wa.create_skill('key', server.url, SKILL)
+        test_file = tmp_path / 'greetings.tsv'
+        test_file.write_text(TEST_FILE, encoding='utf-8')
+        assert flow_runner.run('key', server.url, workspace_id, [str(test_file)], str(tmp_path), 2) == 1
+    finally:
+        server.shutdown()
+    lines = (tmp_path / 'greetings_report.tsv').read_text(encoding='utf-8').splitlines()
+    assert lines[0].split('\t') == flow_runner.REPORT_COLUMNS
+    report = json.loads((tmp_path / 'greetings_report.json').read_text(encoding='utf-8'))
+    assert [(row['Output Text'], row['Output Intent'], row['Result']) for row in report] == \
+        [('Hi there', 'greet', 'PASS'), ('Goodbye', '', 'PASS'), ('', '', ''), ('Goodbye', 'bye', 'FAIL')]
+
+
+def test_authorization_is_renewed():
+    tokens = iter(['first', 'second'])
+
+    class Authenticator(object):
+        def authenticate(self, request):
+            request['headers']['Authorization'] = f'Bearer {next(tokens)}'
+
+    wa.keep_services()
+    try:
+        wa._service('key', 'http://127.0.0.1:1').authenticator = Authenticator()
+        _, _, authorization, _ = wa.request_settings('key', 'http://127.0.0.1:1')
+        assert authorization() == {'Authorization': 'Bearer first'}
+        assert authorization() == {'Authorization': 'Bearer second'}
+    finally:
+        wa.keep_services(False)
+
+
+# Stands in for WA-Testing-Tool's dialog_test/flowtest.py: the test file holds its return code and duration
+FLOWTEST = textwrap.dedent('''
+    import os, sys, time
+    name = os.path.splitext(os.path.basename(sys.argv[1]))[0]
+    with open(sys.argv[1]) as test_file:
+        return_code, delay = test_file.read().split()
+    print(f'Testing {name} on {os.environ["WORKSPACE_ID"]}', flush=True)
+    time.sleep(float(delay))
+    os.makedirs('results')
+    with open(os.path.join('results', f'{name}_report.tsv'), 'w') as report:
+        report.write(return_code)
+    print(f'Tested {name}')
+    sys.exit(int(return_code))
+''')
+
+
+def test_return_code_of_the_flow_test_files(tmp_path, monkeypatch, capfd):
+    scripts_folder = tmp_path / 'WA-Testing-Tool'
+    (scripts_folder / 'dialog_test').mkdir(parents=True)
+    (scripts_folder / 'dialog_test' / 'flowtest.py').write_text(FLOWTEST, encoding='utf-8')
+    monkeypatch.setattr(cfg, 'test_scripts_folder', lambda: str(scripts_folder))
+    output_dir = tmp_path / 'Greetings'
+    output_dir.mkdir()
+    # The files that fail end before the ones that pass, and the last of them in file order ends first
+    durations = {'a': ('0', 0.1), 'b': ('2', 0.5), 'c': ('0', 0.1), 'd': ('3', 0)}
+    for name, (return_code, delay) in durations.items():
+        (output_dir / f'{name}.tsv').write_text(f'{return_code} {delay}', encoding='utf-8')
+    server = StandIn(training_delay=0).start()
+    try:
+        workspace_id = wa.create_skill('key', server.url, SKILL)
+        assert TestingToolFlowMode.run('key', server.url, 'Greetings', str(output_dir), jobs=4) == 3
+        assert TestingToolFlowMode.run('key', server.url, 'Greetings', str(output_dir), jobs=1) == 3
+        (output_dir / 'd.tsv').write_text('0 0', encoding='utf-8')
+        assert TestingToolFlowMode.run('key', server.url, 'Greetings', str(output_dir), jobs=4) == 2
+    finally:
+        server.shutdown()
+    for name, (return_code, _) in durations.items():
+        assert (output_dir / f'{name}_report.tsv').read_text(encoding='utf-8') == \
+            ('0' if name == 'd' else return_code)
+    # The output of each file is printed in one piece
+    lines = [line for line in capfd.readouterr().out.splitlines() if not line.startswith('Launching')]
+    for name in durations:
+        index = lines.index(f'Testing {name} on {workspace_id}')
+        assert lines[index + 1:index + 3] == [f'Tested {name}', f'Moving {name}_report.tsv to {output_dir}']
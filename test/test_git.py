@@ -0,0 +1,96 @@
+import os
+import subprocess
+
+import pytest
+
+from wa_cli.commands.helpers import cfg, git
+
+
+def run_git(*args, cwd):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL).stdout.decode('utf-8')
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for variable in ('TRAVIS', 'TRAVIS_BRANCH', 'TRAVIS_PULL_REQUEST_BRANCH', 'GIT_DIR'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('GIT_AUTHOR_NAME', 'test')
+    monkeypatch.setenv('GIT_AUTHOR_EMAIL', 'test@example.com')
+    monkeypatch.setenv('GIT_COMMITTER_NAME', 'test')
+    monkeypatch.setenv('GIT_COMMITTER_EMAIL', 'test@example.com')
+    folder = tmp_path / 'project'
+    skill = folder / 'waw' / 'Skill'
+    (skill / 'intents').mkdir(parents=True)
+    (folder / '.wa-cli').mkdir()
+    (folder / '.wa-cli' / 'main_branch.txt').write_text('main')
+    run_git('init', '-q', '-b', 'main', cwd=folder)
+    for version in range(3):
+        # Several versions of the same files, so that gc stores deltas
+        (skill / 'dialog.xml').write_text('<nodes>\n' + '<node/>\n' * (50 + version) + '</nodes>\n')
+        (skill / 'intents' / 'greeting.csv').write_text('hello,greeting\n' * (20 + version))
+        (skill / 'entities.csv').write_text(f'version,{version}\n')
+        run_git('add', '-A', cwd=folder)
+        run_git('commit', '-q', '-m', f'version {version}', cwd=folder)
+    monkeypatch.chdir(folder)
+    monkeypatch.setattr(cfg, '_cache', dict(cfg._cache, project_folder=str(folder), main_branch=''))
+    monkeypatch.setattr(git, '_cache', {})
+    return folder
+
+
+def test_skill_is_in_master(repo, monkeypatch):
+    assert git.skill_is_in_master('Skill')
+    assert not git.skill_is_in_master('Missing')
+    # git is run once for each skill
+    monkeypatch.setattr(git, '_run_command', lambda command: pytest.fail(f'{command} run again'))
+    assert git.skill_is_in_master('Skill')
+    assert not git.skill_is_in_master('Missing')
+
+
+def test_sha256_repository(tmp_path, monkeypatch, repo):
+    folder = tmp_path / 'sha256'
+    (folder / 'waw' / 'Sk').mkdir(parents=True)
+    (folder / 'waw' / 'Sk' / 'dialog.xml').write_text('<nodes/>\n')
+    (folder / 'waw' / 'Sk' / 'entities.csv').write_text('colour,red\n')
+    run_git('init', '-q', '--object-format=sha256', '-b', 'main', cwd=folder)
+    run_git('add', '-A', cwd=folder)
+    run_git('commit', '-q', '-m', 'first', cwd=folder)
+    run_git('gc', '-q', cwd=folder)
+    monkeypatch.chdir(folder)
+    assert git.skill_is_in_master('Sk')
+    assert git.current_branch() == 'main'
+
+
+def test_reftable_head_is_not_read(repo, monkeypatch):
+    with open(repo / '.git' / 'config', 'a') as config_file:
+        config_file.write('[extensions]\n\trefStorage = reftable\n')
+    (repo / '.git' / 'HEAD').write_text('ref: refs/heads/.invalid\n')
+    monkeypatch.setattr(git, '_run_command', lambda command: '* feature\n' if command == ['git', 'branch'] else '')
+    assert git.current_branch() == 'feature'
+
+
+def test_current_branch(repo, monkeypatch):
+    calls = []
+    monkeypatch.setattr(git, '_run_command', lambda command: calls.append(command) or '')
+    run_git('checkout', '-q', '-b', 'feature/x', cwd=repo)
+    assert git.current_branch() == 'feature/x'
+    run_git('checkout', '-q', 'main', cwd=repo)
+    # The answer is kept for the lifetime of the process
+    assert git.current_branch() == 'feature/x'
+    assert not calls
+
+
+def test_current_branch_detached_head(repo):
+    run_git('checkout', '-q', '--detach', 'main~1', cwd=repo)
+    assert git.current_branch() == run_git('branch', cwd=repo).splitlines()[0].split()[1]
+
+
+def test_worktree(repo, monkeypatch):
+    worktree = repo.parent / 'worktree'
+    run_git('worktree', 'add', '-q', '-b', 'other', str(worktree), cwd=repo)
+    run_git('pack-refs', '--all', cwd=repo)
+    monkeypatch.chdir(worktree / 'waw')
+    assert git.current_branch() == 'other'
+    assert git.skill_is_in_master('Skill')
+    assert os.path.isfile(repo / '.git' / 'packed-refs')
+    assert not os.path.isfile(repo / '.git' / 'refs' / 'heads' / 'main')
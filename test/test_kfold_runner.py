@@ -0,0 +1,48 @@
+from wa_cli.commands.wa.standin import StandIn
+from wa_cli.commands.wa.wa import Service
+from wa_cli.commands.wa_testing import kfold_runner
+
+
+INTENTS = [
+    {'intent': 'greet', 'examples': [{'text': f'hello {n}'} for n in range(7)]},
+    {'intent': 'bye', 'examples': [{'text': f'bye {n}'} for n in range(5)]},
+]
+
+
+def test_split_folds_is_reproducible_and_balanced():
+    tests = kfold_runner.split_folds(INTENTS, 3)
+    assert tests == kfold_runner.split_folds(list(reversed(INTENTS)), 3)
+    assert [len(test) for test in tests] == [4, 4, 4]
+    held_out = sorted(row for test in tests for row in test)
+    assert held_out == sorted((example['text'], intent['intent']) for intent in INTENTS
+                              for example in intent['examples'])
+    assert tests != kfold_runner.split_folds(INTENTS, 3, seed=1)
+
+
+def test_fold_workspace_holds_out_the_test_examples():
+    skill = {'name': 'Skill', 'language': 'fr', 'intents': INTENTS, 'entities': [{'entity': 'color'}],
+             'dialog_nodes': [{'dialog_node': 'node'}]}
+    test = kfold_runner.split_folds(INTENTS, 3)[0]
+    workspace = kfold_runner.fold_workspace(skill, test, 'Skill__kfold-0')
+    trained = [(example['text'], intent['intent']) for intent in workspace['intents']
+               for example in intent['examples']]
+    assert len(trained) == 8
+    assert not set(trained) & set(test)
+    assert workspace['language'] == 'fr'
+    assert workspace['entities'] == skill['entities']
+    assert 'dialog_nodes' not in workspace
+
+
+def test_run_against_the_stand_in(tmp_path):
+    skill = {'name': 'Skill', 'language': 'en', 'intents': INTENTS}
+    server = StandIn(training_delay=0).start()
+    try:
+        kfold_runner.run('key', server.url, skill, 3, str(tmp_path), 2, 0.2)
+        # The fold workspaces are deleted
+        assert Service('key', server.url).list_workspaces().get_result()['workspaces'] == []
+    finally:
+        server.shutdown()
+    # The separator of the WA-Testing-Tool kfold graphics, kfold-out.metrics.png
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ['kfold-out.confusion.csv', 'kfold-out.csv', 'kfold-out.metrics.csv']
+    assert len((tmp_path / 'kfold-out.csv').read_text(encoding='utf-8').splitlines()) == 13
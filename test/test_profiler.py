@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import threading
+import time
+
+from click.testing import CliRunner
+
+from wa_cli import entry_point
+from wa_cli.commands.helpers import profiler
+from wa_cli.commands.workbench.workbench import _decompose_files
+
+
+@profiler.traced('io')
+def write_file():
+    time.sleep(0.01)
+    return 'written'
+
+
+async def send_messages():
+    async def send():
+        with profiler.span('message', 'api', asynchronous=True):
+            await asyncio.sleep(0.01)
+    await asyncio.gather(*[send() for _ in range(3)])
+
+
+def test_disabled_spans_are_not_recorded():
+    assert not profiler.enabled()
+    with profiler.span('list_workspaces', 'api'):
+        pass
+    assert write_file() == 'written'
+    assert not profiler.enabled()
+
+
+def test_trace_and_summary(tmp_path, capsys):
+    trace_file = tmp_path / 'trace.json'
+    profiler.start(str(trace_file), 'wa-cli skill list')
+    with profiler.span('list_workspaces', 'api', attempt=0):
+        assert write_file() == 'written'
+    thread = threading.Thread(target=write_file, name='worker')
+    thread.start()
+    thread.join()
+    asyncio.run(send_messages())
+    profiler.stop()
+    assert not profiler.enabled()
+
+    trace = json.loads(trace_file.read_text())
+    events = trace['traceEvents']
+    assert trace['otherData']['command'] == 'wa-cli skill list'
+    assert trace['otherData']['peak traced MB'] > 0
+    complete = [event for event in events if event['ph'] == 'X']
+    assert [event['name'] for event in complete] == ['write_file', 'list_workspaces', 'write_file',
+                                                     'wa-cli skill list']
+    outer, inner = complete[1], complete[0]
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert outer['args'] == {'attempt': 0}
+    assert {event['args']['name'] for event in events if event['ph'] == 'M'} >= {'worker'}
+    assert len([event for event in events if event['ph'] in 'be']) == 6
+    assert any(event['ph'] == 'C' for event in events)
+
+    summary = profiler.summary(events)
+    assert summary[0]['name'] == 'wa-cli skill list'
+    by_name = {entry['name']: entry for entry in summary}
+    assert by_name['write_file']['count'] == 2
+    assert by_name['message']['count'] == 3
+    assert by_name['message']['max'] >= 10
+    assert 'Peak traced memory' in capsys.readouterr().err
+
+
+def test_profile_option(tmp_path):
+    trace_file = tmp_path / 'trace.json'
+    result = CliRunner(mix_stderr=False).invoke(entry_point, ['--profile', str(trace_file), 'travis', '--help'])
+    assert result.exit_code == 0, result.output
+    assert 'Profile written to' in result.stderr
+    assert json.loads(trace_file.read_text())['traceEvents']
+    assert not profiler.enabled()
+
+
+def test_worker_spans_are_merged(tmp_path):
+    trace_file = tmp_path / 'trace.json'
+    missing_file = str(tmp_path / 'missing.json')
+    profiler.start(str(trace_file), 'wa-cli skill decompose-all')
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            errors, events = executor.submit(_decompose_files, [missing_file],
+                                             profiler.worker_start()).result()
+        profiler.merge(events)
+    finally:
+        profiler.stop()
+    assert [file_path for file_path, _ in errors] == [missing_file]
+    events = json.loads(trace_file.read_text())['traceEvents']
+    spans = [event for event in events if event['name'] == 'read skill file']
+    assert len(spans) == 1 and spans[0]['pid'] != os.getpid()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(_decompose_files, [missing_file]).result()[1] == []
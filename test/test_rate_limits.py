@@ -0,0 +1,105 @@
+import time
+
+from ibm_cloud_sdk_core import ApiException, DetailedResponse
+import pytest
+
+from wa_cli.commands.wa.wa import RequestScheduler
+
+
+def headers(limit, remaining, reset):
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset': str(reset)
+    }
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler()
+    scheduler.backoff_base = 0.01
+    return scheduler
+
+
+def test_unknown_budget_does_not_throttle(scheduler):
+    start = time.time()
+    for _ in range(20):
+        scheduler.acquire()
+    assert time.time() - start < 0.1
+    assert scheduler.budget().remaining is None
+
+
+def test_budget_is_taken_from_headers(scheduler):
+    reset = int(time.time()) + 60
+    scheduler.update(headers(100, 42, reset))
+    scheduler.acquire()
+    assert scheduler.budget() == (100, 41, reset)
+
+
+def test_bucket_is_refilled_after_reset(scheduler):
+    scheduler.update(headers(100, 0, int(time.time()) - 1))
+    assert scheduler.budget().remaining == 100
+
+
+def test_missing_headers_are_ignored(scheduler):
+    scheduler.update({'X-RateLimit-Limit': '100'})
+    scheduler.update(None)
+    assert scheduler.budget().limit is None
+
+
+def test_exhausted_budget_waits_for_reset(scheduler):
+    scheduler.update(headers(100, 0, time.time() + 0.3))
+    start = time.time()
+    scheduler.acquire()
+    assert time.time() - start >= 0.25
+
+
+def test_client_errors_are_not_retried(scheduler):
+    assert scheduler.retry_delay(404, 0) == -1
+    assert scheduler.retry_delay(429, scheduler.max_retries) == -1
+    assert scheduler.retry_delay(503, 0) > 0
+
+
+def test_429_is_retried_after_reset(scheduler):
+    scheduler.update(headers(100, 0, time.time() + 5))
+    assert scheduler.retry_delay(429, 0) > 4
+
+
+def test_call_retries_server_errors(scheduler):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ApiException(503, message='unavailable')
+        return DetailedResponse(response={}, headers=headers(100, 99, int(time.time()) + 60), status_code=200)
+
+    response = scheduler.call('flaky', flaky)
+    assert response.get_status_code() == 200
+    assert len(attempts) == 3
+    assert scheduler.budget().remaining == 99
+
+
+def test_call_raises_client_errors(scheduler):
+    def missing():
+        raise ApiException(404, message='not found')
+
+    with pytest.raises(ApiException):
+        scheduler.call('missing', missing)
+
+
+def test_creates_are_only_retried_on_429(scheduler):
+    attempts = []
+
+    def create_workspace(status_code):
+        attempts.append(status_code)
+        if len(attempts) == 1:
+            raise ApiException(status_code, message='failed')
+        return DetailedResponse(response={}, headers={}, status_code=201)
+
+    with pytest.raises(ApiException):
+        scheduler.call('create_workspace', create_workspace, 503)
+    assert attempts == [503]
+    attempts.clear()
+    assert scheduler.call('create_workspace', create_workspace, 429).get_status_code() == 201
+    assert attempts == [429, 429]
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+
+import pytest
+
+from wa_cli.commands.helpers import cfg
+from wa_cli.commands.helpers import skill_store
+from wa_cli.commands.helpers import skills_index
+
+
+SKILL = {
+    'name': 'Skill',
+    'intents': [{'intent': 'hello', 'examples': [{'text': 'héllo'}]}],
+    'language': 'en',
+    'workspace_id': 'abc',
+    'status': 'Available',
+    'created': '2020-03-01T10:00:00.000Z',
+    'updated': '2020-03-01T10:00:00.000Z',
+    'learning_opt_out': False
+}
+
+
+@pytest.fixture
+def skills_folder(tmp_path, monkeypatch):
+    skills = tmp_path / 'skills'
+    cache = tmp_path / 'cache'
+    skills.mkdir()
+    cache.mkdir()
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(skills))
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(cache))
+    monkeypatch.setattr(skills_index, '_cache', {'path': '', 'entries': None})
+    return skills
+
+
+def put(skill):
+    contents = json.dumps(skill, ensure_ascii=False, indent=4).encode('utf-8')
+    skill_store.put(f'{skill["workspace_id"]}-{skill["name"]}', skill, contents)
+    return contents
+
+
+def stored_objects(skills_folder):
+    return [file_name for _, _, file_names in os.walk(skills_folder / '.store' / 'objects')
+            for file_name in file_names]
+
+
+def test_exports_are_read_back_as_they_were(skills_folder):
+    contents = put(SKILL)
+    assert skill_store.read('abc-Skill') == contents
+    assert skill_store.lookup('abc-Skill')['updated'] == SKILL['updated']
+    with pytest.raises(KeyError):
+        skill_store.read('xyz-Skill')
+
+
+def test_sandboxes_share_the_object(skills_folder):
+    sandbox = dict(SKILL, workspace_id='xyz', name='Skill-sandbox', updated='2020-03-02T10:00:00.000Z')
+    put(SKILL)
+    sandbox_contents = put(sandbox)
+    assert sorted(skill_store.keys()) == ['abc-Skill', 'xyz-Skill-sandbox']
+    assert len(stored_objects(skills_folder)) == 1
+    assert skill_store.read('xyz-Skill-sandbox') == sandbox_contents
+    # Another export of the same workspace replaces the previous one
+    put(dict(SKILL, updated='2020-03-03T10:00:00.000Z', intents=[]))
+    assert len(stored_objects(skills_folder)) == 2
+    put(dict(SKILL, updated='2020-03-04T10:00:00.000Z', intents=[], language='fr'))
+    assert len(stored_objects(skills_folder)) == 2
+
+
+def test_renamed_and_deleted_skills_are_dropped(skills_folder):
+    put(SKILL)
+    put(dict(SKILL, name='Renamed', intents=[]))
+    assert skill_store.keys() == ['abc-Renamed']
+    assert len(stored_objects(skills_folder)) == 1
+    put(dict(SKILL, workspace_id='xyz', name='Other', language='fr'))
+    skill_store.forget('abc')
+    assert skill_store.keys() == ['xyz-Other']
+    assert len(stored_objects(skills_folder)) == 1
+
+
+def test_prune(skills_folder):
+    put(SKILL)
+    put(dict(SKILL, workspace_id='xyz', name='Other', language='fr'))
+    orphan = skills_folder / '.store' / 'objects' / '00' / ('0' * 64 + '.json.gz')
+    orphan.parent.mkdir()
+    orphan.write_bytes(b'')
+    skill_store.prune(['xyz-Other'])
+    assert skill_store.keys() == ['xyz-Other']
+    assert len(stored_objects(skills_folder)) == 1
+    assert json.loads(skill_store.read('xyz-Other').decode('utf-8'))['language'] == 'fr'
+
+
+def test_exported_files_are_temporary(skills_folder):
+    contents = put(SKILL)
+    with skill_store.exported(skill_store.keys()) as paths:
+        assert len(paths) == 1 and not paths[0].startswith(str(skills_folder))
+        with open(paths[0], 'rb') as json_file:
+            assert json_file.read() == contents
+    assert not os.path.exists(paths[0])
+    assert not list(skills_folder.glob('*.json'))
+    assert skill_store.export('abc-Skill') == str(skills_folder / 'abc-Skill.json')
+    assert (skills_folder / 'abc-Skill.json').read_bytes() == contents
+
+
+
+class PausedSkillData(dict):
+    "Skill data that makes its put wait, once it has looked at the stored objects, until it is released"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paused = threading.Event()
+        self.released = threading.Event()
+
+    def get(self, key, default=None):
+        self.paused.set()
+        self.released.wait(5)
+        return super().get(key, default)
+
+
+def test_concurrent_puts_keep_shared_objects(skills_folder):
+    put(SKILL)
+    put(dict(SKILL, workspace_id='xyz', name='Skill-sandbox', language='fr'))
+    # The sandbox gets the contents of the skill, while the skill is stored with other contents
+    sandbox = PausedSkillData(SKILL, workspace_id='xyz', name='Skill-sandbox')
+    contents = json.dumps(sandbox, ensure_ascii=False, indent=4).encode('utf-8')
+    thread = threading.Thread(target=skill_store.put, args=('xyz-Skill-sandbox', sandbox, contents))
+    thread.start()
+    assert sandbox.paused.wait(5)
+    put(dict(SKILL, language='de'))
+    sandbox.released.set()
+    thread.join(5)
+    assert skill_store.read('xyz-Skill-sandbox') == contents
+    assert len(stored_objects(skills_folder)) == 2
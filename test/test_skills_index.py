@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from wa_cli.commands.helpers import cfg
+from wa_cli.commands.helpers import skills_index
+
+
+SKILL = {
+    'workspace_id': 'abc',
+    'name': 'Skill',
+    'updated': '2020-03-01T10:00:00.000Z',
+    'language': 'en',
+    'description': '',
+    'learning_opt_out': False,
+    'system_settings': {},
+    'intents': []
+}
+
+
+@pytest.fixture
+def skills_folder(tmp_path, monkeypatch):
+    skills = tmp_path / 'skills'
+    cache = tmp_path / 'cache'
+    skills.mkdir()
+    cache.mkdir()
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(skills))
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(cache))
+    monkeypatch.setattr(skills_index, '_cache', {'path': '', 'entries': None})
+    return skills
+
+
+def write_skill(folder, skill):
+    full_path = os.path.join(folder, f'{skill["workspace_id"]}-{skill["name"]}.json')
+    with open(full_path, 'w', encoding='utf-8') as json_file:
+        json.dump(skill, json_file)
+    return full_path
+
+
+def test_recorded_files_are_not_parsed(skills_folder, monkeypatch):
+    full_path = write_skill(skills_folder, SKILL)
+    skills_index.record(full_path, SKILL, 'digest')
+    monkeypatch.setattr(json, 'loads', None)
+    entry = skills_index.lookup(full_path)
+    assert entry['updated'] == SKILL['updated']
+    assert entry['sha256'] == 'digest'
+    assert entry['meta']['name'] == 'Skill'
+
+
+def test_unknown_files_are_indexed(skills_folder):
+    full_path = write_skill(skills_folder, SKILL)
+    entry = skills_index.lookup(full_path)
+    assert entry['id'] == 'abc'
+    assert entry['size'] == os.path.getsize(full_path)
+    skills_index._cache['entries'] = None
+    assert os.path.basename(full_path) in skills_index._entries()
+
+
+def test_modified_files_are_parsed_again(skills_folder):
+    full_path = write_skill(skills_folder, SKILL)
+    skills_index.lookup(full_path)
+    write_skill(skills_folder, dict(SKILL, updated='2020-03-02T10:00:00.000Z', language='es'))
+    assert skills_index.lookup(full_path)['updated'] == '2020-03-02T10:00:00.000Z'
+
+
+def test_files_outside_the_skills_folder(skills_folder, tmp_path):
+    full_path = write_skill(tmp_path, SKILL)
+    assert skills_index.lookup(full_path)['language'] == 'en'
+    assert not skills_index._entries()
@@ -0,0 +1,277 @@
+import json
+import threading
+
+import requests
+
+from wa_cli.commands.helpers import cfg, skills_index
+from wa_cli.commands.wa.standin import StandIn
+from wa_cli.commands.wa.wa import Service, wa
+
+
+SKILL = {
+    'name': 'Greetings',
+    'language': 'en',
+    'intents': [{'intent': 'greet', 'examples': [{'text': 'hello there'}, {'text': 'good morning'}]},
+                {'intent': 'bye', 'examples': [{'text': 'see you later'}]}],
+    'entities': [{'entity': 'color', 'values': [{'value': 'red', 'synonyms': ['crimson']}]}],
+    'dialog_nodes': [{'dialog_node': 'welcome', 'conditions': '#greet',
+                      'output': {'generic': [{'response_type': 'text', 'values': [{'text': 'Hi!'}]}]}},
+                     {'dialog_node': 'else', 'conditions': 'anything_else', 'previous_sibling': 'welcome',
+                      'output': {'text': {'values': ['Sorry?']}}}],
+    'counterexamples': [],
+}
+
+
+def test_workspace_lifecycle(tmp_path):
+    server = StandIn(training_delay=0).start()
+    try:
+        skill_file = tmp_path / 'skill.json'
+        skill_file.write_text(json.dumps(SKILL), encoding='utf-8')
+        assert wa.deploy_skill('key', server.url, str(skill_file), force=True)
+        workspace_id = wa.workspace_id_from_skill_name('key', server.url, 'Greetings')
+        assert wa.get_skill_status('key', server.url, workspace_id) == 'Available'
+
+        service = Service('key', server.url)
+        result = service.message(workspace_id, input={'text': 'Hello, in crimson'}).get_result()
+        assert result['intents'][0]['intent'] == 'greet'
+        assert result['entities'][0]['value'] == 'red'
+        assert result['output']['text'] == ['Hi!']
+        result = service.message(workspace_id, input={'text': 'what?'}, context=result['context']).get_result()
+        assert result['output']['text'] == ['Sorry?']
+        assert result['context']['system']['dialog_turn_counter'] == 2
+
+        service.update_intent(workspace_id, 'bye', new_examples=[{'text': 'goodbye'}])
+        export = service.get_workspace(workspace_id, export=True).get_result()
+        assert export['intents'][1] == {'intent': 'bye', 'examples': [{'text': 'goodbye'}]}
+        assert export['dialog_nodes'] == SKILL['dialog_nodes']
+
+        assert wa.delete_skill('key', server.url, skill_id=workspace_id)
+        assert service.list_workspaces().get_result()['workspaces'] == []
+    finally:
+        server.shutdown()
+
+
+def test_skills_created_elsewhere_are_found(tmp_path):
+    server = StandIn(training_delay=0).start()
+    try:
+        # The index of the workspaces is empty, and trusted
+        assert wa.workspace_id_from_skill_name('key', server.url, 'Greetings') == ''
+        other_client = Service('key', server.url)
+        workspace_id = other_client.create_workspace(**SKILL).get_result()['workspace_id']
+        assert wa.workspace_id_from_skill_name('key', server.url, 'Greetings') == workspace_id
+
+        skill_file = tmp_path / 'skill.json'
+        skill_file.write_text(json.dumps(dict(SKILL, name='Farewells')), encoding='utf-8')
+        other_client.create_workspace(name='Farewells')
+        assert wa.deploy_skill('key', server.url, str(skill_file), force=True)
+        names = [workspace['name'] for workspace in other_client.list_workspaces().get_result()['workspaces']]
+        assert sorted(names) == ['Farewells', 'Greetings']
+    finally:
+        server.shutdown()
+
+
+def test_training_delay():
+    server = StandIn(training_delay=60).start()
+    try:
+        service = Service('key', server.url)
+        workspace_id = service.create_workspace(name='Slow').get_result()['workspace_id']
+        assert service.get_workspace(workspace_id).get_result()['status'] == 'Training'
+    finally:
+        server.shutdown()
+
+
+def test_rate_limits():
+    server = StandIn(rate_limit=2).start()
+    try:
+        responses = [requests.get(f'{server.url}/v1/workspaces') for _ in range(3)]
+        assert [response.status_code for response in responses] == [200, 200, 429]
+        assert responses[1].headers['X-RateLimit-Remaining'] == '0'
+        assert 'X-RateLimit-Reset' in responses[2].headers
+    finally:
+        server.shutdown()
+
+
+def test_audit_dates_are_only_returned_on_request():
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        created = service.create_workspace(**SKILL).get_result()
+        assert 'created' not in created and 'updated' not in created
+        workspace_id = created['workspace_id']
+        updated = service.update_workspace(workspace_id, description='Hi', include_audit=True).get_result()
+        assert updated['created'] <= updated['updated']
+        assert 'updated' not in service.update_workspace(workspace_id, description='Hello').get_result()
+        assert 'updated' not in service.get_workspace(workspace_id, export=True).get_result()
+        listed = service.list_workspaces(include_audit=True).get_result()['workspaces']
+        assert listed[0]['updated'] >= updated['updated']
+    finally:
+        server.shutdown()
+
+def test_record_and_replay(tmp_path):
+    recording = str(tmp_path / 'recording.jsonl')
+    upstream = StandIn(training_delay=0).start()
+    recorder = StandIn(record=recording, upstream_apikey='key', upstream_url=upstream.url).start()
+    try:
+        service = Service('key', recorder.url)
+        workspace_id = service.create_workspace(**SKILL).get_result()['workspace_id']
+        recorded = service.message(workspace_id, input={'text': 'good morning'}).get_result()
+    finally:
+        recorder.shutdown()
+        upstream.shutdown()
+
+    replayer = StandIn(replay=recording).start()
+    try:
+        service = Service('key', replayer.url)
+        assert service.create_workspace(**SKILL).get_result()['workspace_id'] == workspace_id
+        assert service.message(workspace_id, input={'text': 'good morning'}).get_result() == recorded
+        assert requests.get(f'{replayer.url}/v1/workspaces/other').status_code == 404
+    finally:
+        replayer.shutdown()
+
+
+def test_missing_elements_fall_back_to_a_full_update(tmp_path, monkeypatch):
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(cache))
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        workspace_id = service.create_workspace(**SKILL).get_result()['workspace_id']
+        # Our copy of the deployed skill has an intent that someone else has deleted
+        gone = {'intent': 'gone', 'examples': [{'text': 'gone'}]}
+        wa('key', server.url)._save_snapshot(workspace_id, dict(SKILL, intents=SKILL['intents'] + [gone]))
+        skill_file = tmp_path / 'skill.json'
+        new_skill = dict(SKILL, intents=SKILL['intents'] + [dict(gone, examples=[{'text': 'vanished'}])])
+        skill_file.write_text(json.dumps(new_skill), encoding='utf-8')
+        assert wa.deploy_skill('key', server.url, str(skill_file), force=True, delta=True)
+        workspaces = service.list_workspaces().get_result()['workspaces']
+        assert [workspace['workspace_id'] for workspace in workspaces] == [workspace_id]
+        export = service.get_workspace(workspace_id, export=True).get_result()
+        assert export['intents'][2] == {'intent': 'gone', 'examples': [{'text': 'vanished'}]}
+    finally:
+        server.shutdown()
+
+
+def test_clone_service_skills(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(tmp_path))
+    monkeypatch.setenv('WA_PAGE_LIMIT', '2')
+    source = StandIn(training_delay=0).start()
+    target = StandIn(training_delay=0).start()
+    try:
+        source_service = Service('key', source.url)
+        for number in range(5):
+            source_service.create_workspace(**dict(SKILL, name=f'Skill{number}', description='Greets'))
+        assert wa.clone_service_skills('key', target.url, 'key', source.url, force=True, jobs=2)
+        target_service = Service('key', target.url)
+        workspaces = target_service.list_workspaces(include_audit=True).get_result()['workspaces']
+        assert sorted(workspace['name'] for workspace in workspaces) == [f'Skill{number}' for number in range(5)]
+        for workspace in workspaces:
+            assert workspace['description'].startswith('Greets - Cloned from ')
+            export = target_service.get_workspace(workspace['workspace_id'], export=True).get_result()
+            assert export['intents'] == SKILL['intents'] and export['dialog_nodes'] == SKILL['dialog_nodes']
+    finally:
+        source.shutdown()
+        target.shutdown()
+
+
+def test_download_starts_before_the_last_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(tmp_path))
+    monkeypatch.setenv('WA_PAGE_LIMIT', '2')
+    fetched = threading.Event()
+    waited = []
+    iter_skills, fetch_skill_file = wa._iter_skills, wa._fetch_skill_file
+
+    def paused_iter_skills(self, *args, **kwargs):
+        for number, skill in enumerate(iter_skills(self, *args, **kwargs)):
+            if number == 2:
+                # The first skill of the second page
+                waited.append(fetched.wait(5))
+            yield skill
+
+    def signalling_fetch_skill_file(self, *args, **kwargs):
+        fetched.set()
+        return fetch_skill_file(self, *args, **kwargs)
+
+    monkeypatch.setattr(wa, '_iter_skills', paused_iter_skills)
+    monkeypatch.setattr(wa, '_fetch_skill_file', signalling_fetch_skill_file)
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        for number in range(5):
+            service.create_workspace(**dict(SKILL, name=f'Skill{number}'))
+        assert wa.download_service_skills('key', server.url, force=True, jobs=2)
+        assert waited == [True]
+        assert sorted(path.name[-len('Skill0.json'):] for path in tmp_path.glob('*.json')) == \
+            [f'Skill{number}.json' for number in range(5)]
+    finally:
+        server.shutdown()
+
+
+def test_download_service_skills(tmp_path, monkeypatch, capsys):
+    skills, cache = tmp_path / 'skills', tmp_path / 'cache'
+    skills.mkdir()
+    cache.mkdir()
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(skills))
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(cache))
+    monkeypatch.setattr(skills_index, '_cache', {'path': '', 'entries': None})
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        workspace_ids = [service.create_workspace(**dict(SKILL, name=f'Skill{number}')).get_result()['workspace_id']
+                         for number in range(5)]
+        download_skill = wa._download_skill
+
+        def failing_download_skill(self, skill_id, out):
+            if skill_id == workspace_ids[3]:
+                out.write(b'{"name": ')
+                raise RuntimeError('Connection reset')
+            return download_skill(self, skill_id, out)
+
+        monkeypatch.setattr(wa, '_download_skill', failing_download_skill)
+        assert not wa.download_service_skills('key', server.url, force=True, jobs=3)
+        out = capsys.readouterr().out
+        assert 'Downloaded: 4   Cached: 0   Failed: 1' in out
+        assert f'Error downloading skill Skill3-{workspace_ids[3]}: Connection reset' in out
+        # Neither the failed download nor the temporary files are left behind
+        assert sorted(path.name for path in skills.iterdir()) == \
+            sorted(f'{workspace_ids[number]}-Skill{number}.json' for number in [0, 1, 2, 4])
+        for number in [0, 1, 2, 4]:
+            skill_file = skills / f'{workspace_ids[number]}-Skill{number}.json'
+            assert json.loads(skill_file.read_text(encoding='utf-8'))['name'] == f'Skill{number}'
+
+        monkeypatch.setattr(wa, '_download_skill', download_skill)
+        assert wa.download_service_skills('key', server.url, force=True, jobs=3)
+        assert 'Downloaded: 1   Cached: 4   Failed: 0' in capsys.readouterr().out
+    finally:
+        server.shutdown()
+
+
+def test_delete_skills_matching_a_pattern_across_pages(monkeypatch, capsys):
+    monkeypatch.setenv('WA_PAGE_LIMIT', '2')
+    server = StandIn(training_delay=0).start()
+    try:
+        service = Service('key', server.url)
+        for number in range(4):
+            service.create_workspace(name=f'Test{number}')
+            service.create_workspace(name=f'Keep{number}')
+        assert wa.delete_all_skills('key', server.url, pattern='Test*', jobs=3)
+        assert 'Deleted: 4   Failed: 0' in capsys.readouterr().out
+        names = [workspace['name'] for workspace in service.list_workspaces().get_result()['workspaces']]
+        assert sorted(names) == [f'Keep{number}' for number in range(4)]
+    finally:
+        server.shutdown()
+
+
+def test_wait_for_a_missing_skill(capsys):
+    server = StandIn(training_delay=0.5).start()
+    try:
+        # The index of the workspaces is filled before the skill is created by another client
+        assert wa.workspace_id_from_skill_name('key', server.url, 'Greetings') == ''
+        Service('key', server.url).create_workspace(**SKILL)
+        assert not wa.wait_for_skills('key', server.url, ['Greetings', 'Missing'], timeout=30)
+        out = capsys.readouterr().out
+        assert '"Missing" was not found. Not waiting.' in out
+        assert '"Greetings" is Available after' in out
+        assert wa.wait_for_skills('key', server.url, ['Greetings'], timeout=30)
+    finally:
+        server.shutdown()
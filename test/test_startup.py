@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+import time
+
+from click.testing import CliRunner
+
+from wa_cli import entry_point, LAZY_COMMANDS
+
+# Modules that the commands only import once they run. The SDK packages are loaded lazily,
+# so they are in sys.modules from the start: their submodules tell whether they have been loaded
+HEAVY_MODULES = ['ibm_watson.assistant_v1', 'ibm_cloud_sdk_core.base_service', 'requests', 'asyncio', 'aiohttp',
+                 'numpy']
+# Share of the startup time that `wa-cli --help` would add to the interpreter if the commands and the SDK
+# were imported eagerly, that it may add. Relative, so that it does not depend on the speed of the machine
+STARTUP_MARGIN = 0.5
+WA_CLI_HELP = 'sys.argv = ["wa-cli", "--help"]; main()'
+EAGER_IMPORTS = ('[entry_point.get_command(None, name) for name in LAZY_COMMANDS]; '
+                 'import ibm_watson.assistant_v1; ')
+
+
+def loaded_modules(args):
+    code = ('import json, sys\n'
+            'from click.testing import CliRunner\n'
+            'from wa_cli import entry_point\n'
+            f'result = CliRunner().invoke(entry_point, {args!r})\n'
+            'assert result.exit_code == 0, result.output\n'
+            f'print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n')
+    completed = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout)
+
+
+def startup_time(code):
+    times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_help_does_not_import_the_commands():
+    assert loaded_modules(['--help']) == []
+    assert loaded_modules(['sandbox', '--help']) == []
+    assert loaded_modules(['skill', '--help']) == []
+    assert loaded_modules(['ci', '--help']) == []
+
+
+def test_lazy_help_matches_the_commands():
+    for name, (_, short_help) in LAZY_COMMANDS.items():
+        assert entry_point.get_command(None, name).get_short_help_str(200) == short_help
+    result = CliRunner().invoke(entry_point, ['--help'])
+    assert all(name in result.output for name in LAZY_COMMANDS)
+
+
+def test_startup_benchmark():
+    "The wa-cli script, with its check for a daemon, rather than entry_point"
+    interpreter = startup_time('pass')
+    imports = 'import sys; from wa_cli import entry_point, main, LAZY_COMMANDS; '
+    help_time = startup_time(imports + WA_CLI_HELP) - interpreter
+    eager_time = startup_time(imports + EAGER_IMPORTS + WA_CLI_HELP) - interpreter
+    assert help_time < eager_time * STARTUP_MARGIN, \
+        f'{help_time:.3f}s to show the help, {eager_time:.3f}s with eager imports'
+
+
+def test_the_sdk_is_loaded_once_by_concurrent_threads():
+    code = ('import json, threading\n'
+            'from wa_cli.commands.wa.wa import Service\n'
+            'barrier = threading.Barrier(8)\n'
+            'errors = []\n'
+            'def create():\n'
+            '    barrier.wait()\n'
+            '    try:\n'
+            '        Service("key", "http://127.0.0.1:1")\n'
+            '    except Exception as xcpt:\n'
+            '        errors.append(str(xcpt))\n'
+            'threads = [threading.Thread(target=create) for _ in range(8)]\n'
+            'for thread in threads:\n'
+            '    thread.start()\n'
+            'for thread in threads:\n'
+            '    thread.join()\n'
+            'print(json.dumps(errors))\n')
+    completed = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True)
+    assert json.loads(completed.stdout) == []
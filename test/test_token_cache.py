@@ -0,0 +1,45 @@
+import os
+import stat
+import time
+
+import pytest
+
+from wa_cli.commands.helpers import cfg
+from wa_cli.commands.helpers import token_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(tmp_path))
+    monkeypatch.setattr(token_cache, '_tokens', {})
+    return tmp_path
+
+
+def token(expires_in):
+    return {'access_token': 'token', 'expiration': int(time.time()) + expires_in}
+
+
+def test_token_is_reused_by_other_processes(cache_folder):
+    token_cache.save('apikey', token(3600))
+    token_cache._tokens.clear()
+    assert token_cache.load('apikey')['access_token'] == 'token'
+
+
+def test_cache_file_is_private(cache_folder):
+    token_cache.save('apikey', token(3600))
+    files = os.listdir(cache_folder)
+    assert len(files) == 1
+    assert 'apikey' not in files[0]
+    if os.name != 'nt':
+        mode = stat.S_IMODE(os.stat(os.path.join(cache_folder, files[0])).st_mode)
+        assert mode == 0o600
+
+
+def test_tokens_about_to_expire_are_not_used():
+    token_cache.save('apikey', token(token_cache.EXPIRATION_MARGIN - 10))
+    assert token_cache.load('apikey') is None
+
+
+def test_tokens_are_per_apikey():
+    token_cache.save('apikey', token(3600))
+    assert token_cache.load('other') is None
@@ -0,0 +1,156 @@
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+from wa_cli.commands.helpers import cfg, skills_index
+from wa_cli.commands.workbench.workbench import workbench
+
+WAW_PATH = os.environ.get('WAW_PATH', '')
+
+SKILL = {
+    'name': 'Skill',
+    'language': 'en',
+    'description': 'A skill with ñ',
+    'learning_opt_out': False,
+    'system_settings': {'disambiguation': {'enabled': False}},
+    'workspace_id': 'abc',
+    'intents': [{'intent': 'hello', 'examples': [{'text': 'hello'}, {'text': 'good morning'}]},
+                {'intent': 'bye', 'description': 'Leaving', 'examples': [{'text': 'see you, "friend"'}]}],
+    'counterexamples': [{'text': 'what time is it'}],
+    'entities': [{'entity': 'colour', 'values': [{'type': 'synonyms', 'value': 'red',
+                                                  'synonyms': ['crimson', 'scarlet']},
+                                                 {'type': 'patterns', 'value': 'hex', 'patterns': ['#[0-9a-f]{6}']}],
+                  'fuzzy_match': True}],
+    'dialog_nodes': [{'dialog_node': 'welcome', 'conditions': 'welcome', 'type': 'standard',
+                      'output': {'generic': [{'response_type': 'text', 'values': [{'text': 'Hi!'}],
+                                              'selection_policy': 'sequential'}]}},
+                     {'dialog_node': 'anything_else', 'conditions': 'anything_else', 'type': 'standard',
+                      'previous_sibling': 'welcome',
+                      'output': {'generic': [{'response_type': 'text', 'values': [{'text': 'Sorry?'}],
+                                              'selection_policy': 'sequential'}]}}]
+}
+
+
+@pytest.fixture
+def waw_folder(tmp_path, monkeypatch):
+    folder = tmp_path / 'waw'
+    monkeypatch.setattr(cfg, 'waw_target_folder', lambda: str(folder))
+    return folder
+
+
+def files_of(folder):
+    contents = {}
+    for parent, _, file_names in os.walk(folder):
+        for file_name in file_names:
+            full_path = os.path.join(parent, file_name)
+            with open(full_path, 'rb') as _file:
+                contents[os.path.relpath(full_path, folder)] = _file.read()
+    return contents
+
+
+def test_waw_scripts_do_not_shadow_installed_modules(tmp_path, monkeypatch, capsys):
+    scripts = tmp_path / 'scripts'
+    scripts.mkdir()
+    (scripts / 'waw_probe.py').write_text('import sys\n'
+                                          'def main(params):\n'
+                                          '    print("last" if sys.path[-1] == params[0] else "first")\n')
+    monkeypatch.setattr(cfg, 'waw_scripts_folder', lambda: str(scripts))
+    saved_path = list(sys.path)
+    try:
+        workbench._run_waw_main('waw_probe.py', [str(scripts)])
+    finally:
+        sys.modules.pop('waw_probe', None)
+    assert capsys.readouterr().out.splitlines()[-1] == 'last'
+    assert sys.path == saved_path
+
+
+@pytest.mark.skipif(not os.path.isdir(os.path.join(WAW_PATH, 'scripts')),
+                    reason='Set WAW_PATH to a Watson Assistant Workbench checkout')
+def test_in_process_decomposition_matches_the_waw_scripts(tmp_path, waw_folder, monkeypatch):
+    monkeypatch.setattr(cfg, 'waw_scripts_folder', lambda: os.path.join(WAW_PATH, 'scripts'))
+    skill_file = tmp_path / 'abc-Skill.json'
+    skill_file.write_text(json.dumps(SKILL, ensure_ascii=False, indent=4), encoding='utf-8')
+    monkeypatch.delenv('WA_WAW_IN_PROCESS', raising=False)
+    assert not workbench._in_process()
+    assert workbench.decompose_skill_file(str(skill_file), 'with-subprocesses')
+    monkeypatch.setenv('WA_WAW_IN_PROCESS', '1')
+    monkeypatch.setattr(workbench, '_decompose_with_subprocesses', None)
+    assert workbench.decompose_skill_file(str(skill_file), 'in-process')
+    expected = files_of(waw_folder / 'with-subprocesses')
+    assert expected and files_of(waw_folder / 'in-process') == expected
+
+
+def write_files(folder, contents):
+    for relative_path, content in contents.items():
+        full_path = folder / relative_path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_bytes(content)
+
+
+def test_sync_folders(tmp_path):
+    src, tgt = tmp_path / 'src', tmp_path / 'tgt'
+    write_files(src, {'intents/hello.csv': b'hello', 'intents/bye.csv': b'see you', 'dialog/dialog.xml': b'<nodes/>'})
+    write_files(tgt, {'intents/hello.csv': b'hi', 'intents/bye.csv': b'see you', 'entities/colour.csv': b'red'})
+    unchanged_stat = os.stat(tgt / 'intents' / 'bye.csv')
+    assert workbench._sync_folders(str(src), str(tgt)) == (2, 1, 1)
+    assert files_of(tgt) == {os.path.join('intents', 'hello.csv'): b'hello',
+                             os.path.join('intents', 'bye.csv'): b'see you',
+                             os.path.join('dialog', 'dialog.xml'): b'<nodes/>'}
+    # The unchanged file is not rewritten, and the folder of the stale file is removed
+    assert os.stat(tgt / 'intents' / 'bye.csv').st_ino == unchanged_stat.st_ino
+    assert os.stat(tgt / 'intents' / 'bye.csv').st_mtime_ns == unchanged_stat.st_mtime_ns
+    assert not (tgt / 'entities').exists()
+    # The written files are moved from the source folder
+    assert not (src / 'intents' / 'hello.csv').exists()
+
+    write_files(src, {'intents/hello.csv': b'hello', 'intents/bye.csv': b'see you', 'dialog/dialog.xml': b'<nodes/>'})
+    assert workbench._sync_folders(str(src), str(tgt)) == (0, 0, 3)
+
+
+def test_staging_folder_is_removed_after_an_error(tmp_path, waw_folder, monkeypatch):
+    skill_file = tmp_path / 'skill.json'
+    skill_file.write_text(json.dumps(SKILL), encoding='utf-8')
+    write_files(waw_folder, {'Skill/intents/hello.csv': b'hello'})
+    monkeypatch.delenv('WA_WAW_IN_PROCESS', raising=False)
+
+    def failing_decomposition(full_path, skill_name, meta):
+        (waw_folder / skill_name / 'intents' / 'partial.csv').write_bytes(b'hel')
+        raise RuntimeError('workspace_decompose.py failed')
+
+    monkeypatch.setattr(workbench, '_decompose_with_subprocesses', failing_decomposition)
+    with pytest.raises(RuntimeError):
+        workbench.decompose_skill_file(str(skill_file))
+    # The previous decomposition is left as it was
+    assert files_of(waw_folder) == {os.path.join('Skill', 'intents', 'hello.csv'): b'hello'}
+    assert not [name for name in os.listdir(waw_folder) if name.startswith(workbench.STAGING_PREFIX)]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='The decomposition is replaced in the parent process, and inherited by the pool')
+def test_a_failed_skill_does_not_stop_the_others(tmp_path, waw_folder, monkeypatch, capsys):
+    skills_folder, cache_folder = tmp_path / 'skills', tmp_path / 'cache'
+    skills_folder.mkdir()
+    cache_folder.mkdir()
+    monkeypatch.setattr(cfg, 'skills_folder', lambda: str(skills_folder))
+    monkeypatch.setattr(cfg, 'cache_folder', lambda: str(cache_folder))
+    monkeypatch.setattr(skills_index, '_cache', {'path': '', 'entries': None})
+    monkeypatch.delenv('WA_SKILL_STORE', raising=False)
+    monkeypatch.delenv('WA_WAW_IN_PROCESS', raising=False)
+    for name in ['Broken', 'Greetings', 'Farewells']:
+        (skills_folder / f'{name}.json').write_text(json.dumps(dict(SKILL, name=name)), encoding='utf-8')
+
+    def decomposition(full_path, skill_name, meta):
+        if meta['name'] == 'Broken':
+            raise RuntimeError('workspace_decompose.py failed')
+        (waw_folder / skill_name / 'intents' / 'hello.csv').write_bytes(meta['name'].encode())
+
+    monkeypatch.setattr(workbench, '_decompose_with_subprocesses', decomposition)
+    assert not workbench.decompose_all_skill_files(force=True, jobs=2)
+    assert files_of(waw_folder) == {os.path.join('Greetings', 'intents', 'hello.csv'): b'Greetings',
+                                    os.path.join('Farewells', 'intents', 'hello.csv'): b'Farewells'}
+    out = capsys.readouterr().out
+    assert 'Error decomposing "Broken.json": workspace_decompose.py failed' in out
+    assert 'Decomposed: 2   Failed: 1' in out
@@ -2,17 +2,32 @@
 # -*- coding: UTF-8 -*-
 
 import os
+import sys
 
 import click
 
 from .commands.helpers import cfg
-from .commands.sandbox import sandbox
-from .commands.service import service
-from .commands.skill import skill
+from .commands.helpers.lazy_group import LazyGroup
+
+# Imported when they are invoked: name: ('module:attribute', short help)
+LAZY_COMMANDS = {
+    'ci': ('wa_cli.commands.ci:ci', 'Continuous integration of the skills with dialog flow tests'),
+    'sandbox': ('wa_cli.commands.sandbox:sandbox', 'Work with skills in a branch-dependant sandbox.'),
+    'service': ('wa_cli.commands.service:service', 'Bulk actions on all the skills of a Watson Assistant instance'),
+    'skill': ('wa_cli.commands.skill:skill', 'Skill related commands'),
+    'standin': ('wa_cli.commands.standin:standin', 'Serve a local stand-in for the Watson Assistant API.'),
+}
+if os.name != 'nt':
+    LAZY_COMMANDS['daemon'] = ('wa_cli.commands.daemon:daemon',
+                               'Run the commands of the project in a process with warm caches.')
 
 
-@click.group()
-def entry_point():
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
+@click.option('--refresh', is_flag=True, help='Ignore the cached list of workspaces of the service')
+@click.option('--profile', type=click.Path(dir_okay=False),
+              help='Write a Chrome trace of the API calls, subprocesses and file I/O to this file')
+@click.pass_context
+def entry_point(ctx, refresh, profile):
     """wa-cli allows you to
 
     \b
@@ -21,8 +36,16 @@ def entry_point():
     * clone the skills from a service to another service
     * run k-fold tests on a skill file
     * download, deploy and delete skills
+    * deploy, test and clean up sandboxes in a single CI command
+    * run a local stand-in for the Watson Assistant API
+    * keep the caches of a project warm in a daemon
     """
-    pass
+    if refresh:
+        cfg.request_refresh()
+    if profile:
+        from .commands.helpers import profiler
+        profiler.start(profile, ' '.join(['wa-cli'] + sys.argv[1:]))
+        ctx.call_on_close(profiler.stop)
 
 
 @entry_point.command()
@@ -52,9 +75,26 @@ def travis():
     cfg.travis()
 
 
-entry_point.add_command(sandbox)
-entry_point.add_command(service)
-entry_point.add_command(skill)
+def _command_name(args: list) -> str:
+    "The command that the arguments run, after the global options. Empty if there is none"
+    try:
+        ctx = entry_point.make_context('wa-cli', list(args), resilient_parsing=True)
+    except click.ClickException:
+        return ''
+    return ctx.protected_args[0] if ctx.protected_args else ''
+
+
+def main():
+    """
+    The wa-cli script: the daemon of the project runs the command, if it has been started
+    """
+    if os.name != 'nt' and '_WA_CLI_COMPLETE' not in os.environ and _command_name(sys.argv[1:]) != 'daemon':
+        from .commands.helpers import daemon
+        exit_code = daemon.forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+    entry_point(prog_name='wa-cli')
+
 
 if __name__ == "__main__":
-    entry_point()
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import sys
+import threading
+import time
+
+import click
+from .helpers import protect_readonly
+from .helpers import common_options
+from .helpers import cfg
+from .sandbox import Sandbox
+from .wa import wa
+from .wa_testing import wa_testing
+
+
+@click.group()
+@click.pass_context
+def ci(ctx):
+    """
+    Continuous integration of the skills with dialog flow tests
+    """
+    cfg.check_context(ctx)
+
+
+@ci.command()
+@common_options.add(common_options.mandatory)
+@click.option('--timeout', default=300, show_default=True, help='Seconds to wait for the skills to be trained')
+@click.option('--deploy-main', is_flag=True, help='Deploy the skills when running on the main git branch')
+@click.option('--cleanup', is_flag=True, help='Delete the sandboxes once they have been tested')
+@click.option('--timings-file', type=click.Path(dir_okay=False), help='Save the duration of each stage as JSON')
+@common_options.jobs
+@common_options.native
+@click.pass_context
+@protect_readonly
+def run(ctx, apikey, url, timeout, deploy_main, cleanup, timings_file, jobs, native):
+    """
+    Deploy, wait for, test and clean up the skills in <project_folder>/test/flow
+
+    \b
+    The skills are deployed as sandboxes of the current git branch. On the main
+    branch, they are only deployed with --deploy-main, and never deleted.
+    All the skills are trained and tested concurrently, in a single process,
+    with at most --jobs flowtest.py processes (or conversations) at a time.
+    Returns 1 if any stage fails, 0 otherwise.
+    """
+    sys.exit(Pipeline(apikey, url, jobs, native).run(timeout, deploy_main, cleanup, timings_file))
+
+
+class Pipeline(object):
+
+    def __init__(self, apikey: str, url: str, jobs: int, native: bool = False):
+        self.apikey = apikey
+        self.url = url
+        self.jobs = max(1, jobs)
+        self.native = native
+        # Shared by the test files of all the skills
+        self.slots = threading.BoundedSemaphore(self.jobs)
+        self.sandboxes = [Sandbox(apikey, url, skill_name) for skill_name in wa_testing.flow_test_skills()]
+        self.timings = []
+
+    def _stage(self, stage: str, method, *args) -> bool:
+        click.secho(f'Stage "{stage}"', bold=True)
+        start_time = time.time()
+        try:
+            success = method(*args)
+        except SystemExit:
+            # Sandbox errors have already been reported
+            success = False
+        except Exception as xcpt:
+            message = getattr(xcpt, 'message', str(xcpt))
+            click.secho(f'Error in stage "{stage}": {message}', fg='white', bg='red')
+            success = False
+        self.timings.append({'stage': stage, 'seconds': round(time.time() - start_time, 1), 'success': success})
+        return success
+
+    def deploy(self, deploy_main: bool) -> bool:
+        success = True
+        for sandbox in self.sandboxes:
+            if sandbox.sandbox_name != sandbox.skill_name:
+                click.echo(f'Deploying to sandbox "{sandbox.sandbox_name}"')
+                success = sandbox.push() and success
+            elif deploy_main:
+                click.echo(f'Deploying "{sandbox.skill_name}" to the main branch')
+                success = sandbox.deploy() and success
+            else:
+                click.echo(f'Skipping deployment of "{sandbox.skill_name}" to the main branch')
+        return success
+
+    def wait(self, timeout: float) -> bool:
+        return wa.wait_for_skills(self.apikey, self.url, [sandbox.sandbox_name for sandbox in self.sandboxes], timeout)
+
+    def _flow(self, sandbox: Sandbox) -> int:
+        click.echo(f'Running test on skill "{sandbox.sandbox_name}"...')
+        output_dir = wa_testing.output_dir_for_skill(sandbox.skill_name, 'flow')
+        return wa_testing.flow(self.apikey, self.url, sandbox.sandbox_name, output_dir=output_dir,
+                               jobs=self.jobs, native=self.native, slots=self.slots)
+
+    def test(self) -> bool:
+        failed = []
+        # The test files of the skills wait for the shared slots. The conversations of a skill
+        # tested natively are run `jobs` at a time in their own event loop: one skill after the other
+        with ThreadPoolExecutor(max_workers=1 if self.native else max(1, len(self.sandboxes))) as executor:
+            futures = {executor.submit(self._flow, sandbox): sandbox for sandbox in self.sandboxes}
+            for future in as_completed(futures):
+                sandbox = futures[future]
+                try:
+                    if future.result():
+                        failed.append(sandbox.sandbox_name)
+                except Exception as xcpt:
+                    message = getattr(xcpt, 'message', str(xcpt))
+                    click.secho(f'Error testing skill "{sandbox.sandbox_name}": {message}', fg='white', bg='red')
+                    failed.append(sandbox.sandbox_name)
+        if failed:
+            click.echo(f'Failed tests: {", ".join(sorted(failed))}')
+        return not failed
+
+    def cleanup(self) -> bool:
+        success = True
+        for sandbox in self.sandboxes:
+            if sandbox.sandbox_name != sandbox.skill_name:
+                click.echo(f'Deleting sandbox "{sandbox.sandbox_name}"...')
+                success = wa.delete_skill(self.apikey, self.url, name=sandbox.sandbox_name) and success
+        return success
+
+    def report(self, timings_file: str):
+        click.secho('Stage      Seconds  Success', bold=True)
+        for timing in self.timings:
+            click.echo(f'{timing["stage"]:<10} {timing["seconds"]:>7.1f}  {timing["success"]}')
+        if timings_file:
+            with open(timings_file, 'w', encoding='utf-8') as json_file:
+                json.dump({'skills': [sandbox.sandbox_name for sandbox in self.sandboxes],
+                           'stages': self.timings}, json_file, indent=4)
+
+    def run(self, timeout: float, deploy_main: bool, cleanup: bool, timings_file: str = '') -> int:
+        if not self.sandboxes:
+            click.echo('No skills in <project_folder>/test/flow', err=True)
+            return 1
+        success = False
+        try:
+            success = (self._stage('deploy', self.deploy, deploy_main) and
+                       self._stage('wait', self.wait, timeout) and
+                       self._stage('test', self.test))
+        finally:
+            if cleanup:
+                self._stage('cleanup', self.cleanup)
+            self.report(timings_file)
+        return 0 if success else 1
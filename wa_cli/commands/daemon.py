@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import subprocess
+import sys
+import time
+
+import click
+from .helpers import cfg
+from .helpers import daemon as daemon_helper
+
+
+@click.group()
+@click.pass_context
+def daemon(ctx):
+    """
+    Run the commands of the project in a process with warm caches.
+
+    \b
+    While it runs, wa-cli hands its commands over to it. It keeps the Watson
+    SDK imported, the authenticated clients and their connections, the lists
+    of workspaces and the git answers, until .env or the git HEAD change.
+    """
+    cfg.check_context(ctx)
+
+
+@daemon.command()
+@click.option('--idle-timeout', default=daemon_helper.DEFAULT_IDLE_TIMEOUT, show_default=True,
+              help='Stop after these seconds without commands. 0 never stops')
+@click.option('--foreground', is_flag=True, help='Do not detach from the terminal')
+@click.pass_context
+def start(ctx, idle_timeout, foreground):
+    """
+    Start the daemon of the project
+    """
+    project_folder = ctx.obj['project_folder']
+    status = daemon_helper.request(project_folder, {'command': 'status'})
+    if status:
+        click.echo(f'The daemon is already running (pid {status["pid"]})')
+        return
+    if foreground:
+        click.echo(f'Serving the commands of {project_folder}. Press Ctrl+C to stop')
+        try:
+            daemon_helper.Daemon(project_folder, idle_timeout).serve()
+        except KeyboardInterrupt:
+            pass
+        return
+    log_file_path = os.path.join(cfg.cache_folder(), 'daemon.log')
+    with open(log_file_path, 'ab') as log_file:
+        subprocess.Popen([sys.executable, '-c', 'from wa_cli import entry_point; entry_point(prog_name="wa-cli")',
+                          'daemon', 'start', '--foreground', '--idle-timeout', str(idle_timeout)],
+                         cwd=project_folder, stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+    deadline = time.time() + daemon_helper.START_TIMEOUT
+    while time.time() < deadline:
+        status = daemon_helper.request(project_folder, {'command': 'status'})
+        if status:
+            click.echo(f'The daemon is running (pid {status["pid"]})')
+            return
+        time.sleep(0.1)
+    click.secho(f'The daemon did not start. See {log_file_path}', fg='white', bg='red')
+    sys.exit(1)
+
+
+@daemon.command()
+@click.pass_context
+def stop(ctx):
+    """
+    Stop the daemon of the project
+    """
+    status = daemon_helper.request(ctx.obj['project_folder'], {'command': 'stop'})
+    if status:
+        click.echo(f'Stopped the daemon (pid {status["pid"]}) after {status["commands"]} commands')
+    else:
+        click.echo('The daemon is not running')
+
+
+@daemon.command()
+@click.pass_context
+def status(ctx):
+    """
+    Tell whether the daemon of the project is running
+    """
+    status = daemon_helper.request(ctx.obj['project_folder'], {'command': 'status'})
+    if status:
+        click.echo(f'Running (pid {status["pid"]}) for {status["uptime"]:.0f}s, {status["commands"]} commands')
+    else:
+        click.echo('The daemon is not running')
+        sys.exit(1)
@@ -19,13 +19,20 @@ TEST_FOLDER = 'test'
 WAW_FOLDER = 'waw'
 READONLY_SERVICES = 'readonly_services.txt'
 MAIN_BRANCH = 'main_branch.txt'
+CACHE_FOLDER = 'cache'
+DEFAULT_JOBS = 4
+DEFAULT_INDEX_TTL = 300
+DEFAULT_PAGE_LIMIT = 100
+DEFAULT_DELTA_MAX_OPERATIONS = 50
 
 GIT_WAW = ('https://github.com/xverges/watson-assistant-workbench.git', '8f1f8e3')
 GIT_WTT = ('https://github.com/cognitive-catalyst/WA-Testing-Tool.git', '25c07b8')
 
 _cache = {'project_folder': '',
           'code_folder': '',
-          'cfg': {}}
+          'cfg': {},
+          'main_branch': '',
+          'refresh': False}
 
 
 def init(prompt: bool = True, main_branch: str = 'master'):
@@ -71,6 +78,7 @@ def init(prompt: bool = True, main_branch: str = 'master'):
     cfg_file = _main_branch_file()
     with open(cfg_file, 'w', encoding='utf-8') as _file:
         _file.write(main_branch)
+    _cache['main_branch'] = ''
 
     click.echo('The values you have supplied have been added to the .env file')
 
@@ -107,7 +115,7 @@ def travis():
     url = os.environ.get('WA_URL', False)
     url_text = '# WA_URL needs to be defined.' if not url else \
                f'- WA_URL={url}'
-    for script in ['travis-deploy.sh', 'travis-test.sh', 'travis-cleanup.sh']:
+    for script in ['travis-ci.sh']:
         target_script = os.path.join(project_folder, WACLI_FOLDER, script)
         shutil.copyfile(os.path.join(resources_folder, script), target_script)
         os.chmod(target_script, 0o775)
@@ -218,16 +226,60 @@ def waw_scripts_folder() -> str:
     return os.path.join(get_cfg_value('WAW_PATH'), "scripts")
 
 
+def cache_folder() -> str:
+    "Folder for the caches kept between invocations. Empty if this is not a wa-cli project"
+    project_folder = get_project_folder()
+    if not project_folder:
+        return ''
+    folder = os.path.join(project_folder, WACLI_FOLDER, CACHE_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def request_refresh():
+    "Make the caches ignore their contents for the rest of the execution"
+    _cache['refresh'] = True
+
+
+def index_ttl() -> float:
+    "Seconds that a list of workspaces is trusted. Set with WA_INDEX_TTL"
+    if _cache['refresh']:
+        return 0
+    try:
+        return float(os.environ.get('WA_INDEX_TTL', DEFAULT_INDEX_TTL))
+    except ValueError:
+        return DEFAULT_INDEX_TTL
+
+
+def page_limit() -> int:
+    "Number of workspaces requested per page when listing them. Set with WA_PAGE_LIMIT"
+    try:
+        return max(1, int(os.environ.get('WA_PAGE_LIMIT', DEFAULT_PAGE_LIMIT)))
+    except ValueError:
+        return DEFAULT_PAGE_LIMIT
+
+
+def delta_max_operations() -> int:
+    "Larger delta deploys fall back to a full update. Set with WA_DELTA_MAX_OPERATIONS"
+    try:
+        return int(os.environ.get('WA_DELTA_MAX_OPERATIONS', DEFAULT_DELTA_MAX_OPERATIONS))
+    except ValueError:
+        return DEFAULT_DELTA_MAX_OPERATIONS
+
+
 def _main_branch_file() -> str:
     folder = get_project_folder()
     return os.path.join(folder, WACLI_FOLDER, MAIN_BRANCH)
 
 
 def main_branch() -> str:
-    with open(_main_branch_file(), 'r', encoding='utf-8') as _file:
-        for line in _file.readlines():
-            if line and not line.startswith('#'):
-                return line.strip()
+    if not _cache['main_branch']:
+        with open(_main_branch_file(), 'r', encoding='utf-8') as _file:
+            for line in _file.readlines():
+                if line and not line.startswith('#'):
+                    _cache['main_branch'] = line.strip()
+                    break
+    return _cache['main_branch'] or None
 
 
 def check_context(ctx):
@@ -292,7 +344,9 @@ def update_gitignore_contents(existing_lines: list) -> list:
     entries = """
     /.env
     /.wa-cli/readonly_services.txt
+    /.wa-cli/cache
     /waw/re-assembled
+    /waw/.staging-*
     wa-testing-tool.ini
     wa_json
     log.log
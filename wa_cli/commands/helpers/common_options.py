@@ -2,6 +2,8 @@ import os
 
 import click
 
+from .cfg import DEFAULT_JOBS
+
 
 def non_empty(ctx, param, value):
     if not value:
@@ -18,6 +20,17 @@ url = click.option('--url',
                    callback=non_empty,
                    show_default="Value of WA_URL", required=True)
 
+jobs = click.option('--jobs', default=DEFAULT_JOBS, show_default=True,
+                    help='Number of skills processed concurrently')
+test_jobs = click.option('--jobs', default=1, show_default=True,
+                         help='Number of test files run concurrently, or of conversations with --native')
+blind_jobs = click.option('--jobs', default=10, show_default=True,
+                          help='Number of concurrent message calls with --native')
+native = click.option('--native', is_flag=True,
+                      help='Run the tests in-process, instead of with the WA-Testing-Tool scripts')
+delta = click.option('--delta', is_flag=True,
+                     help='Only send the changes made since the skill was last deployed or exported')
+
 mandatory = [apikey, url]
 
 
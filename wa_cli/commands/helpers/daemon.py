@@ -0,0 +1,308 @@
+"""
+A process that runs the commands of a project, keeping its caches warm between them
+
+`wa-cli daemon start` serves the commands of the project on a unix socket. When it is
+running, `wa-cli` sends its arguments, folder and environment to it, along with its
+stdin, stdout and stderr, and the daemon runs the command writing directly to them.
+The SDK and the command modules are imported once, and the Service objects (with their
+IAM token and their pool of connections), the lists of workspaces and the git answers
+are kept until .env or the git HEAD change.
+"""
+
+import array
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import _thread
+from typing import Dict, List, Tuple
+
+from . import cfg
+from . import git
+
+DEFAULT_IDLE_TIMEOUT = 3600
+START_TIMEOUT = 10
+MAX_FDS = 3
+LENGTH = struct.Struct('>I')
+
+
+def socket_path(project_folder: str) -> str:
+    "Unix socket of the daemon of the project. Kept out of the project: their paths are limited to ~100 chars"
+    digest = hashlib.sha256(os.path.realpath(project_folder).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'wa-cli-{os.getuid()}', f'{digest}.sock')
+
+
+def _send(connection: socket.socket, message: Dict, fds: List[int] = ()):
+    data = json.dumps(message).encode('utf-8')
+    data = LENGTH.pack(len(data)) + data
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))] if fds else []
+    sent = connection.sendmsg([data], ancillary)
+    if sent < len(data):
+        connection.sendall(data[sent:])
+
+
+def _receive(connection: socket.socket) -> Tuple[Dict, List[int]]:
+    "A message and the file descriptors that came with it"
+    fds = array.array('i')
+    data, ancillary, _, _ = connection.recvmsg(64 * 1024, socket.CMSG_LEN(MAX_FDS * fds.itemsize))
+    for level, kind, fd_data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(fd_data[:len(fd_data) - (len(fd_data) % fds.itemsize)])
+    while len(data) < LENGTH.size or len(data) < LENGTH.size + LENGTH.unpack(data[:LENGTH.size])[0]:
+        chunk = connection.recv(64 * 1024)
+        if not chunk:
+            raise ConnectionError('Incomplete message')
+        data += chunk
+    return json.loads(data[LENGTH.size:].decode('utf-8')), list(fds)
+
+
+def _connect(project_folder: str) -> socket.socket:
+    path = socket_path(project_folder)
+    if os.stat(os.path.dirname(path)).st_uid != os.getuid():
+        raise PermissionError(f'{os.path.dirname(path)} belongs to another user')
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        raise
+    return connection
+
+
+def request(project_folder: str, message: Dict) -> Dict:
+    "Answer of the daemon of the project to a control message. None if it is not running"
+    try:
+        with _connect(project_folder) as connection:
+            # A daemon that is stuck does not answer
+            connection.settimeout(START_TIMEOUT)
+            _send(connection, message)
+            return _receive(connection)[0]
+    except (OSError, ValueError):
+        return None
+
+
+def forward(args: List[str]) -> int:
+    "Have the daemon of the project run the command. Its exit code, or None if there is no daemon or it refused"
+    project_folder = cfg.get_project_folder()
+    if not project_folder or not os.path.exists(socket_path(project_folder)):
+        return None
+    try:
+        connection = _connect(project_folder)
+        _send(connection, {'command': 'run', 'args': args, 'cwd': os.getcwd(), 'env': dict(os.environ)},
+              [0, 1, 2])
+    except OSError:
+        return None
+    with connection:
+        try:
+            return _receive(connection)[0]['exit_code']
+        except KeyboardInterrupt:
+            # Closing the connection interrupts the command in the daemon
+            return 130
+        except (OSError, ValueError, KeyError):
+            sys.stderr.write('The wa-cli daemon stopped while running the command\n')
+            return 1
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def _stamps(project_folder: str) -> Dict[str, list]:
+    "What the kept answers depend on: the .env file, and the git HEAD and main branch"
+    main_branch_file = os.path.join(project_folder, cfg.WACLI_FOLDER, cfg.MAIN_BRANCH)
+    git_stamps = [_stat(main_branch_file)]
+    try:
+        git_dir, common_dir = git._find_git_folders(project_folder)
+        head = git._read(os.path.join(git_dir, 'HEAD'))
+        refs = [head[len('ref:'):].strip()] if head.startswith('ref:') else []
+        refs.append(f'refs/heads/{git._read(main_branch_file)}')
+        git_stamps += [head, _stat(os.path.join(common_dir, 'packed-refs'))]
+        git_stamps += [_stat(os.path.join(common_dir, *ref.split('/'))) for ref in refs]
+    except (git.GitFallback, OSError):
+        pass
+    return {'env': [_stat(os.path.join(project_folder, '.env'))], 'git': git_stamps}
+
+
+def _flush():
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+
+def _exit_code(args: List[str]) -> int:
+    "Run the command like the wa-cli script would, and return its exit code"
+    from wa_cli import entry_point
+    saved_argv = sys.argv
+    sys.argv = ['wa-cli'] + args
+    try:
+        entry_point.main(args, prog_name='wa-cli')
+    except SystemExit as xcpt:
+        if xcpt.code is None or isinstance(xcpt.code, int):
+            return xcpt.code or 0
+        print(xcpt.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.argv = saved_argv
+    return 0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        message, fds = _receive(self.request)
+        try:
+            command = message.get('command')
+            if command == 'run' and len(fds) == MAX_FDS:
+                answer = {'exit_code': self.server.run(message, fds, self.request)}
+            elif command == 'status':
+                answer = self.server.status()
+            elif command == 'stop':
+                self.server.stopping = True
+                answer = self.server.status()
+            else:
+                answer = {'error': f'Unknown command {command}'}
+            _send(self.request, answer)
+        except ConnectionError:
+            # The client was interrupted, and is not waiting for the answer
+            pass
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """
+    Runs the commands of a project, one at a time, in this process
+
+    The file descriptors of the client become our stdin, stdout and stderr while its
+    command runs, so they are not shared by concurrent commands.
+    """
+
+    def __init__(self, project_folder: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.project_folder = project_folder
+        self.timeout = idle_timeout or None
+        self.stopping = False
+        self.started_at = time.time()
+        self.commands = 0
+        self._stamps = _stamps(project_folder)
+        self._running_lock = threading.Lock()
+        path = socket_path(project_folder)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            # Left behind by a daemon that did not stop cleanly
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def handle_timeout(self):
+        self.stopping = True
+
+    def serve(self):
+        from wa_cli import entry_point, LAZY_COMMANDS
+        from ..wa import wa
+        wa.keep_services()
+        for name in LAZY_COMMANDS:
+            entry_point.get_command(None, name)
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.unlink(self.server_address)
+
+    def status(self) -> Dict:
+        return {'pid': os.getpid(),
+                'project_folder': self.project_folder,
+                'uptime': time.time() - self.started_at,
+                'commands': self.commands}
+
+    def _invalidate_changed_caches(self):
+        from ..wa import wa
+        from . import skills_index
+        stamps = _stamps(self.project_folder)
+        if stamps['env'] != self._stamps['env']:
+            # Other credentials or services: new Service objects and lists of workspaces
+            wa.keep_services()
+            skills_index._cache['entries'] = None
+        if stamps['git'] != self._stamps['git']:
+            git._cache.clear()
+            cfg._cache['main_branch'] = ''
+        self._stamps = stamps
+
+    def _interrupt_when_closed(self, connection: socket.socket, running: threading.Event):
+        "The client closes the connection when it is interrupted: interrupt its command too, if it is still running"
+        try:
+            connection.recv(1)
+        except OSError:
+            pass
+        with self._running_lock:
+            if running.is_set():
+                _thread.interrupt_main()
+
+    def _watch(self, connection: socket.socket) -> Tuple[threading.Event, threading.Thread]:
+        running = threading.Event()
+        running.set()
+        watcher = threading.Thread(target=self._interrupt_when_closed, args=(connection, running), daemon=True)
+        watcher.start()
+        return running, watcher
+
+    def _stop_watching(self, connection: socket.socket, running: threading.Event, watcher: threading.Thread):
+        "Before the answer is sent, so that the client closing the connection cannot interrupt the next command"
+        with self._running_lock:
+            running.clear()
+        try:
+            # Wakes the watcher up, the connection can still send the answer
+            connection.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+        watcher.join()
+
+    def run(self, message: Dict, fds: List[int], connection: socket.socket) -> int:
+        "The exit code of the command, or None if the client has to run it"
+        from wa_cli import _command_name
+        if _command_name(message['args']) == 'daemon':
+            # It would ask this daemon, that serves one command at a time, and wait for itself
+            return None
+        self._invalidate_changed_caches()
+        self.commands += 1
+        saved_fds = [os.dup(n) for n in range(MAX_FDS)]
+        saved_environ = dict(os.environ)
+        try:
+            _flush()
+            for n, fd in enumerate(fds):
+                os.dup2(fd, n)
+            os.environ.clear()
+            os.environ.update(message['env'])
+            os.chdir(message['cwd'])
+            cfg._cache['refresh'] = False
+            running, watcher = self._watch(connection)
+            try:
+                return _exit_code(message['args'])
+            finally:
+                self._stop_watching(connection, running, watcher)
+        except KeyboardInterrupt:
+            return 130
+        finally:
+            _flush()
+            for n, fd in enumerate(saved_fds):
+                os.dup2(fd, n)
+                os.close(fd)
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            os.chdir(self.project_folder)
@@ -1,12 +1,85 @@
-
 import os
 import subprocess
+from typing import Tuple
 
+from . import profiler
 from .cfg import WAW_FOLDER, main_branch
 
+# Answers by (query, git folder, argument). The repository is not expected to change
+# while a command runs, so they are kept for the lifetime of the process
+_cache = {}
+
+
+class GitFallback(Exception):
+    "The repository uses something that is not read directly: ask the git command instead"
+
 
 def _run_command(command: list) -> str:
-    return subprocess.run(command, stdout=subprocess.PIPE).stdout.decode('utf-8')
+    with profiler.span(' '.join(command[:2]), 'git'):
+        return subprocess.run(command, stdout=subprocess.PIPE).stdout.decode('utf-8')
+
+
+def _read(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as _file:
+        return _file.read().strip()
+
+
+def _git_folders() -> Tuple[str, str]:
+    """
+    The git folder of the working tree that holds the current folder (where HEAD is), and
+    the common one (where the refs and objects are). They are different for worktrees
+    """
+    if 'GIT_DIR' in os.environ:
+        raise GitFallback('GIT_DIR is set')
+    key = ('git folders', os.getcwd())
+    if key not in _cache:
+        _cache[key] = _find_git_folders(os.getcwd())
+    return _cache[key]
+
+
+def _find_git_folders(folder: str) -> Tuple[str, str]:
+    while True:
+        dot_git = os.path.join(folder, '.git')
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules have a "gitdir: <path>" file instead
+            contents = _read(dot_git)
+            if not contents.startswith('gitdir:'):
+                raise GitFallback(f'Unexpected {dot_git}')
+            git_dir = os.path.normpath(os.path.join(folder, contents[len('gitdir:'):].strip()))
+            break
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            raise GitFallback('Not in a git repository')
+        folder = parent
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_file):
+        common_dir = os.path.normpath(os.path.join(git_dir, _read(commondir_file)))
+    return git_dir, common_dir
+
+
+def _check_extensions(common_dir: str):
+    "Repositories with SHA-256 objects or reftable refs are not read directly"
+    key = ('extensions', common_dir)
+    if key not in _cache:
+        extensions = []
+        section = ''
+        try:
+            with open(os.path.join(common_dir, 'config'), 'r', encoding='utf-8') as config_file:
+                for line in config_file:
+                    line = line.strip()
+                    if line.startswith('['):
+                        section = line.strip('[]').strip().lower()
+                    elif section == 'extensions' and '=' in line:
+                        extensions.append(line.split('=', 1)[0].strip().lower())
+        except OSError:
+            pass
+        _cache[key] = [name for name in extensions if name in ('objectformat', 'refstorage')]
+    if _cache[key]:
+        raise GitFallback(f'extensions.{_cache[key][0]} is set')
 
 
 def current_branch() -> str:
@@ -15,8 +88,27 @@ def current_branch() -> str:
             return 'PR_' + os.environ['TRAVIS_PULL_REQUEST_BRANCH']
     if 'TRAVIS_BRANCH' in os.environ:
         return os.environ['TRAVIS_BRANCH']
-    output = _run_command(['git', 'branch'])
+    try:
+        git_dir, common_dir = _git_folders()
+        _check_extensions(common_dir)
+    except (GitFallback, OSError):
+        git_dir = ''
+    key = ('current branch', git_dir or os.getcwd())
+    if key not in _cache:
+        _cache[key] = _current_branch(git_dir)
+    return _cache[key]
+
 
+def _current_branch(git_dir: str) -> str:
+    if git_dir:
+        try:
+            head = _read(os.path.join(git_dir, 'HEAD'))
+            if head.startswith('ref: refs/heads/'):
+                return head[len('ref: refs/heads/'):]
+        except OSError:
+            pass
+    # Detached HEAD, or a repository that we cannot read: git knows how to name it
+    output = _run_command(['git', 'branch'])
     for line in output.splitlines():
         if line.startswith('*'):
             return line.split()[1]
@@ -26,5 +118,13 @@ def current_branch() -> str:
 def skill_is_in_master(skill_name: str) -> bool:
     if 'TRAVIS' in os.environ and os.environ['TRAVIS'] == 'true':
         return True
-    output = _run_command(['git', 'ls-tree', f'{main_branch()}:{WAW_FOLDER}/{skill_name}'])
+    try:
+        common_dir = _git_folders()[1]
+    except (GitFallback, OSError):
+        common_dir = os.getcwd()
+    key = ('ls-tree', common_dir, f'{main_branch()}:{WAW_FOLDER}/{skill_name}')
+    if key not in _cache:
+        # Without --full-tree, the entries are filtered by the current folder when it is not the top one
+        _cache[key] = _run_command(['git', 'ls-tree', '--full-tree', key[2]])
+    output = _cache[key]
     return output and len(output.split()) >= 6
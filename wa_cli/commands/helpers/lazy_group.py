@@ -0,0 +1,47 @@
+"""
+A click group whose subcommands are only imported when they are needed
+
+The modules of the subcommands import the Watson SDK and the testing and workbench
+helpers, so importing all of them made every invocation, and every shell completion
+keystroke, pay for all of them.
+"""
+
+import importlib
+from typing import Dict, Tuple
+
+import click
+
+
+class LazyGroup(click.Group):
+
+    def __init__(self, *args, lazy_commands: Dict[str, Tuple[str, str]] = None, **kwargs):
+        """
+        `lazy_commands` maps the subcommand names to ('module:attribute', short help). The
+        short help is shown by --help, so that listing the subcommands does not import them
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        if name in self.lazy_commands and name not in self.commands:
+            module_name, attribute = self.lazy_commands[name][0].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), attribute), name)
+        return super().get_command(ctx, name)
+
+    def format_commands(self, ctx, formatter):
+        names = [name for name in self.list_commands(ctx)
+                 if name in self.lazy_commands or not self.commands[name].hidden]
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            if name in self.commands:
+                rows.append((name, self.commands[name].get_short_help_str(limit)))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+        with formatter.section('Commands'):
+            formatter.write_dl(rows)
@@ -0,0 +1,167 @@
+"""
+Timed spans of the API calls, subprocesses and file I/O of a command, for `wa-cli --profile`
+
+The spans are written as a Chrome trace, that chrome://tracing and https://ui.perfetto.dev
+can open, along with the memory traced by tracemalloc at the end of each span. When the
+profile has not been requested, span() does nothing but check it.
+"""
+
+import contextlib
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import click
+
+TOP_SPANS = 15
+
+_lock = threading.Lock()
+_async_ids = itertools.count(1)
+_cache = {'events': None,
+          'trace_file': '',
+          'command': '',
+          'started': 0.0,
+          'threads': set()}
+
+
+def enabled() -> bool:
+    return _cache['events'] is not None
+
+
+def start(trace_file: str, command: str):
+    "Record spans until stop()"
+    _cache.update(events=[], trace_file=trace_file, command=command, started=time.perf_counter(), threads=set())
+    tracemalloc.start()
+
+
+def worker_start() -> float:
+    "What a worker process needs to record spans for the profile: its start. None if it is not enabled"
+    return _cache['started'] if enabled() else None
+
+
+def start_worker(started: float):
+    "In a worker process, record spans for the profile started at `started`, until worker_events()"
+    _cache.update(events=[], trace_file='', command='', started=started, threads=set())
+    if tracemalloc.is_tracing():
+        # Inherited from a forked parent: its traces are not the memory of this worker
+        tracemalloc.clear_traces()
+    else:
+        tracemalloc.start()
+
+
+def worker_events() -> List[Dict]:
+    "In a worker process, stop recording and return the spans, for the parent to merge()"
+    tracemalloc.stop()
+    with _lock:
+        events, _cache['events'] = _cache['events'], None
+    return events or []
+
+
+def merge(events: List[Dict]):
+    "Add the spans recorded by a worker process. They keep its pid"
+    with _lock:
+        if _cache['events'] is not None:
+            _cache['events'].extend(events)
+
+
+def _microseconds(moment: float) -> float:
+    return round((moment - _cache['started']) * 1e6, 1)
+
+
+def _record(name: str, category: str, start: float, end: float, args: Dict, asynchronous: bool = False):
+    thread = threading.current_thread()
+    base = {'name': name, 'cat': category, 'pid': os.getpid(), 'tid': thread.ident}
+    if asynchronous:
+        # Async spans overlap on the thread of the event loop: they get their own tracks
+        span_id = next(_async_ids)
+        events = [dict(base, ph='b', id=span_id, ts=_microseconds(start), args=args),
+                  dict(base, ph='e', id=span_id, ts=_microseconds(end))]
+    else:
+        events = [dict(base, ph='X', ts=_microseconds(start), dur=round((end - start) * 1e6, 1), args=args)]
+    current, _ = tracemalloc.get_traced_memory()
+    events.append({'name': 'memory', 'ph': 'C', 'pid': base['pid'], 'ts': _microseconds(end),
+                   'args': {'traced MB': round(current / 2 ** 20, 3)}})
+    with _lock:
+        if _cache['events'] is None:
+            return
+        if thread.ident not in _cache['threads']:
+            _cache['threads'].add(thread.ident)
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': base['pid'], 'tid': thread.ident,
+                           'args': {'name': thread.name}})
+        _cache['events'].extend(events)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, asynchronous: bool = False, **args):
+    "Time the block, if the profile has been requested"
+    if _cache['events'] is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, category, start, time.perf_counter(), args, asynchronous)
+
+
+def traced(category: str, name: str = '') -> Callable:
+    "Decorator that times each call of the function"
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _cache['events'] is None:
+                return function(*args, **kwargs)
+            with span(name or function.__qualname__, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary(events: List[Dict], top: int = TOP_SPANS) -> List[Dict]:
+    "Count, total and longest duration of the spans with the longest total, in ms"
+    by_name = {}
+    starts = {}
+    for event in events:
+        if event['ph'] == 'b':
+            starts[event['id']] = event['ts']
+            continue
+        if event['ph'] == 'e':
+            duration = event['ts'] - starts.pop(event['id'])
+        elif event['ph'] == 'X':
+            duration = event['dur']
+        else:
+            continue
+        entry = by_name.setdefault((event['cat'], event['name']),
+                                   {'category': event['cat'], 'name': event['name'], 'count': 0,
+                                    'total': 0.0, 'max': 0.0})
+        entry['count'] += 1
+        entry['total'] += duration / 1000
+        entry['max'] = max(entry['max'], duration / 1000)
+    return sorted(by_name.values(), key=lambda entry: -entry['total'])[:top]
+
+
+def stop():
+    "Write the trace file and print the summary"
+    if _cache['events'] is None:
+        return
+    _record(_cache['command'], 'command', _cache['started'], time.perf_counter(), {})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with _lock:
+        events, _cache['events'] = _cache['events'], None
+    with open(_cache['trace_file'], 'w', encoding='utf-8') as json_file:
+        json.dump({'traceEvents': events,
+                   'displayTimeUnit': 'ms',
+                   'otherData': {'command': _cache['command'], 'peak traced MB': round(peak / 2 ** 20, 3)}},
+                  json_file)
+    lines = [f'Profile written to {_cache["trace_file"]}. Peak traced memory: {peak / 2 ** 20:.1f} MB',
+             f'{"total ms":>10} {"count":>6} {"max ms":>10}  span']
+    for entry in summary(events):
+        lines.append(f'{entry["total"]:10.1f} {entry["count"]:6d} {entry["max"]:10.1f}  '
+                     f'{entry["category"]}: {entry["name"]}')
+    click.echo('\n'.join(lines), err=True)
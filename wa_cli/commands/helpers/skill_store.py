@@ -0,0 +1,203 @@
+"""
+Optional store for the skill exports, enabled with WA_SKILL_STORE=1
+
+Exports are kept gzip-compressed in skills/.store/objects, named by the sha256 of their
+contents without the fields that identify the workspace (id, name, status and audit dates),
+so that a sandbox and the skill it was pushed from, or two exports of the same contents,
+are only stored once. skills/.store/manifest.json maps every "<id>-<name>" export to its
+object and keeps those fields. Objects that no export refers to are deleted. The plain
+JSON export is only written to the skills folder when a path is needed.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Iterable, Iterator, List
+
+from . import cfg
+from . import profiler
+from . import skills_index
+
+STORE_FOLDER = '.store'
+MANIFEST_FILE = 'manifest.json'
+IDENTITY_KEYS = ['workspace_id', 'name', 'status', 'created', 'updated']
+
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get('WA_SKILL_STORE', '').lower() not in ['', '0', 'false', 'no']
+
+
+def _store_folder() -> str:
+    return os.path.join(cfg.skills_folder(), STORE_FOLDER)
+
+
+def _objects_folder() -> str:
+    return os.path.join(_store_folder(), 'objects')
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(_objects_folder(), digest[:2], f'{digest}.json.gz')
+
+
+def _manifest_path() -> str:
+    return os.path.join(_store_folder(), MANIFEST_FILE)
+
+
+def _load_manifest() -> dict:
+    path = _manifest_path()
+    if os.path.isfile(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def _save_manifest(manifest: dict):
+    _write_atomically(_manifest_path(), json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+
+def _write_atomically(path: str, contents: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'wb') as _file:
+        _file.write(contents)
+    os.replace(tmp_file, path)
+
+
+def _dumps(obj: dict) -> bytes:
+    "The formatting of the exports. See export_stream"
+    return json.dumps(obj, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def _object(entry: dict) -> str:
+    "Digest of the object of a manifest entry. Earlier versions stored whole exports, named by their sha256"
+    return entry.get('object', entry['sha256'])
+
+
+def _delete_unreferenced(manifest: dict, digests: Iterable[str]):
+    referenced = {_object(entry) for entry in manifest.values()}
+    for digest in set(digests) - referenced:
+        with contextlib.suppress(OSError):
+            os.remove(_object_path(digest))
+
+
+def lookup(key: str) -> dict:
+    "Manifest entry (id, name, updated, sha256, size) of an export, or None"
+    with _lock:
+        return _load_manifest().get(key)
+
+
+@profiler.traced('io', 'store skill')
+def put(key: str, skill_data: dict, contents: bytes) -> str:
+    """
+    Store the JSON contents of an export, unless the same contents are already stored, and
+    return the sha256 of the export. The older exports of the workspace are forgotten
+    """
+    export = json.loads(contents.decode('utf-8'))
+    stored = _dumps({name: value for name, value in export.items() if name not in IDENTITY_KEYS})
+    digest = hashlib.sha256(stored).hexdigest()
+    object_path = _object_path(digest)
+    compressed = None if os.path.isfile(object_path) else gzip.compress(stored, mtime=0)
+    workspace_id = skill_data.get('workspace_id', '')
+    with _lock:
+        # Checked again under the lock: the put of another export that shared it may have deleted it
+        if not os.path.isfile(object_path):
+            _write_atomically(object_path, compressed or gzip.compress(stored, mtime=0))
+        manifest = _load_manifest()
+        # The same workspace with an earlier name
+        superseded = [old_key for old_key, entry in manifest.items()
+                      if old_key == key or (workspace_id and entry['id'] == workspace_id)]
+        old_objects = [_object(manifest.pop(old_key)) for old_key in superseded]
+        manifest[key] = {'id': workspace_id,
+                         'name': skill_data.get('name', ''),
+                         'updated': skill_data.get('updated', ''),
+                         'sha256': hashlib.sha256(contents).hexdigest(),
+                         'size': len(contents),
+                         'object': digest,
+                         'keys': list(export.keys()),
+                         'fields': {name: value for name, value in export.items() if name in IDENTITY_KEYS}}
+        _save_manifest(manifest)
+        _delete_unreferenced(manifest, old_objects)
+    return manifest[key]['sha256']
+
+
+@profiler.traced('io', 'read stored skill')
+def read(key: str) -> bytes:
+    "The JSON contents of a stored export"
+    entry = lookup(key)
+    if not entry:
+        raise KeyError(key)
+    with open(_object_path(_object(entry)), 'rb') as _file:
+        contents = gzip.decompress(_file.read())
+    if 'object' not in entry:
+        return contents
+    stored = json.loads(contents.decode('utf-8'))
+    fields = entry['fields']
+    return _dumps({name: fields[name] if name in fields else stored[name] for name in entry['keys']})
+
+
+def _write_export(key: str, full_path: str) -> str:
+    entry = lookup(key)
+    if not entry:
+        raise KeyError(key)
+    if not os.path.isfile(full_path) or skills_index.lookup(full_path)['sha256'] != entry['sha256']:
+        contents = read(key)
+        _write_atomically(full_path, contents)
+        skills_index.record(full_path, json.loads(contents.decode('utf-8')), entry['sha256'])
+    return full_path
+
+
+def export(key: str) -> str:
+    "Write the plain JSON export to the skills folder, if it is not already there, and return its path"
+    return _write_export(key, os.path.join(cfg.skills_folder(), f'{key}.json'))
+
+
+@contextlib.contextmanager
+def exported(keys: List[str]) -> Iterator[List[str]]:
+    "Plain JSON exports of the keys in a temporary folder, deleted afterwards, for the tools that need a path"
+    folder = tempfile.mkdtemp(prefix='wa-cli-store-')
+    try:
+        yield [_write_export(key, os.path.join(folder, f'{key}.json')) for key in keys]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def forget(workspace_id: str):
+    "Drop the exports of a deleted workspace"
+    with _lock:
+        manifest = _load_manifest()
+        removed = [_object(manifest.pop(key)) for key, entry in list(manifest.items()) if entry['id'] == workspace_id]
+        if removed:
+            _save_manifest(manifest)
+            _delete_unreferenced(manifest, removed)
+
+
+def prune(keys: Iterable[str]):
+    "Keep only the exports of these keys, the workspaces that still exist, and the objects they use"
+    keys = set(keys)
+    with _lock:
+        manifest = _load_manifest()
+        stale = [key for key in manifest if key not in keys]
+        for key in stale:
+            del manifest[key]
+        if stale:
+            _save_manifest(manifest)
+        # Also the objects left behind by interrupted runs
+        found = []
+        for folder, _, file_names in os.walk(_objects_folder()):
+            found.extend(file_name[:-len('.json.gz')] for file_name in file_names if file_name.endswith('.json.gz'))
+        _delete_unreferenced(manifest, found)
+
+
+def keys() -> list:
+    with _lock:
+        return list(_load_manifest().keys())
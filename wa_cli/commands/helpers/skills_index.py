@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+
+from . import cfg
+
+INDEX_FILE = 'skills.json'
+META_KEYS = ['description', 'language', 'learning_opt_out', 'name', 'system_settings']
+
+_lock = threading.Lock()
+_cache = {'path': '', 'entries': None}
+
+
+def _index_path() -> str:
+    folder = cfg.cache_folder()
+    return os.path.join(folder, INDEX_FILE) if folder else ''
+
+
+def _entries() -> dict:
+    path = _index_path()
+    if _cache['entries'] is None or _cache['path'] != path:
+        entries = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as json_file:
+                    entries = json.load(json_file)
+            except (OSError, ValueError):
+                entries = {}
+        _cache['path'] = path
+        _cache['entries'] = entries
+    return _cache['entries']
+
+
+def _save():
+    path = _cache['path']
+    if not path:
+        return
+    tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as json_file:
+        json.dump(_cache['entries'], json_file, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+
+def _is_indexed(full_path: str) -> bool:
+    skills_folder = os.path.abspath(cfg.skills_folder())
+    return os.path.dirname(full_path) == skills_folder
+
+
+def _make_entry(skill_data: dict, stat: os.stat_result, digest: str) -> dict:
+    return {
+        'id': skill_data.get('workspace_id', ''),
+        'name': skill_data.get('name', ''),
+        'updated': skill_data.get('updated', ''),
+        'language': skill_data.get('language', ''),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha256': digest,
+        'meta': {key: skill_data.get(key) for key in META_KEYS}
+    }
+
+
+def _store(full_path: str, entry: dict):
+    with _lock:
+        _entries()[os.path.basename(full_path)] = entry
+        _save()
+
+
+def record(full_path: str, skill_data: dict, digest: str):
+    "Index a skill file that has just been written with the contents of skill_data"
+    full_path = os.path.abspath(full_path)
+    if _is_indexed(full_path):
+        _store(full_path, _make_entry(skill_data, os.stat(full_path), digest))
+
+
+def lookup(full_path: str) -> dict:
+    """
+    Metadata of a skill file: id, name, updated, language, size, mtime, sha256 and the
+    meta dict used by WAW. The file is only parsed if it is not indexed or has changed.
+    """
+    full_path = os.path.abspath(full_path)
+    stat = os.stat(full_path)
+    indexed = _is_indexed(full_path)
+    if indexed:
+        with _lock:
+            entry = _entries().get(os.path.basename(full_path))
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry
+    with open(full_path, 'rb') as json_file:
+        contents = json_file.read()
+    entry = _make_entry(json.loads(contents.decode('utf-8')), stat, hashlib.sha256(contents).hexdigest())
+    if indexed:
+        _store(full_path, entry)
+    return entry
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from . import cfg
+
+# Seconds before its expiration when a cached token is no longer handed out
+EXPIRATION_MARGIN = 120
+
+_lock = threading.Lock()
+_tokens = {}
+
+
+def _key(apikey: str) -> str:
+    return hashlib.sha256(apikey.encode('utf-8')).hexdigest()[:16]
+
+
+def _path(apikey: str) -> str:
+    folder = cfg.cache_folder()
+    return os.path.join(folder, f'iam-{_key(apikey)}.json') if folder else ''
+
+
+def _is_valid(token_response: dict) -> bool:
+    try:
+        return float(token_response['expiration']) - EXPIRATION_MARGIN > time.time()
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def load(apikey: str) -> dict:
+    "The IAM token response cached for the apikey, or None if there is none or it is about to expire"
+    with _lock:
+        token_response = _tokens.get(_key(apikey))
+        if not token_response:
+            path = _path(apikey)
+            if path and os.path.isfile(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as json_file:
+                        token_response = json.load(json_file)
+                except (OSError, ValueError):
+                    token_response = None
+        if token_response and _is_valid(token_response):
+            _tokens[_key(apikey)] = token_response
+            return token_response
+        return None
+
+
+def save(apikey: str, token_response: dict):
+    "Keep an IAM token response in memory and in a file that only the current user can read"
+    with _lock:
+        _tokens[_key(apikey)] = token_response
+        path = _path(apikey)
+        if not path:
+            return
+        tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as json_file:
+            json.dump(token_response, json_file)
+        os.replace(tmp_file, path)
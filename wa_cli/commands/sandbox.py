@@ -4,7 +4,6 @@
 import json
 import os
 import sys
-import time
 
 import click
 from .helpers import protect_readonly
@@ -118,31 +117,33 @@ def enable(ctx, apikey, url, skill_name):
 @sandbox.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True, metavar='<skill_name>')
+@common_options.delta
 @click.pass_context
 @protect_readonly
-def deploy(ctx, apikey, url, skill_name):
+def deploy(ctx, apikey, url, skill_name, delta):
     """
     (master) Reassemble a skill and deploy it.
 
     Deploys the files in <project_folder>/waw/<skill_name>. Must be executed from the
     main git branch.
     """
-    Sandbox(apikey, url, skill_name).deploy()
+    Sandbox(apikey, url, skill_name).deploy(delta)
 
 
 @sandbox.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True, metavar='<skill_name>')
+@common_options.delta
 @click.pass_context
 @protect_readonly
-def push(ctx, apikey, url, skill_name):
+def push(ctx, apikey, url, skill_name, delta):
     """
     (topic branch) Reassemble a skill and deploy it as a sandbox
 
     Deploys the files in <project_folder>/waw/<skill_name> as a WA skill named
     "<gitbranch>__<skill_name>
     """
-    Sandbox(apikey, url, skill_name).push()
+    Sandbox(apikey, url, skill_name).push(delta)
 
 
 @sandbox.command()
@@ -186,16 +187,24 @@ def name(ctx, skill_name):
 
 @sandbox.command()
 @common_options.add(common_options.mandatory)
-@click.argument('skill_name', type=click.STRING, required=True)
+@click.argument('skill_names', type=click.STRING, nargs=-1, metavar='[<skill_name>...]')
+@click.option('--all', 'all_skills', is_flag=True,
+              help='Wait for all the skills with flow tests in <project_folder>/test/flow')
 @click.option('--timeout', default=300, show_default=True, help='Timeout in seconds')
 @click.pass_context
-def wait_for_ready(ctx, apikey, url, skill_name, timeout):
+def wait_for_ready(ctx, apikey, url, skill_names, all_skills, timeout):
     """
-    Wait for a skill sandbox to be trained after deployment
+    Wait for skill sandboxes to be trained after deployment
 
-    Returns 1 if timeout expires before the skill is ready, 0 otherwise.
+    All the skills are polled at once, more often while they have just started
+    training. Returns 1 if timeout expires before all the skills are ready, 0 otherwise.
     """
-    sys.exit(Sandbox(apikey, url, skill_name).wait_for_ready(timeout))
+    if all_skills:
+        skill_names = wa_testing.flow_test_skills()
+    if not skill_names:
+        raise click.UsageError('Specify the skills to wait for, or use --all')
+    sandbox_names = [Sandbox(apikey, url, skill_name).sandbox_name for skill_name in skill_names]
+    sys.exit(0 if wa.wait_for_skills(apikey, url, sandbox_names, timeout) else 1)
 
 
 @click.group()
@@ -210,24 +219,30 @@ def test():
 @click.argument('skill_name', type=click.STRING, required=True)
 @click.option('--folds', default=5, show_default=True)
 @click.option('--show-graphics', is_flag=True, help='Open a browser with the generated images')
-def kfold(apikey, url, skill_name, folds, show_graphics):
+@common_options.blind_jobs
+@common_options.native
+def kfold(apikey, url, skill_name, folds, show_graphics, jobs, native):
     """
     k-fold test to measure ground truth consistency
 
     \b
     The test data is obtained from the skill deployed as a sandbox.
     See https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/examples/kfold.md for details
+    With --native, the metrics are written to kfold-out.metrics.csv and kfold-out.confusion.csv
     """
     sandbox = Sandbox(apikey, url, skill_name)
     output_dir = wa_testing.output_dir_for_skill(skill_name, 'kfold')
-    wa_testing.k_fold(apikey, url, '', folds, show_graphics, skill_name=sandbox.sandbox_name, output_dir=output_dir)
+    wa_testing.k_fold(apikey, url, '', folds, show_graphics, skill_name=sandbox.sandbox_name, output_dir=output_dir,
+                      jobs=jobs, native=native)
 
 
 @test.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True)
 @click.option('--show-graphics', is_flag=True, help='Open a browser with the generated images')
-def blind(apikey, url, skill_name, show_graphics):
+@common_options.blind_jobs
+@common_options.native
+def blind(apikey, url, skill_name, show_graphics, jobs, native):
     """
     blind test using a CSV file with utterances and expected intents
 
@@ -235,16 +250,20 @@ def blind(apikey, url, skill_name, show_graphics):
     The tests will be run on the skill deployed as a sandbox.
     The file <project_root>/test/blind/<skill_name>/input.csv will be used as input.
     See https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/examples/blind.md for details
+    With --native, the metrics are written to blind-out_metrics.csv and blind-out_confusion.csv
     """
     sandbox = Sandbox(apikey, url, skill_name)
     output_dir = wa_testing.output_dir_for_skill(skill_name, 'blind')
-    wa_testing.blind(apikey, url, sandbox.sandbox_name, show_graphics, output_dir=output_dir)
+    wa_testing.blind(apikey, url, sandbox.sandbox_name, show_graphics, output_dir=output_dir,
+                     jobs=jobs, native=native)
 
 
 @test.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True)
-def flow(apikey, url, skill_name):
+@common_options.test_jobs
+@common_options.native
+def flow(apikey, url, skill_name, jobs, native):
     """
     dialog flow test
 
@@ -253,10 +272,13 @@ def flow(apikey, url, skill_name):
     Files matching <project_root>/test/flow/<skill_name>/*.tsv will be used as input. Example input:
     https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/dialog_test/tests/Customer_Care_Test.tsv
     You can start an new conversation specifying NEWCONVERSATION as the user input.
+    With --native, the reports are written by wa-cli, not by the WA-Testing-Tool. They have the input
+    columns, and Output Text, Output Intent, Output Entities, Result (PASS or FAIL) and Error.
+    The turns that failed, or that were not sent because an earlier one failed, only have Result and Error.
     """
     sandbox = Sandbox(apikey, url, skill_name)
     output_dir = wa_testing.output_dir_for_skill(skill_name, 'flow')
-    rc = wa_testing.flow(apikey, url, sandbox.sandbox_name, output_dir=output_dir)
+    rc = wa_testing.flow(apikey, url, sandbox.sandbox_name, output_dir=output_dir, jobs=jobs, native=native)
     if rc:
         sys.exit(rc)
 
@@ -308,22 +330,24 @@ class Sandbox(object):
         if not git.skill_is_in_master(self.skill_name):
             self._error(f"The skill does not exist in the main branch '{cfg.main_branch()}'")
 
-    def push(self):
+    def push(self, delta: bool = False):
         self._check_current_branch(must_be_master=False)
         self._check_skill_decomposed()
         skill_file = workbench.reassemble_skill_file(skill_name=self.skill_name,
                                                      new_name=self.sandbox_name,
                                                      force=True)
-        wa.deploy_skill(self.apikey, self.url, skill_file, force=True)
+        success = wa.deploy_skill(self.apikey, self.url, skill_file, force=True, delta=delta)
         click.echo('Done!')
+        return success
 
-    def deploy(self):
+    def deploy(self, delta: bool = False):
         self._check_current_branch(must_be_master=True)
         self._check_skill_decomposed()
         skill_file = workbench.reassemble_skill_file(skill_name=self.skill_name,
                                                      force=True)
-        wa.deploy_skill(self.apikey, self.url, skill_file, force=True)
+        success = wa.deploy_skill(self.apikey, self.url, skill_file, force=True, delta=delta)
         click.echo('Done!')
+        return success
 
     def _decompose(self, skill_name: str):
         skill_file = wa.get_skill(self.apikey, self.url, self.sandbox_name)
@@ -361,20 +385,4 @@ class Sandbox(object):
         wa.delete_skill(self.apikey, self.url, name=self.sandbox_name)
 
     def wait_for_ready(self, timeout):
-        start_time = time.time()
-        id = wa.workspace_id_from_skill_name(self.apikey, self.url, self.sandbox_name)
-        if not id:
-            click.echo(f'"{self.sandbox_name}" was not found status. Not waiting.')
-            return 1
-
-        while time.time() - start_time < timeout:
-            status = wa.get_skill_status(self.apikey, self.url, id)
-            if status == 'Available':
-                return 0
-            elif status == 'Training':
-                time.sleep(15)
-            else:
-                click.echo(f'"{self.sandbox_name}" status is {status}. Not waiting.')
-                return 1
-        click.echo(f'"{self.sandbox_name}" readiness timed out')
-        return 1
+        return 0 if wa.wait_for_skills(self.apikey, self.url, [self.sandbox_name], timeout) else 1
@@ -22,24 +22,28 @@ def service(ctx):
 
 @service.command()
 @common_options.add(common_options.mandatory)
+@click.argument('pattern', default='*')
+@common_options.jobs
 @click.pass_context
 @protect_readonly
-def delete_all(ctx, apikey, url):
+def delete_all(ctx, apikey, url, pattern, jobs):
     """
-    Delete all the skill in the service
+    Delete all the skills in the service whose name matches 'pattern'
     """
-    success = wa.delete_all_skills(apikey, url)
+    success = wa.delete_all_skills(apikey, url, pattern, jobs)
     click.echo(f'Success: {success}')
 
 
 @service.command()
 @click.option('--force', is_flag=True)
+@common_options.jobs
 @click.pass_context
-def decompose(ctx, force):
+def decompose(ctx, force, jobs):
     """
     Decompose all the files in the skills folder with WAW (Watson Assistant Workbench)
     """
-    workbench.decompose_all_skill_files(force)
+    success = workbench.decompose_all_skill_files(force, jobs)
+    click.echo(f'Success: {success}')
 
 
 @service.command()
@@ -53,21 +57,25 @@ def decompose(ctx, force):
               callback=common_options.non_empty,
               show_default="Value of WA_URL_SRC", required=True)
 @click.option('--force', is_flag=True)
+@common_options.jobs
 @click.pass_context
 @protect_readonly
-def clone_skills(ctx, apikey, url, src_apikey, src_url, force):
+def clone_skills(ctx, apikey, url, src_apikey, src_url, force, jobs):
     """
     Clone the skills from a service into another
     """
-    wa.clone_service_skills(apikey, url, src_apikey, src_url, force)
+    success = wa.clone_service_skills(apikey, url, src_apikey, src_url, force, jobs)
+    click.echo(f'Success: {success}')
 
 
 @service.command()
 @common_options.add(common_options.mandatory)
 @click.option('--force', is_flag=True)
+@common_options.jobs
 @click.pass_context
-def download_skills(ctx, apikey, url, force):
+def download_skills(ctx, apikey, url, force, jobs):
     """
     Download all the skills from a service
     """
-    wa.download_service_skills(apikey, url, force)
+    success = wa.download_service_skills(apikey, url, force, jobs)
+    click.echo(f'Success: {success}')
@@ -38,12 +38,13 @@ def list_skills(apikey, url, pattern):
 @common_options.add(common_options.mandatory)
 @click.argument('skill_file', type=click.Path(exists=True))
 @click.option('--force', is_flag=True)
+@common_options.delta
 @protect_readonly
-def deploy(ctx, apikey, url, skill_file, force):
+def deploy(ctx, apikey, url, skill_file, force, delta):
     """
     Create/update a skill from a json file
     """
-    success = wa.deploy_skill(apikey, url, skill_file, force)
+    success = wa.deploy_skill(apikey, url, skill_file, force, delta)
     click.echo(f'Success: {success}')
 
 
@@ -125,35 +126,43 @@ def test():
 @click.argument('skill_file', type=click.Path(exists=True))
 @click.option('--folds', default=5, show_default=True)
 @click.option('--show-graphics', is_flag=True, help='Open a browser with the generated images')
-def kfold(apikey, url, skill_file, folds, show_graphics):
+@common_options.blind_jobs
+@common_options.native
+def kfold(apikey, url, skill_file, folds, show_graphics, jobs, native):
     """
     k-fold test to measure ground truth consistency
 
     \b
     See https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/examples/kfold.md for details
+    With --native, the metrics are written to kfold-out.metrics.csv and kfold-out.confusion.csv
     """
-    wa_testing.k_fold(apikey, url, skill_file, folds, show_graphics)
+    wa_testing.k_fold(apikey, url, skill_file, folds, show_graphics, jobs=jobs, native=native)
 
 
 @test.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True)
 @click.option('--show-graphics', is_flag=True, help='Open a browser with the generated images')
-def blind(apikey, url, skill_name, show_graphics):
+@common_options.blind_jobs
+@common_options.native
+def blind(apikey, url, skill_name, show_graphics, jobs, native):
     """
     blind test using a CSV file with utterances and expected intents
 
     \b
     The file <project_root>/test/blind/<skill_name>/input.csv will be used as input.
     See https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/examples/blind.md for details
+    With --native, the metrics are written to blind-out_metrics.csv and blind-out_confusion.csv
     """
-    wa_testing.blind(apikey, url, skill_name, show_graphics)
+    wa_testing.blind(apikey, url, skill_name, show_graphics, jobs=jobs, native=native)
 
 
 @test.command()
 @common_options.add(common_options.mandatory)
 @click.argument('skill_name', type=click.STRING, required=True)
-def flow(apikey, url, skill_name):
+@common_options.test_jobs
+@common_options.native
+def flow(apikey, url, skill_name, jobs, native):
     """
     dialog flow test
 
@@ -162,7 +171,7 @@ def flow(apikey, url, skill_name):
     https://github.com/cognitive-catalyst/WA-Testing-Tool/blob/master/dialog_test/tests/Customer_Care_Test.tsv
     You can start an new conversation specifying NEWCONVERSATION as the user input.
     """
-    rc = wa_testing.flow(apikey, url, skill_name)
+    rc = wa_testing.flow(apikey, url, skill_name, jobs=jobs, native=native)
     if rc:
         sys.exit(rc)
 
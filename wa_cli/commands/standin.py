@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+
+import click
+from .wa.standin import StandIn, DEFAULT_RATE_WINDOW, DEFAULT_TRAINING_DELAY
+
+
+@click.command()
+@click.option('--port', default=8080, show_default=True)
+@click.option('--training-delay', default=DEFAULT_TRAINING_DELAY, show_default=True,
+              help='Seconds that a workspace is Training after each change')
+@click.option('--rate-limit', default=0, show_default=True,
+              help='Calls allowed in each rate window. 0 disables the rate limits')
+@click.option('--rate-window', default=DEFAULT_RATE_WINDOW, show_default=True, help='Seconds')
+@click.option('--record', type=click.Path(dir_okay=False),
+              help='Forward the calls to the --upstream-url service, and append them to this file')
+@click.option('--replay', type=click.Path(exists=True, dir_okay=False),
+              help='Answer with the responses recorded in this file')
+@click.option('--upstream-apikey', default=lambda: os.environ.get('WA_APIKEY', ''), show_default='Value of WA_APIKEY')
+@click.option('--upstream-url', default=lambda: os.environ.get('WA_URL', ''), show_default='Value of WA_URL')
+@click.option('--verbose', is_flag=True, help='Log the requests')
+def standin(port, training_delay, rate_limit, rate_window, record, replay, upstream_apikey, upstream_url, verbose):
+    """
+    Serve a local stand-in for the Watson Assistant API.
+
+    \b
+    Commands run with --url http://127.0.0.1:<port> use it, without authentication.
+    The workspaces are kept in memory, unless the calls are recorded from, or
+    replayed for, a real service.
+    """
+    if record and replay:
+        raise click.UsageError('Use only one of --record and --replay')
+    if record and not (upstream_apikey and upstream_url):
+        raise click.UsageError('--record needs --upstream-apikey and --upstream-url')
+    server = StandIn(port, training_delay, rate_limit, rate_window, record, replay,
+                     upstream_apikey, upstream_url, verbose)
+    click.echo(f'Serving on {server.url}. Press Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,120 @@
+"""
+Compute the API calls that turn a deployed skill into a new version of it
+
+Intents, entities and counterexamples are diffed element by element, and their changes
+are applied with the per-element endpoints. Dialog node changes that only set fields are
+applied with update_dialog_node; new, deleted or reordered nodes, and any change that the
+per-element endpoints cannot express, replace the whole section with update_workspace.
+"""
+
+from collections import namedtuple
+from typing import Dict, List
+
+# Operation(action, method_name, kwargs): self.service.<method_name>(workspace_id, **kwargs)
+Operation = namedtuple('Operation', ['action', 'method', 'kwargs'])
+DeltaPlan = namedtuple('DeltaPlan', ['operations', 'workspace_update'])
+
+WORKSPACE_FIELDS = ['name', 'description', 'language', 'metadata', 'learning_opt_out',
+                    'system_settings', 'webhooks']
+INTENT_FIELDS = ['intent', 'description', 'examples']
+ENTITY_FIELDS = ['entity', 'description', 'metadata', 'fuzzy_match', 'values']
+DIALOG_NODE_FIELDS = ['dialog_node', 'description', 'conditions', 'output', 'context', 'metadata',
+                      'next_step', 'title', 'type', 'event_name', 'variable', 'actions', 'digress_in',
+                      'digress_out', 'digress_out_slots', 'user_label', 'disambiguation_opt_out']
+# Changing these moves the node: the order of the calls would matter
+DIALOG_NODE_STRUCTURE = ['parent', 'previous_sibling']
+AUDIT_FIELDS = ['created', 'updated']
+
+
+def _clean(element: Dict) -> Dict:
+    return {key: value for key, value in element.items() if key not in AUDIT_FIELDS}
+
+
+def _by_key(elements: List[Dict], key: str) -> Dict[str, Dict]:
+    return {element[key]: _clean(element) for element in elements or []}
+
+
+def _settable(old: Dict, new: Dict, fields: List[str]) -> bool:
+    "The per-element endpoints ignore missing values, so they cannot remove fields or use unknown ones"
+    return all(key in fields for key in new) and all(key in new for key in old)
+
+
+def _diff_elements(old_elements: List[Dict], new_elements: List[Dict], key: str, fields: List[str],
+                   create: str, update: str, delete: str) -> List[Operation]:
+    """
+    Operations for an intents/entities-like section, or None if the section has to be replaced
+    """
+    old = _by_key(old_elements, key)
+    new = _by_key(new_elements, key)
+    operations = []
+    for name, element in new.items():
+        if name not in old:
+            if not all(field in fields for field in element):
+                return None
+            operations.append(Operation(f'{create} {name}', create, dict(element)))
+        elif element != old[name]:
+            if not _settable(old[name], element, fields):
+                return None
+            kwargs = {f'new_{field}': value for field, value in element.items()
+                      if field != key and value != old[name].get(field)}
+            operations.append(Operation(f'{update} {name}', update, dict(kwargs, **{key: name})))
+    for name in old:
+        if name not in new:
+            operations.append(Operation(f'{delete} {name}', delete, {key: name}))
+    return operations
+
+
+def _diff_counterexamples(old_elements: List[Dict], new_elements: List[Dict]) -> List[Operation]:
+    old = set(element['text'] for element in old_elements or [])
+    new = set(element['text'] for element in new_elements or [])
+    operations = [Operation('create_counterexample', 'create_counterexample', {'text': text})
+                  for text in sorted(new - old)]
+    operations.extend(Operation('delete_counterexample', 'delete_counterexample', {'text': text})
+                      for text in sorted(old - new))
+    return operations
+
+
+def _diff_dialog_nodes(old_elements: List[Dict], new_elements: List[Dict]) -> List[Operation]:
+    "Operations to update the dialog nodes, or None if the section has to be replaced"
+    old = _by_key(old_elements, 'dialog_node')
+    new = _by_key(new_elements, 'dialog_node')
+    if set(old) != set(new):
+        return None
+    operations = []
+    for name, node in new.items():
+        if node == old[name]:
+            continue
+        if any(node.get(key) != old[name].get(key) for key in DIALOG_NODE_STRUCTURE):
+            return None
+        if not _settable(old[name], node, DIALOG_NODE_FIELDS + DIALOG_NODE_STRUCTURE):
+            return None
+        kwargs = {f'new_{field}': value for field, value in node.items()
+                  if field != 'dialog_node' and value != old[name].get(field)}
+        operations.append(Operation(f'update_dialog_node {name}', 'update_dialog_node',
+                                    dict(kwargs, dialog_node=name)))
+    return operations
+
+
+def plan(deployed: Dict, new_skill: Dict) -> DeltaPlan:
+    """
+    Calls that turn the `deployed` skill into `new_skill`. workspace_update holds the
+    fields to send with update_workspace, and is empty if that call is not needed
+    """
+    operations = []
+    workspace_update = {field: new_skill[field] for field in WORKSPACE_FIELDS
+                        if field in new_skill and new_skill[field] != deployed.get(field)}
+    sections = [
+        ('intents', _diff_elements(deployed.get('intents'), new_skill.get('intents'), 'intent',
+                                   INTENT_FIELDS, 'create_intent', 'update_intent', 'delete_intent')),
+        ('entities', _diff_elements(deployed.get('entities'), new_skill.get('entities'), 'entity',
+                                    ENTITY_FIELDS, 'create_entity', 'update_entity', 'delete_entity')),
+        ('counterexamples', _diff_counterexamples(deployed.get('counterexamples'),
+                                                  new_skill.get('counterexamples'))),
+        ('dialog_nodes', _diff_dialog_nodes(deployed.get('dialog_nodes'), new_skill.get('dialog_nodes'))),
+    ]
+    for section, section_operations in sections:
+        if section_operations is None:
+            workspace_update[section] = new_skill.get(section) or []
+        else:
+            operations.extend(section_operations)
+    return DeltaPlan(operations, workspace_update)
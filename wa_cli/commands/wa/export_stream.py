@@ -0,0 +1,178 @@
+"""
+Write a skill export as it is downloaded, without building it in memory
+
+The output is the one of json.dumps(remove_audit(skill), ensure_ascii=False, indent=4).
+Only the top level object and its lists are streamed: each of their elements (an intent,
+an entity, a dialog node...) is small, and it is parsed and written on its own.
+"""
+
+import codecs
+import hashlib
+import json
+from json.encoder import encode_basestring
+import re
+from typing import BinaryIO, Dict, Iterable, Tuple
+
+FLUSH_SIZE = 256 * 1024
+NUMBER_CHARS = set('0123456789.eE+-') | {''}
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Like requests' response.json(strict=False), that the SDK uses
+DECODER = json.JSONDecoder(strict=False)
+
+
+def remove_audit(obj: object) -> object:
+    "Remove the created/updated attributes of obj and of everything it contains"
+    if isinstance(obj, dict):
+        obj.pop('created', None)
+        obj.pop('updated', None)
+        for key, value in obj.items():
+            obj[key] = remove_audit(value)
+    elif isinstance(obj, list):
+        obj = [remove_audit(value) for value in obj]
+    return obj
+
+
+class _Reader(object):
+    "Decoded text from the chunks, read ahead only as much as needed to complete a value"
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self, size: int = 1) -> bool:
+        "Read at least `size` characters, unless the end is reached first"
+        if self.eof:
+            return False
+        pieces = [self.buffer[self.pos:]]
+        read = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            pieces.append(text)
+            read += len(text)
+            if read >= size:
+                break
+        else:
+            pieces.append(self._decoder.decode(b'', final=True))
+            self.eof = True
+        self.buffer = ''.join(pieces)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        "Next character that is not whitespace, or '' at the end"
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self) -> object:
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+                # A number may continue in the next chunk, unless something else follows it
+                if self.buffer[end:end + 1] not in NUMBER_CHARS or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Double what is buffered, so that large values are not parsed too many times
+            self.more(len(self.buffer) - self.pos)
+
+
+class _Writer(object):
+    "Encodes, hashes and writes the output in large blocks"
+
+    def __init__(self, out: BinaryIO):
+        self._out = out
+        self._pieces = []
+        self._size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, text: str):
+        self._pieces.append(text)
+        self._size += len(text)
+        if self._size >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        data = ''.join(self._pieces).encode('utf-8')
+        self.sha256.update(data)
+        self._out.write(data)
+        self._pieces = []
+        self._size = 0
+
+
+def _dumps(value: object, level: int) -> str:
+    "json.dumps(value, indent=4) for a value nested `level` levels deep"
+    # Strings are escaped, so all the new lines are indentation
+    return json.dumps(value, ensure_ascii=False, indent=4).replace('\n', '\n' + ' ' * (4 * level))
+
+
+def _write_list(reader: _Reader, writer: _Writer):
+    "Write a top level list, one element at a time"
+    reader.expect('[')
+    writer.write('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        writer.write(']')
+        return
+    while True:
+        writer.write('\n        ' + _dumps(remove_audit(reader.value()), 2))
+        if reader.peek() == ']':
+            reader.pos += 1
+            writer.write('\n    ]')
+            return
+        reader.expect(',')
+        writer.write(',')
+
+
+def write_export(chunks: Iterable[bytes], out: BinaryIO, keep: Iterable[str] = ()) -> Tuple[Dict, str]:
+    """
+    Write the JSON export in `chunks` to `out`. Returns the top level attributes listed
+    in `keep` that are not lists, and the sha256 of what was written
+    """
+    reader = _Reader(chunks)
+    writer = _Writer(out)
+    kept = {}
+    reader.expect('{')
+    writer.write('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        writer.write('}')
+    else:
+        while True:
+            if reader.peek() != '"':
+                raise json.JSONDecodeError('Expecting property name', reader.buffer, reader.pos)
+            key = reader.value()
+            reader.expect(':')
+            # The top level created/updated attributes are kept
+            writer.write(f'\n    {encode_basestring(key)}: ')
+            if reader.peek() == '[':
+                _write_list(reader, writer)
+            else:
+                value = remove_audit(reader.value())
+                writer.write(_dumps(value, 1))
+                if key in keep:
+                    kept[key] = value
+            if reader.peek() == '}':
+                reader.pos += 1
+                writer.write('\n}')
+                break
+            reader.expect(',')
+            writer.write(',')
+    if reader.peek():
+        raise json.JSONDecodeError('Extra data', reader.buffer, reader.pos)
+    writer.flush()
+    return kept, writer.sha256.hexdigest()
@@ -0,0 +1,441 @@
+"""
+A local stand-in for the Watson Assistant v1 API
+
+It serves the workspace, intent, entity, dialog node, counterexample and message
+endpoints that wa-cli uses, so that commands can be benchmarked without a real service:
+
+* by default, the workspaces are kept in memory. Training takes `training_delay`
+  seconds after each change, and the rate limit headers of the service are sent, with
+  429 responses once `rate_limit` calls have been made in a `rate_window`
+* with `record`, the calls are forwarded to a real service, and the exchanges are
+  appended to a JSON lines file
+* with `replay`, the responses are taken from such a file
+
+The message endpoint is not Watson's classifier: intents are scored by the words they
+share with their examples, and entities by their values and synonyms.
+"""
+
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import copy
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+import uuid
+
+import requests
+
+from .wa import Service
+
+DEFAULT_TRAINING_DELAY = 2.0
+DEFAULT_RATE_WINDOW = 60.0
+# Section: the key of its elements
+SECTIONS = {'intents': 'intent', 'entities': 'entity', 'dialog_nodes': 'dialog_node', 'counterexamples': 'text'}
+AUDIT_FIELDS = ['created', 'updated']
+WORKSPACE_FIELDS = ['name', 'description', 'language', 'metadata', 'learning_opt_out', 'system_settings', 'webhooks']
+# Headers kept in the recordings
+RECORDED_HEADERS = ['Content-Type', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset']
+WORDS = re.compile(r'\w+')
+
+
+class ApiError(Exception):
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _words(text: str) -> set:
+    return set(WORDS.findall(text.lower()))
+
+
+class RateLimiter(object):
+    "Fixed window rate limits, with the headers of the service. A limit of 0 never throttles"
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._reset = 0.0
+        self._remaining = limit
+
+    def take(self) -> Tuple[bool, Dict]:
+        if not self.limit:
+            return True, {}
+        with self._lock:
+            now = time.time()
+            if now >= self._reset:
+                self._reset = now + self.window
+                self._remaining = self.limit
+            allowed = self._remaining > 0
+            if allowed:
+                self._remaining -= 1
+            headers = {'X-RateLimit-Limit': str(self.limit),
+                       'X-RateLimit-Remaining': str(self._remaining),
+                       'X-RateLimit-Reset': str(int(self._reset))}
+            if not allowed:
+                headers['Retry-After'] = str(max(1, int(self._reset - now)))
+            return allowed, headers
+
+
+class Workspaces(object):
+    "The workspaces of the stand-in service, in memory"
+
+    def __init__(self, training_delay: float = DEFAULT_TRAINING_DELAY):
+        self.training_delay = training_delay
+        self._lock = threading.Lock()
+        self._workspaces = {}
+        self._trained_at = {}
+        self._last_timestamp = ''
+
+    def _timestamp(self) -> str:
+        "Audit timestamps, that change on every write even within the same millisecond"
+        now = datetime.now(timezone.utc)
+        while True:
+            timestamp = now.strftime('%Y-%m-%dT%H:%M:%S.') + f'{now.microsecond // 1000:03d}Z'
+            if timestamp > self._last_timestamp:
+                self._last_timestamp = timestamp
+                return timestamp
+            now = now.fromtimestamp(now.timestamp() + 0.001, timezone.utc)
+
+    def _get(self, workspace_id: str) -> Dict:
+        if workspace_id not in self._workspaces:
+            raise ApiError(404, f'Resource not found: workspace {workspace_id}')
+        return self._workspaces[workspace_id]
+
+    def _changed(self, workspace: Dict):
+        workspace['updated'] = self._timestamp()
+        self._trained_at[workspace['workspace_id']] = time.time() + self.training_delay
+
+    def _status(self, workspace_id: str) -> str:
+        return 'Training' if time.time() < self._trained_at[workspace_id] else 'Available'
+
+    @staticmethod
+    def _without_audit(workspace: Dict, include_audit: bool) -> Dict:
+        "Like the service, the audit dates are only returned when they are requested"
+        return {key: value for key, value in workspace.items() if include_audit or key not in AUDIT_FIELDS}
+
+    @classmethod
+    def _summary(cls, workspace: Dict, include_audit: bool) -> Dict:
+        return cls._without_audit({key: value for key, value in workspace.items() if key not in SECTIONS},
+                                  include_audit)
+
+    def list(self, page_limit: int, cursor: str, include_audit: bool) -> Dict:
+        with self._lock:
+            workspaces = sorted(self._workspaces.values(), key=lambda workspace: workspace['workspace_id'])
+            start = int(cursor or 0)
+            page = [self._summary(workspace, include_audit) for workspace in workspaces[start:start + page_limit]]
+            pagination = {'refresh_url': '/v1/workspaces'}
+            if start + page_limit < len(workspaces):
+                pagination['next_cursor'] = str(start + page_limit)
+            return {'workspaces': page, 'pagination': pagination}
+
+    def get(self, workspace_id: str, export: bool, include_audit: bool) -> Dict:
+        with self._lock:
+            workspace = self._get(workspace_id)
+            if export:
+                result = self._without_audit(copy.deepcopy(workspace), include_audit)
+            else:
+                result = self._summary(workspace, include_audit)
+            result['status'] = self._status(workspace_id)
+            return result
+
+    def create(self, data: Dict, include_audit: bool) -> Dict:
+        with self._lock:
+            workspace_id = str(uuid.uuid4())
+            workspace = {'workspace_id': workspace_id, 'name': data.get('name', ''),
+                         'language': data.get('language', 'en'), 'learning_opt_out': False,
+                         'created': self._timestamp()}
+            workspace.update((field, data[field]) for field in WORKSPACE_FIELDS if field in data)
+            workspace.update((section, copy.deepcopy(data.get(section) or [])) for section in SECTIONS)
+            self._workspaces[workspace_id] = workspace
+            self._changed(workspace)
+            return self._summary(workspace, include_audit)
+
+    def update(self, workspace_id: str, data: Dict, append: bool, include_audit: bool) -> Dict:
+        with self._lock:
+            workspace = self._get(workspace_id)
+            workspace.update((field, data[field]) for field in WORKSPACE_FIELDS if field in data)
+            for section, key in SECTIONS.items():
+                if section not in data:
+                    continue
+                if append:
+                    elements = {element[key]: element for element in workspace[section]}
+                    elements.update((element[key], element) for element in copy.deepcopy(data[section]))
+                    workspace[section] = list(elements.values())
+                else:
+                    workspace[section] = copy.deepcopy(data[section])
+            self._changed(workspace)
+            return self._summary(workspace, include_audit)
+
+    def delete(self, workspace_id: str):
+        with self._lock:
+            self._get(workspace_id)
+            del self._workspaces[workspace_id]
+            del self._trained_at[workspace_id]
+
+    def element(self, workspace_id: str, section: str, name: str, method: str, data: Dict) -> Tuple[int, Dict]:
+        "GET, POST (update) or DELETE an element of a section. POST without `name` creates it"
+        key = SECTIONS[section]
+        with self._lock:
+            workspace = self._get(workspace_id)
+            elements = workspace[section]
+            index = next((index for index, element in enumerate(elements) if element[key] == name), None)
+            if name and index is None:
+                raise ApiError(404, f'Resource not found: {key} {name}')
+            if method == 'GET':
+                return 200, copy.deepcopy(elements[index])
+            if method == 'DELETE':
+                del elements[index]
+                self._changed(workspace)
+                return 200, {}
+            if not name:
+                if any(element[key] == data.get(key) for element in elements):
+                    raise ApiError(409, f'{key} {data.get(key)} already exists')
+                elements.append(copy.deepcopy(data))
+                self._changed(workspace)
+                return 201, data
+            # Updates only change the fields that are sent
+            elements[index].update(copy.deepcopy(data))
+            self._changed(workspace)
+            return 200, elements[index]
+
+    def message(self, workspace_id: str, data: Dict) -> Dict:
+        with self._lock:
+            workspace = copy.deepcopy(self._get(workspace_id))
+        text = (data.get('input') or {}).get('text', '')
+        words = _words(text)
+        intents = []
+        for intent in workspace['intents']:
+            scores = [len(words & example_words) / len(words | example_words)
+                      for example_words in (_words(example['text']) for example in intent.get('examples', []))
+                      if words | example_words]
+            if scores and max(scores) > 0:
+                intents.append({'intent': intent['intent'], 'confidence': round(max(scores), 4)})
+        intents.sort(key=lambda intent: -intent['confidence'])
+        entities = []
+        for entity in workspace['entities']:
+            for value in entity.get('values', []):
+                for synonym in [value['value']] + value.get('synonyms', []):
+                    match = re.search(rf'\b{re.escape(synonym.lower())}\b', text.lower())
+                    if match:
+                        entities.append({'entity': entity['entity'], 'value': value['value'],
+                                         'location': [match.start(), match.end()], 'confidence': 1})
+                        break
+        context = dict(data.get('context') or {})
+        context.setdefault('conversation_id', str(uuid.uuid4()))
+        system = dict(context.get('system') or {})
+        system['dialog_turn_counter'] = system.get('dialog_turn_counter', 0) + 1
+        context['system'] = system
+        node = self._answering_node(workspace['dialog_nodes'], intents, entities)
+        return {'input': data.get('input') or {},
+                'intents': intents if data.get('alternate_intents') else intents[:1],
+                'entities': entities,
+                'context': context,
+                'output': {'text': self._output_text(node),
+                           'nodes_visited': [node['dialog_node']] if node else []}}
+
+    @staticmethod
+    def _answering_node(nodes: List[Dict], intents: List[Dict], entities: List[Dict]) -> Dict:
+        "The first root node, in sibling order, whose condition is an intent, entity, `true` or `anything_else` that matches"
+        roots = [node for node in nodes if not node.get('parent')]
+        by_previous = {node.get('previous_sibling'): node for node in roots}
+        ordered = []
+        node = by_previous.get(None)
+        while node is not None and len(ordered) < len(roots):
+            ordered.append(node)
+            node = by_previous.get(node['dialog_node'])
+        if len(ordered) < len(roots):
+            ordered = roots
+        top_intent = intents[0]['intent'] if intents else ''
+        entity_names = set(entity['entity'] for entity in entities)
+        for node in ordered:
+            condition = (node.get('conditions') or '').strip()
+            if (condition in ['true', 'anything_else'] or
+                    (condition.startswith('#') and condition[1:] == top_intent) or
+                    (condition.startswith('@') and condition[1:] in entity_names)):
+                return node
+        return None
+
+    @staticmethod
+    def _output_text(node: Dict) -> List[str]:
+        if not node:
+            return []
+        output = node.get('output') or {}
+        for generic in output.get('generic') or []:
+            if generic.get('response_type') == 'text' and generic.get('values'):
+                return [generic['values'][0].get('text', '')]
+        text = output.get('text')
+        if isinstance(text, dict):
+            return (text.get('values') or [])[:1]
+        return [text] if isinstance(text, str) else []
+
+
+class Recording(object):
+    "The exchanges of a recording, as JSON lines"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method: str, path: str, query: Dict, body: object) -> str:
+        # The version of the API does not change the responses that wa-cli gets
+        query = {name: value for name, value in query.items() if name != 'version'}
+        return json.dumps([method, path, query, body], sort_keys=True)
+
+    def append(self, exchange: Dict):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as jsonl_file:
+                jsonl_file.write(json.dumps(exchange, ensure_ascii=False) + '\n')
+
+    def load(self) -> Dict[str, deque]:
+        "The responses, in order, by request key"
+        responses = defaultdict(deque)
+        with open(self.path, 'r', encoding='utf-8') as jsonl_file:
+            for line in jsonl_file:
+                if line.strip():
+                    exchange = json.loads(line)
+                    key = self.key(exchange['method'], exchange['path'], exchange['query'], exchange['body'])
+                    responses[key].append(exchange)
+        return responses
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'wa-cli-standin'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, result: object, headers: Dict = None):
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _request(self) -> Tuple[str, Dict, object]:
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        body = json.loads(raw.decode('utf-8')) if raw else None
+        return url.path, dict(parse_qsl(url.query)), body
+
+    def _handle(self):
+        path, query, body = self._request()
+        try:
+            if self.server.mode == 'replay':
+                return self._replay(path, query, body)
+            if self.server.mode == 'record':
+                return self._record(path, query, body)
+            allowed, headers = self.server.rate_limiter.take()
+            if not allowed:
+                return self._send(429, {'error': 'Rate limit exceeded', 'code': 429}, headers)
+            status, result = self._simulate(path, query, body)
+            self._send(status, result, headers)
+        except ApiError as xcpt:
+            self._send(xcpt.code, {'error': xcpt.message, 'code': xcpt.code})
+        except (ValueError, KeyError, TypeError) as xcpt:
+            self._send(400, {'error': f'Invalid request: {xcpt}', 'code': 400})
+
+    do_GET = do_POST = do_DELETE = _handle
+
+    def _simulate(self, path: str, query: Dict, body: Dict) -> Tuple[int, object]:
+        workspaces = self.server.workspaces
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts[:2] != ['v1', 'workspaces']:
+            raise ApiError(404, f'Unknown path {path}')
+        parts = parts[2:]
+        method = self.command
+        include_audit = query.get('include_audit') == 'true'
+        if not parts:
+            if method == 'GET':
+                return 200, workspaces.list(int(query.get('page_limit', 100)), query.get('cursor', ''),
+                                            include_audit)
+            if method == 'POST':
+                return 201, workspaces.create(body or {}, include_audit)
+        elif len(parts) == 1:
+            if method == 'GET':
+                return 200, workspaces.get(parts[0], query.get('export') == 'true', include_audit)
+            if method == 'POST':
+                return 200, workspaces.update(parts[0], body or {}, query.get('append') == 'true', include_audit)
+            if method == 'DELETE':
+                workspaces.delete(parts[0])
+                return 200, {}
+        elif parts[1] == 'message' and len(parts) == 2 and method == 'POST':
+            return 200, workspaces.message(parts[0], body or {})
+        elif parts[1] in SECTIONS and len(parts) <= 3:
+            name = parts[2] if len(parts) == 3 else ''
+            if name or method == 'POST':
+                return workspaces.element(parts[0], parts[1], name, method, body or {})
+        raise ApiError(404, f'Unknown endpoint {method} {path}')
+
+    def _record(self, path: str, query: Dict, body: object):
+        upstream = self.server.upstream
+        headers = {'Accept': 'application/json'}
+        request = {'headers': headers}
+        upstream.authenticator.authenticate(request)
+        url = upstream.service_url.rstrip('/') + path
+        response = requests.request(self.command, url, params=query, json=body, headers=headers)
+        try:
+            result = response.json()
+        except ValueError:
+            result = response.text
+        kept = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+        self.server.recording.append({'method': self.command, 'path': path, 'query': query, 'body': body,
+                                      'status': response.status_code, 'headers': kept, 'result': result})
+        kept.pop('Content-Type', None)
+        self._send(response.status_code, result, kept)
+
+    def _replay(self, path: str, query: Dict, body: object):
+        key = Recording.key(self.command, path, query, body)
+        with self.server.replay_lock:
+            exchanges = self.server.replay.get(key)
+            if not exchanges:
+                raise ApiError(404, f'No recorded response for {self.command} {path}')
+            # The last response is repeated, so that status polling can go on
+            exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        headers = {name: value for name, value in exchange['headers'].items() if name != 'Content-Type'}
+        self._send(exchange['status'], exchange['result'], headers)
+
+
+class StandIn(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, training_delay: float = DEFAULT_TRAINING_DELAY, rate_limit: int = 0,
+                 rate_window: float = DEFAULT_RATE_WINDOW, record: str = '', replay: str = '',
+                 upstream_apikey: str = '', upstream_url: str = '', verbose: bool = False):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.verbose = verbose
+        self.workspaces = Workspaces(training_delay)
+        self.rate_limiter = RateLimiter(rate_limit, rate_window)
+        self.mode = 'simulate'
+        if record:
+            self.mode = 'record'
+            self.recording = Recording(record)
+            self.upstream = Service(upstream_apikey, upstream_url)
+        elif replay:
+            self.mode = 'replay'
+            self.replay = Recording(replay).load()
+            self.replay_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self) -> 'StandIn':
+        "Serve from a background thread"
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -1,23 +1,106 @@
 
+from __future__ import annotations
+
 from collections import namedtuple
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from fnmatch import fnmatch
+import hashlib
+import importlib.util
+import io
 import json
 import os
-from typing import Dict, List, Tuple
+import queue
+import random
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, Iterator, List, Tuple
+from urllib.parse import urlsplit
 
 import click
-import ibm_watson as watson
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
 
 from ..helpers import cfg
+from ..helpers import profiler
+from ..helpers import skill_store
+from ..helpers import skills_index
+from ..helpers import token_cache
+from .delta import plan as plan_delta
+from .export_stream import remove_audit, write_export
+
+
+def _lazy_import(name: str):
+    "The module, loaded on the first access to one of its attributes"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# The SDK takes longer to import than most commands take to run
+watson = _lazy_import('ibm_watson')
+sdk_core = _lazy_import('ibm_cloud_sdk_core')
+# A lazy module is not thread-safe while it loads: the threads that see it half-loaded miss its submodules
+_sdk_lock = threading.Lock()
 
 VERSION = '2020-02-05'
 SkillTuple = namedtuple('SkillTuple', ['id', 'name', 'updated_on'])
+RateLimitBudget = namedtuple('RateLimitBudget', ['limit', 'remaining', 'reset'])
+# Top level attributes of an export that the skill indexes need
+INDEXED_KEYS = ['workspace_id', 'name', 'updated'] + skills_index.META_KEYS
+# Top level attributes of an export that the service sets, and that creating a skill does not take
+SERVICE_KEYS = ['workspace_id', 'status', 'created', 'updated']
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Training status polling: the interval starts short, and grows for the skills that take long
+POLL_INTERVAL_MIN = 2.0
+POLL_INTERVAL_MAX = 30.0
+POLL_BACKOFF = 1.5
+TRAINING_STATUSES = ['Training', 'Processing']
+
+
+def _use_token_cache(authenticator: sdk_core.authenticators.IAMAuthenticator, apikey: str):
+    "Reuse the IAM token obtained by previous invocations, and share the ones we get"
+    token_manager = authenticator.token_manager
+    cached = token_cache.load(apikey)
+    if cached:
+        try:
+            token_manager._save_token_info(cached)
+        except Exception:
+            pass
+    request_token = token_manager.request_token
+
+    def request_and_cache_token():
+        with profiler.span('IAM token', 'auth'):
+            token_response = request_token()
+        token_cache.save(apikey, token_response)
+        return token_response
+
+    token_manager.request_token = request_and_cache_token
+
+
+def _is_local(url: str) -> bool:
+    "Plain http on the loopback interface, like the stand-in service, is never the real one"
+    parts = urlsplit(url)
+    return parts.scheme == 'http' and parts.hostname in ['localhost', '127.0.0.1', '::1']
 
 
 def Service(apikey: str, url: str) -> watson.AssistantV1:
-    authenticator = IAMAuthenticator(apikey)
+    with _sdk_lock:
+        # Loads the SDK once, whatever the number of threads that create their first service at the same time
+        sdk_core.authenticators, watson.AssistantV1
+    if _is_local(url):
+        authenticator = sdk_core.authenticators.NoAuthAuthenticator()
+    else:
+        authenticator = sdk_core.authenticators.IAMAuthenticator(apikey)
+        _use_token_cache(authenticator, apikey)
     service = watson.AssistantV1(version=VERSION, authenticator=authenticator)
     service.set_service_url(url)
     return service
@@ -26,78 +109,496 @@ def Service(apikey: str, url: str) -> watson.AssistantV1:
 def _trace_rate_limits(action: str, response: watson.DetailedResponse):
     headers = response.get_headers()
     header_names = ['X-RateLimit-Reset', 'X-RateLimit-Remaining', 'X-RateLimit-Limit']
-    ratelimit = {k: headers[k] for k in header_names}
-    ratelimit['X-RateLimit-Reset'] = datetime.fromtimestamp(int(ratelimit['X-RateLimit-Reset']),
-                                                            timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    ratelimit = {k: headers[k] for k in header_names if k in headers}
+    if 'X-RateLimit-Reset' in ratelimit:
+        ratelimit['X-RateLimit-Reset'] = datetime.fromtimestamp(int(ratelimit['X-RateLimit-Reset']),
+                                                                timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
     click.secho(f'  {action} - {ratelimit}', fg='green', err=True)
 
 
+def _status_code(xcpt: watson.ApiException) -> int:
+    # ibm-cloud-sdk-core renamed `code` to `status_code`
+    status_code = getattr(xcpt, 'status_code', None)
+    return status_code if status_code is not None else getattr(xcpt, 'code', 0)
+
+
+class RequestScheduler(object):
+    """
+    Token bucket that paces the calls made to a service instance
+
+    The bucket holds the X-RateLimit-Remaining budget reported by the service and
+    is refilled to X-RateLimit-Limit when X-RateLimit-Reset is reached. Once the
+    budget drops below `low_water` of the limit, calls are spread evenly over the
+    time left until the reset instead of being fired until a 429 comes back.
+    """
+
+    low_water = 0.1
+    max_retries = 5
+    backoff_base = 1.0
+    backoff_cap = 60.0
+
+    def __init__(self, key: str = ''):
+        self._lock = threading.Lock()
+        self.key = key
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        self._next_slot = 0.0
+
+    def budget(self) -> RateLimitBudget:
+        with self._lock:
+            self._refill(time.time())
+            return RateLimitBudget(self.limit, self.remaining, self.reset)
+
+    def _refill(self, now: float):
+        if self.limit is not None and self.reset and now >= self.reset:
+            self.remaining = self.limit
+            self.reset = 0.0
+
+    def _pacing_interval(self, now: float) -> float:
+        "Seconds between calls needed to make the remaining budget last until the reset"
+        if self.remaining is None or self.limit is None or self.reset <= now:
+            return 0.0
+        if self.remaining > self.limit * self.low_water:
+            return 0.0
+        return (self.reset - now) / max(self.remaining, 1)
+
+    def _delay(self, now: float) -> float:
+        self._refill(now)
+        if self.remaining is not None and self.remaining <= 0 and self.reset > now:
+            return self.reset - now
+        if self._pacing_interval(now):
+            return self._next_slot - now
+        return 0.0
+
+    def try_acquire(self) -> float:
+        "Take a token from the bucket if the budget allows it. Returns 0, or the seconds to wait before trying again"
+        with self._lock:
+            now = time.time()
+            delay = self._delay(now)
+            if delay <= 0:
+                self._next_slot = now + self._pacing_interval(now)
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return 0.0
+            return delay
+
+    def acquire(self):
+        "Block until the budget allows another call, and take a token from the bucket"
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def update(self, headers):
+        "Take the budget reported by the service as the new contents of the bucket"
+        if not headers:
+            return
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self.limit = limit
+            self.remaining = remaining
+            self.reset = reset
+
+    def retry_delay(self, status_code: int, attempt: int, idempotent: bool = True) -> float:
+        """
+        Seconds to wait before retrying a call that failed, or -1 if it should not be retried.
+        A call that is not idempotent may have been applied despite a 5xx: it is only retried on 429s
+        """
+        if attempt >= self.max_retries:
+            return -1
+        if status_code != 429 and (status_code < 500 or not idempotent):
+            return -1
+        backoff = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        backoff = random.uniform(backoff / 2, backoff)
+        if status_code == 429:
+            with self._lock:
+                until_reset = self.reset - time.time() if self.reset else 0.0
+            backoff = max(backoff, until_reset + random.uniform(0, self.backoff_base))
+        return backoff
+
+    def call(self, action: str, method: Callable, *args, **kwargs) -> watson.DetailedResponse:
+        "Invoke an SDK method honouring the rate limits, and retrying 429s and, unless it creates something, 5xx"
+        attempt = 0
+        idempotent = not action.startswith('create_')
+        while True:
+            self.acquire()
+            try:
+                with profiler.span(action, 'api', attempt=attempt):
+                    response = method(*args, **kwargs)
+            except watson.ApiException as xcpt:
+                http_response = getattr(xcpt, 'http_response', None)
+                self.update(getattr(http_response, 'headers', None))
+                status_code = _status_code(xcpt)
+                delay = self.retry_delay(status_code, attempt, idempotent)
+                if delay < 0:
+                    raise
+                attempt += 1
+                click.secho(f'  {action} - HTTP {status_code}, retrying in {delay:.1f}s '
+                            f'({attempt}/{self.max_retries})', fg='yellow', err=True)
+                time.sleep(delay)
+                continue
+            self.update(response.get_headers())
+            _trace_rate_limits(action, response)
+            return response
+
+
+class SkillIndex(object):
+    """
+    Name, id and updated date of the workspaces of a service instance, cached in .wa-cli/cache
+
+    The list is trusted for cfg.index_ttl() seconds after it was obtained from the service.
+    Our own creations, updates and deletions are applied to it as they happen.
+    """
+
+    def __init__(self, key: str):
+        self._lock = threading.Lock()
+        self.key = key
+        self._skills = None
+        self._listed_at = 0.0
+        # Our own changes, so that they are not undone by a listing that was in progress
+        self._changes = {}
+
+    def _path(self) -> str:
+        folder = cfg.cache_folder()
+        return os.path.join(folder, f'workspaces-{self.key[:16]}.json') if folder else ''
+
+    def _load(self):
+        path = self._path()
+        if self._skills is not None or not path or not os.path.isfile(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as json_file:
+                cached = json.load(json_file)
+            self._skills = {skill[0]: SkillTuple(*skill) for skill in cached['skills']}
+            self._listed_at = cached['listed_at']
+        except (OSError, ValueError, KeyError, TypeError):
+            self._skills = None
+
+    def _save(self):
+        path = self._path()
+        if not path:
+            return
+        tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as json_file:
+            json.dump({'listed_at': self._listed_at,
+                       'skills': [list(skill) for skill in self._skills.values()]},
+                      json_file, ensure_ascii=False)
+        os.replace(tmp_file, path)
+
+    def get(self) -> List[SkillTuple]:
+        "The cached list of workspaces, or None if it has expired"
+        with self._lock:
+            self._load()
+            if self._skills is None or time.time() - self._listed_at > cfg.index_ttl():
+                return None
+            return list(self._skills.values())
+
+    def replace(self, skills: List[SkillTuple], listed_at: float):
+        "Take as the index the result of a listing that started at `listed_at`"
+        with self._lock:
+            self._skills = {skill.id: skill for skill in skills}
+            for skill_id, (changed_at, skill) in list(self._changes.items()):
+                if changed_at < listed_at:
+                    del self._changes[skill_id]
+                elif skill:
+                    self._skills[skill_id] = skill
+                else:
+                    self._skills.pop(skill_id, None)
+            self._listed_at = listed_at
+            self._save()
+
+    def _change(self, skill_id: str, skill: SkillTuple):
+        with self._lock:
+            self._changes[skill_id] = (time.time(), skill)
+            self._load()
+            if self._skills is not None:
+                if skill:
+                    self._skills[skill_id] = skill
+                else:
+                    self._skills.pop(skill_id, None)
+                self._save()
+
+    def put(self, skill: SkillTuple):
+        self._change(skill.id, skill)
+
+    def remove(self, skill_id: str):
+        self._change(skill_id, None)
+
+
 class wa(object):
 
+    _shared = {}
+    _shared_lock = threading.Lock()
+    # Service objects by (apikey, url), when they are kept between commands. See helpers/daemon.py
+    _services = None
+
     def __init__(self, apikey: str, url: str):
-        self.service = Service(apikey, url)
+        self.service = self._service(apikey, url)
+        self.scheduler = self._shared_for(apikey, url, RequestScheduler)
+        self.index = self._shared_for(apikey, url, SkillIndex)
 
-    def _list_skills(self, pattern: str = '',) -> List[SkillTuple]:
-        response = self.service.list_workspaces(include_audit=True)
-        _trace_rate_limits('list_workspaces', response)
-        results = response.get_result()
+    @classmethod
+    def _shared_for(cls, apikey: str, url: str, factory: Callable):
+        "Rate limits and workspaces belong to the service instance, so all the wa objects that target it share them"
+        key = hashlib.sha256(f'{apikey}@{url}'.encode('utf-8')).hexdigest()
+        with cls._shared_lock:
+            if (factory, key) not in cls._shared:
+                cls._shared[(factory, key)] = factory(key)
+            return cls._shared[(factory, key)]
+
+    @classmethod
+    def _service(cls, apikey: str, url: str) -> watson.AssistantV1:
+        "A new Service, or the kept one, with its token and its pool of connections, if there is one"
+        if cls._services is None:
+            return Service(apikey, url)
+        with cls._shared_lock:
+            if (apikey, url) not in cls._services:
+                cls._services[(apikey, url)] = Service(apikey, url)
+            return cls._services[(apikey, url)]
+
+    @classmethod
+    def keep_services(cls, keep: bool = True):
+        "Reuse the Service objects from now on, or forget them"
+        with cls._shared_lock:
+            cls._services = {} if keep else None
+            cls._shared.clear()
+
+    def _call(self, action: str, method: Callable, *args, **kwargs) -> watson.DetailedResponse:
+        return self.scheduler.call(action, method, *args, **kwargs)
+
+    def remaining_budget(self) -> RateLimitBudget:
+        "Rate limit budget last reported by the service. Values are None until a call has been made"
+        return self.scheduler.budget()
+
+    def _iter_skills(self, pattern: str = '', page_limit: int = 0) -> Iterator[SkillTuple]:
+        "Yield the skills page by page, following the pagination cursor"
+        page_limit = page_limit or cfg.page_limit()
+        listed_at = time.time()
         skills = []
-        for workspace in results['workspaces']:
-            if not pattern or fnmatch(workspace['name'], pattern):
-                skills.append(SkillTuple(workspace['workspace_id'],
-                                         workspace['name'],
-                                         workspace['updated']))
-        return skills
+        cursor = None
+        while True:
+            response = self._call('list_workspaces', self.service.list_workspaces,
+                                  include_audit=True, page_limit=page_limit, cursor=cursor)
+            results = response.get_result()
+            for workspace in results['workspaces']:
+                skill = SkillTuple(workspace['workspace_id'], workspace['name'], workspace['updated'])
+                skills.append(skill)
+                if not pattern or fnmatch(skill.name, pattern):
+                    yield skill
+            cursor = (results.get('pagination') or {}).get('next_cursor')
+            if not cursor:
+                break
+        self.index.replace(skills, listed_at)
+
+    def _list_skills(self, pattern: str = '', page_limit: int = 0) -> List[SkillTuple]:
+        return list(self._iter_skills(pattern, page_limit))
+
+    def _indexed_skills(self) -> List[SkillTuple]:
+        "The workspaces in the index, or in the service if the index has expired"
+        skills = self.index.get()
+        return skills if skills is not None else self._list_skills()
+
+    def _index_response(self, response: watson.DetailedResponse):
+        result = response.get_result() or {}
+        if all(key in result for key in ['workspace_id', 'name', 'updated']):
+            self.index.put(SkillTuple(result['workspace_id'], result['name'], result['updated']))
 
     def _delete_skill(self, skill_id: str) -> bool:
-        response = self.service.delete_workspace(skill_id)
-        _trace_rate_limits('delete_workspace', response)
+        response = self._call('delete_workspace', self.service.delete_workspace, skill_id)
+        self.index.remove(skill_id)
+        if skill_store.enabled():
+            skill_store.forget(skill_id)
         return response.get_status_code() == 200
 
     def _get_skill(self, skill_id: str) -> Dict:
-        response = self.service.get_workspace(skill_id,
-                                              export=True,
-                                              sort='stable',
-                                              include_audit=True)
-        _trace_rate_limits('get_workspace', response)
+        response = self._call('get_workspace', self.service.get_workspace,
+                              skill_id,
+                              export=True,
+                              sort='stable',
+                              include_audit=True)
         results = response.get_result()
         results = self._audit_cleanup(results)
         return results
 
+    def _download_skill(self, skill_id: str, out: BinaryIO) -> Tuple[Dict, str]:
+        """
+        Write to `out` what json.dumps(self._get_skill(skill_id), ensure_ascii=False, indent=4) would,
+        streaming the export instead of loading it. Returns its INDEXED_KEYS attributes and sha256
+        """
+        response = self._call('get_workspace', self.service.get_workspace,
+                              skill_id,
+                              export=True,
+                              sort='stable',
+                              include_audit=True,
+                              stream=True)
+        result = response.get_result()
+        if isinstance(result, dict):
+            # SDK versions that do not forward `stream` to the request parse the response
+            with profiler.span('write export', 'io', skill_id=skill_id):
+                skill_data = self._audit_cleanup(result)
+                contents = json.dumps(skill_data, ensure_ascii=False, indent=4).encode('utf-8')
+                out.write(contents)
+            return (skill_data, hashlib.sha256(contents).hexdigest())
+        # The body is streamed while it is written
+        with contextlib.closing(result), profiler.span('write export', 'io', skill_id=skill_id):
+            return write_export(result.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), out, INDEXED_KEYS)
+
     def _get_skill_status(self, skill_id: str) -> Dict:
-        response = self.service.get_workspace(skill_id,
-                                              export=False,
-                                              include_audit=False)
-        _trace_rate_limits('get_workspace_non_export', response)
+        response = self._call('get_workspace_non_export', self.service.get_workspace,
+                              skill_id,
+                              export=False,
+                              include_audit=False)
         results = response.get_result()
         return results['status']
 
     def _create_skill(self, skill_data: Dict) -> bool:
-        response = self.service.create_workspace(**skill_data)
-        _trace_rate_limits('create_workspace', response)
+        # Without the audit, the response has no `updated` and the index would miss the skill
+        response = self._call('create_workspace', self.service.create_workspace, **skill_data, include_audit=True)
+        self._index_response(response)
         return response.get_status_code() == 201
 
     def _update_skill(self, skill_data: Dict) -> bool:
-        response = self.service.update_workspace(**skill_data)
-        _trace_rate_limits('update_workspace', response)
+        response = self._call('update_workspace', self.service.update_workspace, **skill_data, include_audit=True)
+        self._index_response(response)
         return response.get_status_code() == 200
 
-    def _get_skill_file(self, skill: SkillTuple) -> Tuple[str, object]:
-        "Saves a skill to a file, and returns (path, data)"
+    def _get_skill_updated(self, skill_id: str) -> str:
+        response = self._call('get_workspace_non_export', self.service.get_workspace,
+                              skill_id,
+                              export=False,
+                              include_audit=True)
+        return response.get_result()['updated']
 
+    @staticmethod
+    def _snapshot_path(skill_id: str) -> str:
+        cache_folder = cfg.cache_folder()
+        return os.path.join(cache_folder, f'deployed-{skill_id}.json') if cache_folder else ''
+
+    def _save_snapshot(self, skill_id: str, skill_data: Dict):
+        "Remember what we deployed, so that the next delta deploy can diff against it"
+        snapshot_file = self._snapshot_path(skill_id)
+        updated = self._get_skill_updated(skill_id)
+        self.index.put(SkillTuple(skill_id, skill_data['name'], updated))
+        if not snapshot_file:
+            return
+        snapshot = dict(skill_data, workspace_id=skill_id, updated=updated)
+        tmp_file = f'{snapshot_file}.tmp'
+        with profiler.span('write snapshot', 'io', skill_id=skill_id):
+            with open(tmp_file, 'w', encoding='utf-8') as json_file:
+                json.dump(snapshot, json_file, ensure_ascii=False)
+            os.replace(tmp_file, snapshot_file)
+
+    def _deployed_skill(self, skill: SkillTuple) -> Dict:
+        "The contents of a deployed skill, from our last deploy or from its export. None if neither is current"
+        updated = self._get_skill_updated(skill.id)
+        snapshot_file = self._snapshot_path(skill.id)
+        deployed = self._get_cached(snapshot_file, updated) if snapshot_file else None
+        if deployed is None:
+            key = f'{skill.id}-{skill.name}'
+            if skill_store.enabled():
+                entry = skill_store.lookup(key)
+                if entry and entry['updated'] == updated:
+                    deployed = json.loads(skill_store.read(key).decode('utf-8'))
+            else:
+                deployed = self._get_cached(os.path.join(cfg.skills_folder(), f'{key}.json'), updated)
+        return deployed
+
+    def _delta_update_skill(self, skill: SkillTuple, new_skill: Dict) -> bool:
+        "Apply only the changes between the deployed skill and `new_skill`. None if a full update is needed"
+        deployed = self._deployed_skill(skill)
+        if deployed is None:
+            click.echo('No up to date copy of the deployed skill to compare with: updating it whole')
+            return None
+        changes = plan_delta(deployed, new_skill)
+        calls = len(changes.operations) + (1 if changes.workspace_update else 0)
+        if calls > cfg.delta_max_operations():
+            click.echo(f'{calls} changes are more than {cfg.delta_max_operations()}: updating the skill whole')
+            return None
+        click.echo(f'Applying {calls} changes')
+        success = True
+        if changes.workspace_update:
+            success = self._update_skill(dict(changes.workspace_update, workspace_id=skill.id))
+        for operation in changes.operations:
+            try:
+                response = self._call(operation.method, getattr(self.service, operation.method),
+                                      skill.id, **operation.kwargs)
+            except watson.ApiException as xcpt:
+                if _status_code(xcpt) != 404:
+                    raise
+                # The element is not the one we compared with, but the workspace may well be there
+                click.echo(f'{operation.method} - HTTP 404: updating the skill whole')
+                return None
+            success = success and response.get_status_code() in [200, 201]
+        if calls and success:
+            self._save_snapshot(skill.id, new_skill)
+        return success
+
+    def _fetch_skill_file(self, skill: SkillTuple, load: bool = True) -> Tuple[str, object, bool]:
+        """
+        Saves a skill to a file unless it is cached, and returns (path, data, cached).
+        If `load` is False, data is None: the file is not parsed.
+        """
+
+        if skill_store.enabled():
+            return self._fetch_stored_skill(skill, load)
         skill_file = os.path.join(cfg.skills_folder(), f'{skill.id}-{skill.name}.json')
-        skill_data = self._get_cached(skill_file, skill.updated_on)
-        if skill_data:
+        if self._is_cached(skill_file, skill.updated_on):
+            return (skill_file, self._get_cached(skill_file, skill.updated_on) if load else None, True)
+        # Write to a temporary file first, so that a failed download never
+        # leaves a truncated file behind that _get_cached would choke on
+        tmp_file = f'{skill_file}.tmp'
+        try:
+            with open(tmp_file, 'wb') as json_file:
+                skill_data, digest = self._download_skill(skill.id, json_file)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_file)
+            raise
+        os.replace(tmp_file, skill_file)
+        skills_index.record(skill_file, skill_data, digest)
+        if load:
+            with open(skill_file, 'r', encoding='utf-8') as json_file:
+                skill_data = json.load(json_file)
+        return (skill_file, skill_data if load else None, False)
+
+    def _fetch_stored_skill(self, skill: SkillTuple, load: bool) -> Tuple[str, object, bool]:
+        "_fetch_skill_file for the compressed store: the returned path is only written by skill_store.export"
+        key = f'{skill.id}-{skill.name}'
+        skill_file = os.path.join(cfg.skills_folder(), f'{key}.json')
+        entry = skill_store.lookup(key)
+        if entry and entry['updated'] == skill.updated_on:
+            return (skill_file, json.loads(skill_store.read(key).decode('utf-8')) if load else None, True)
+        with io.BytesIO() as contents:
+            skill_data = self._download_skill(skill.id, contents)[0]
+            skill_store.put(key, skill_data, contents.getvalue())
+            return (skill_file, json.loads(contents.getvalue().decode('utf-8')) if load else None, False)
+
+    def _get_skill_file(self, skill: SkillTuple, load: bool = True) -> Tuple[str, object]:
+        "Saves a skill to a file, and returns (path, data)"
+
+        skill_file, skill_data, cached = self._fetch_skill_file(skill, load)
+        if cached:
             click.echo(f'Using cache for skill {skill.name}-{skill.id}')
-        else:
-            skill_data = self._get_skill(skill.id)
-            with open(skill_file, 'w', encoding='utf-8') as json_file:
-                json.dump(skill_data, json_file, ensure_ascii=False, indent=4)
         return (skill_file, skill_data)
 
-    def _get_skill_tuple(self, skill_name: str, log_errors: bool = True) -> SkillTuple:
-        skills = self._list_skills()
+    def _skills_named(self, skill_name: str, fresh: bool = False) -> List[SkillTuple]:
+        "The skills with that name. The index may miss the ones created by others: list them again before giving up"
+        skills = self._list_skills() if fresh else self._indexed_skills()
         matching = [skill for skill in skills if skill.name == skill_name]
+        if len(matching) != 1 and not fresh:
+            matching = [skill for skill in self._list_skills() if skill.name == skill_name]
+        return matching
+
+    def _get_skill_tuple(self, skill_name: str, log_errors: bool = True, fresh: bool = False) -> SkillTuple:
+        "Find a skill by name. Use `fresh` when its `updated_on` must be up to date"
+        matching = self._skills_named(skill_name, fresh)
         if len(matching) == 1:
             return matching[0]
         else:
@@ -111,18 +612,15 @@ class wa(object):
     @staticmethod
     def _audit_cleanup(skill_data: Dict) -> Dict:
         "Remove the second level created/updated attributes"
-        def _remove_audit(obj):
-            if isinstance(obj, dict):
-                obj.pop('created', None)
-                obj.pop('updated', None)
-                for key, value in obj.items():
-                    obj[key] = _remove_audit(value)
-            elif isinstance(obj, list):
-                obj = [_remove_audit(value) for value in obj]
-            return obj
-        return {key: _remove_audit(value) for key, value in skill_data.items()}
+        return {key: remove_audit(value) for key, value in skill_data.items()}
 
     @staticmethod
+    def _is_cached(full_path: str, modified: str) -> bool:
+        "Check the skills index instead of parsing the file"
+        return os.path.isfile(full_path) and skills_index.lookup(full_path)['updated'] == modified
+
+    @staticmethod
+    @profiler.traced('io', 'read skill file')
     def _get_cached(full_path: str, modified: str) -> object:
         if os.path.isfile(full_path):
             with open(full_path, 'r', encoding='utf-8') as json_file:
@@ -131,16 +629,40 @@ class wa(object):
                     return cached
         return None
 
+    @staticmethod
+    def request_settings(apikey: str, url: str) -> Tuple[str, Dict, Callable[[], Dict], RequestScheduler]:
+        """
+        Service URL, query parameters, a function that returns the authorization headers, and rate limits,
+        for clients that do not use the SDK
+        """
+        service = wa(apikey, url)
+        authenticator = service.service.authenticator
+
+        def authorization() -> Dict:
+            "For each request: the IAM token expires during long runs, and the authenticator renews it"
+            request = {'headers': {}}
+            authenticator.authenticate(request)
+            return request['headers']
+
+        return (service.service.service_url, {'version': VERSION}, authorization, service.scheduler)
+
     @staticmethod
     def workspace_id_from_skill_name(apikey: str, url: str, name: str) -> str:
-        for skill_tuple in wa(apikey, url)._list_skills():
-            if skill_tuple.name == name:
-                return skill_tuple.id
-        return ''
+        matching = wa(apikey, url)._skills_named(name)
+        return matching[0].id if matching else ''
 
     @staticmethod
-    def list_skills(apikey: str, url: str, pattern: str) -> List[SkillTuple]:
-        return wa(apikey, url)._list_skills(pattern)
+    def list_skills(apikey: str, url: str, pattern: str) -> Iterator[SkillTuple]:
+        return wa(apikey, url)._iter_skills(pattern)
+
+    @staticmethod
+    def create_skill(apikey: str, url: str, skill_data: Dict) -> str:
+        "Create a skill and return its id"
+        service = wa(apikey, url)
+        response = service._call('create_workspace', service.service.create_workspace, **skill_data,
+                                 include_audit=True)
+        service._index_response(response)
+        return response.get_result()['workspace_id']
 
     @staticmethod
     def delete_skill(apikey: str, url: str, skill_id: str = '', name: str = '') -> bool:
@@ -161,9 +683,12 @@ class wa(object):
     def get_skill(apikey: str, url: str, skill_name: str) -> str:
         "Get a skill from WA or our cache and return its path"
         service = wa(apikey, url)
-        skill_tuple = service._get_skill_tuple(skill_name, log_errors=True)
+        skill_tuple = service._get_skill_tuple(skill_name, log_errors=True, fresh=True)
         if skill_tuple:
-            return service._get_skill_file(skill_tuple)[0]
+            skill_file = service._get_skill_file(skill_tuple, load=False)[0]
+            if skill_store.enabled():
+                skill_file = skill_store.export(f'{skill_tuple.id}-{skill_tuple.name}')
+            return skill_file
         else:
             return ''
 
@@ -173,13 +698,62 @@ class wa(object):
         return wa(apikey, url)._get_skill_status(skill_id=workspace_id)
 
     @staticmethod
-    def deploy_skill(apikey: str, url: str, skill_file: str, force: bool) -> bool:
+    def wait_for_skills(apikey: str, url: str, skill_names: List[str], timeout: float) -> bool:
+        """
+        Poll the status of the skills until all of them are Available, and report how long each
+        one took. Returns False if any of them is missing, fails or is not ready after `timeout` seconds
+        """
+        service = wa(apikey, url)
+        skills = {skill.name: skill.id for skill in service._indexed_skills()}
+        if any(name not in skills for name in skill_names):
+            # Maybe deployed by another process after the index was refreshed
+            skills = {skill.name: skill.id for skill in service._list_skills()}
+        start_time = time.time()
+        deadline = start_time + timeout
+        all_ready = True
+        pending = {}  # name: (next poll time, interval after it)
+        for name in skill_names:
+            if name in skills:
+                pending[name] = (start_time, POLL_INTERVAL_MIN)
+            else:
+                click.echo(f'"{name}" was not found. Not waiting.')
+                all_ready = False
+        while pending:
+            now = time.time()
+            for name, (next_poll, interval) in list(pending.items()):
+                if next_poll > now and now < deadline:
+                    continue
+                status = service._get_skill_status(skills[name])
+                if status == 'Available':
+                    click.echo(f'"{name}" is Available after {time.time() - start_time:.0f}s')
+                    del pending[name]
+                elif status in TRAINING_STATUSES:
+                    pending[name] = (time.time() + interval, min(interval * POLL_BACKOFF, POLL_INTERVAL_MAX))
+                else:
+                    click.echo(f'"{name}" status is {status}. Not waiting.')
+                    all_ready = False
+                    del pending[name]
+            if not pending:
+                break
+            if time.time() >= deadline:
+                for name in pending:
+                    click.echo(f'"{name}" readiness timed out')
+                return False
+            next_poll = min(next_poll for next_poll, _ in pending.values())
+            time.sleep(max(0, min(next_poll, deadline) - time.time()))
+        return all_ready
+
+    @staticmethod
+    def deploy_skill(apikey: str, url: str, skill_file: str, force: bool, delta: bool = False) -> bool:
+        """
+        Create or update a skill. With `delta`, an update only sends what changed since
+        the skill was last deployed or exported
+        """
         service = wa(apikey, url)
-        skills = service._list_skills()
         with open(skill_file, 'r', encoding='utf-8') as json_file:
             new_skill = json.load(json_file)
         name = new_skill['name']
-        matching = [skill for skill in skills if skill.name == name]
+        matching = service._skills_named(name)
         if len(matching) and not force:
             if not click.confirm(f'Do you want to overwrite the skill {matching[0].id}-{name} continue?',
                                  abort=True):
@@ -189,55 +763,163 @@ class wa(object):
         new_skill.pop('status', None)
         new_skill.pop('updated', None)
         if len(matching):
-            new_skill['workspace_id'] = matching[0].id
-            success = service._update_skill(new_skill)
-        else:
-            new_skill.pop('workspace_id', None)
-            success = service._create_skill(new_skill)
-        return success
+            try:
+                success = service._delta_update_skill(matching[0], new_skill) if delta else None
+                if success is None:
+                    success = service._update_skill(dict(new_skill, workspace_id=matching[0].id))
+                    if delta and success:
+                        service._save_snapshot(matching[0].id, new_skill)
+                return success
+            except watson.ApiException as xcpt:
+                if _status_code(xcpt) != 404:
+                    raise
+                # The get or update of the workspace itself, since the delta updates of its elements
+                # fall back to a full update: the index was stale, and the skill has been deleted
+                service.index.remove(matching[0].id)
+        new_skill.pop('workspace_id', None)
+        return service._create_skill(new_skill)
 
     @staticmethod
-    def delete_all_skills(apikey: str, url: str) -> bool:
+    def delete_all_skills(apikey: str, url: str, pattern: str = '', jobs: int = cfg.DEFAULT_JOBS) -> bool:
+        "Delete the skills whose name match `pattern` (all of them if empty) using `jobs` workers"
         service = wa(apikey, url)
-        skills = service._list_skills()
-        success = True
-        for skill in skills:
+        deleted, failed = [], []
+        attempted = set()
+
+        def delete(skill):
             click.echo(f'Deleting skill {skill.name}-{skill.id}...')
-            service._delete_skill(skill.id)
-        return success
+            return service._delete_skill(skill.id)
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            while True:
+                # Deleting while paginating can shift the pages under the cursor,
+                # so list again until no skill has been left behind
+                futures = {executor.submit(delete, skill): skill
+                           for skill in service._iter_skills(pattern) if skill.id not in attempted}
+                if not futures:
+                    break
+                attempted.update(skill.id for skill in futures.values())
+                for future in as_completed(futures):
+                    skill = futures[future]
+                    try:
+                        success = future.result()
+                        message = 'unexpected response'
+                    except Exception as xcpt:
+                        success = False
+                        message = getattr(xcpt, 'message', str(xcpt))
+                    if success:
+                        deleted.append(skill)
+                    else:
+                        failed.append(skill)
+                        click.secho(f'Error deleting skill {skill.name}-{skill.id}: {message}',
+                                    fg='white', bg='red')
+        click.echo(f'Deleted: {len(deleted)}   Failed: {len(failed)}')
+        return not failed
 
     @staticmethod
     def clone_service_skills(rw_apikey: str, rw_url: str,
                              ro_apikey: str, ro_url: str,
-                             force: bool) -> bool:
+                             force: bool, jobs: int = cfg.DEFAULT_JOBS) -> bool:
+        """
+        Copy the skills of the read-only service into the read-write one
+
+        The exports from the source are fed through a bounded queue to `jobs` workers
+        that create the skills in the target, so that both services are kept busy.
+        """
         src = wa(ro_apikey, ro_url)
         tgt = wa(rw_apikey, rw_url)
-        skills = src._list_skills()
-        success = True
-        for skill in skills:
-            if not force:
-                if not click.confirm(f'Do you want to copy the skill {skill.id}-{skill.name} continue?'):
-                    continue
-            skill_file, skill_data = src._get_skill_file(skill)
+        skills = src._iter_skills()
+        if not force:
+            skills = [skill for skill in skills
+                      if click.confirm(f'Do you want to copy the skill {skill.id}-{skill.name} continue?')]
+        jobs = max(1, jobs)
+        exports = queue.Queue(maxsize=jobs)
+        cloned, failed, listing_failed = [], [], []
+
+        def error(skill, action, xcpt):
+            message = getattr(xcpt, 'message', str(xcpt))
+            click.secho(f'Error {action} skill {skill.name}-{skill.id}: {message}', fg='white', bg='red')
+            failed.append(skill)
+
+        def produce():
             try:
-                skill_data['description'] = f'{skill_data["description"]} - Cloned from {skill.id}-{skill.name}'
-                tgt._create_skill(skill_data)
-                click.echo(f'Cloned skill {skill.name}-{skill.id}')
-            except watson.ApiException as xcpt:
-                click.secho(f'Error cloning skill {skill.name}-{skill.id}: {xcpt.message}', fg='white', bg='red')
-                success = False
-        return success
+                for skill in skills:
+                    try:
+                        skill_data = src._get_skill_file(skill)[1]
+                    except Exception as xcpt:
+                        error(skill, 'downloading', xcpt)
+                        continue
+                    exports.put((skill, skill_data))
+            except Exception as xcpt:
+                message = getattr(xcpt, 'message', str(xcpt))
+                click.secho(f'Error listing the skills to clone: {message}', fg='white', bg='red')
+                listing_failed.append(xcpt)
+            finally:
+                for _ in range(jobs):
+                    exports.put(None)
+
+        def consume():
+            while True:
+                item = exports.get()
+                if item is None:
+                    return
+                skill, skill_data = item
+                try:
+                    skill_data = {key: value for key, value in skill_data.items() if key not in SERVICE_KEYS}
+                    description = skill_data.get('description', '')
+                    skill_data['description'] = f'{description} - Cloned from {skill.id}-{skill.name}'
+                    if not tgt._create_skill(skill_data):
+                        raise RuntimeError('the skill was not created')
+                    cloned.append(skill)
+                    click.echo(f'Cloned skill {skill.name}-{skill.id}')
+                except Exception as xcpt:
+                    error(skill, 'cloning', xcpt)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for _ in range(jobs):
+                executor.submit(consume)
+        producer.join()
+        click.echo(f'Cloned: {len(cloned)}   Failed: {len(failed)}')
+        return not failed and not listing_failed
 
     @staticmethod
     def download_service_skills(apikey: str, url: str,
-                                force: bool) -> bool:
+                                force: bool, jobs: int = cfg.DEFAULT_JOBS) -> bool:
         service = wa(apikey, url)
-        skills = service._list_skills()
-        success = True
-        for skill in skills:
-            if not force:
-                if not click.confirm(f'Do you want to download the skill {skill.id}-{skill.name} continue?'):
+        listed = []
+
+        def list_skills():
+            for skill in service._iter_skills():
+                listed.append(skill)
+                yield skill
+
+        # With force, the skills of a page are downloaded while the next pages are listed
+        skills = list_skills()
+        if not force:
+            skills = [skill for skill in skills
+                      if click.confirm(f'Do you want to download the skill {skill.id}-{skill.name} continue?')]
+            budget = service.remaining_budget()
+            if budget.remaining is not None and budget.remaining < len(skills):
+                click.echo(f'Only {budget.remaining} API calls left before the rate limit resets: '
+                           f'downloads will be paced to stay within the budget')
+        downloaded, cached, failed = [], [], []
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(service._fetch_skill_file, skill, False): skill for skill in skills}
+            for future in as_completed(futures):
+                skill = futures[future]
+                try:
+                    from_cache = future.result()[2]
+                except Exception as xcpt:
+                    failed.append((skill, xcpt))
                     continue
-            service._get_skill_file(skill)
-            click.echo(f'Downloaded skill {skill.name}-{skill.id}')
-        return success
+                (cached if from_cache else downloaded).append(skill)
+        if skill_store.enabled():
+            # Exports of the workspaces that have been deleted, or renamed, since they were downloaded
+            skill_store.prune(f'{skill.id}-{skill.name}' for skill in listed)
+        click.echo(f'Downloaded: {len(downloaded)}   Cached: {len(cached)}   Failed: {len(failed)}')
+        for skill, xcpt in failed:
+            message = getattr(xcpt, 'message', str(xcpt))
+            click.secho(f'Error downloading skill {skill.name}-{skill.id}: {message}', fg='white', bg='red')
+        return not failed
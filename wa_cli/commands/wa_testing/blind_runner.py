@@ -0,0 +1,182 @@
+"""
+In-process blind tests
+
+Classifies the utterances of the WA-Testing-Tool blind test input file with concurrent
+message calls, and computes the accuracy, the per-intent precision and recall and the
+confusion matrix with NumPy, instead of launching run.py with pandas and matplotlib.
+"""
+
+import asyncio
+from collections import namedtuple
+import csv
+import os
+import shutil
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .flow_runner import message_sender
+
+UTTERANCE_COLUMN = 'utterance'
+GOLDEN_INTENT_COLUMN = 'golden intent'
+PREDICTED_INTENT_COLUMN = 'predicted intent'
+PREDICTED_CONFIDENCE_COLUMN = 'predicted confidence'
+OUT_COLUMNS = [UTTERANCE_COLUMN, GOLDEN_INTENT_COLUMN, PREDICTED_INTENT_COLUMN, PREDICTED_CONFIDENCE_COLUMN,
+               'detected entity', 'dialog response', 'score']
+# The label of the utterances without an intent, or classified below the confidence threshold
+OFFTOPIC_LABEL = 'SYSTEM_OUT_OF_DOMAIN'
+INPUT_FILE = 'input.csv'
+OUT_FILE = 'blind-out.csv'
+PREVIOUS_OUT_FILE = 'blind-out-previous.csv'
+
+Metrics = namedtuple('Metrics', ['labels', 'accuracy', 'precision', 'recall', 'f1', 'support', 'confusion'])
+
+
+def read_input(file_path: str) -> List[Tuple[str, str]]:
+    "The (utterance, golden intent) rows of a blind test input file, with or without a header row"
+    with open(file_path, 'r', encoding='utf-8', newline='') as csv_file:
+        lines = [line for line in csv.reader(csv_file) if line and any(cell.strip() for cell in line)]
+    if lines and lines[0][0].strip().lower() == UTTERANCE_COLUMN:
+        lines = lines[1:]
+    return [(line[0].strip(), line[1].strip() if len(line) > 1 else '') for line in lines]
+
+
+def label(intents: np.ndarray, confidences: np.ndarray, threshold: float) -> np.ndarray:
+    "The intents, or OFFTOPIC_LABEL when they are empty or their confidence is below `threshold`"
+    return np.where((intents != '') & (confidences >= threshold), intents, OFFTOPIC_LABEL)
+
+
+def metrics(golden: np.ndarray, predicted: np.ndarray) -> Metrics:
+    "Accuracy, and precision, recall, f1, support and confusion matrix by label (golden labels in rows)"
+    labels, codes = np.unique(np.concatenate([golden, predicted]), return_inverse=True)
+    count = len(golden)
+    confusion = np.zeros((len(labels), len(labels)), dtype=int)
+    np.add.at(confusion, (codes[:count], codes[count:]), 1)
+    correct = np.diag(confusion)
+    support = confusion.sum(axis=1)
+    predicted_count = confusion.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_count > 0, correct / predicted_count, 0.0)
+        recall = np.where(support > 0, correct / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return Metrics(labels, correct.sum() / count, precision, recall, f1, support, confusion)
+
+
+async def classify(utterances: List[str], send: Callable[[Dict], Awaitable[Dict]],
+                   concurrency: int) -> List[Dict]:
+    "The message results of the utterances, in order, with up to `concurrency` calls at a time"
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(utterance: str) -> Dict:
+        async with semaphore:
+            return await send({'input': {'text': utterance}})
+
+    return await asyncio.gather(*(run(utterance) for utterance in utterances))
+
+
+def out_rows(rows: List[Tuple[str, str]], results: List[Dict], threshold: float) -> List[Dict]:
+    "The rows of blind-out.csv"
+    out = []
+    for (utterance, golden_intent), result in zip(rows, results):
+        intents = result.get('intents') or []
+        intent, confidence = (intents[0]['intent'], intents[0]['confidence']) if intents else ('', 0.0)
+        predicted = intent if intent and confidence >= threshold else OFFTOPIC_LABEL
+        out.append({UTTERANCE_COLUMN: utterance,
+                    GOLDEN_INTENT_COLUMN: golden_intent,
+                    PREDICTED_INTENT_COLUMN: intent,
+                    PREDICTED_CONFIDENCE_COLUMN: confidence,
+                    'detected entity': ','.join(f'{entity["entity"]}:{entity["value"]}'
+                                                for entity in result.get('entities') or []),
+                    'dialog response': ' '.join(text for text in result.get('output', {}).get('text', []) if text),
+                    'score': int(predicted == (golden_intent or OFFTOPIC_LABEL))})
+    return out
+
+
+def read_out(file_path: str) -> List[Dict]:
+    with open(file_path, 'r', encoding='utf-8', newline='') as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def out_metrics(rows: List[Dict], threshold: float) -> Tuple[Metrics, np.ndarray]:
+    "The metrics of blind-out.csv rows, and their predicted labels"
+    golden = label(np.array([row[GOLDEN_INTENT_COLUMN] for row in rows], dtype=str), np.ones(len(rows)), 0)
+    predicted = label(np.array([row[PREDICTED_INTENT_COLUMN] for row in rows], dtype=str),
+                      np.array([float(row[PREDICTED_CONFIDENCE_COLUMN] or 0) for row in rows]), threshold)
+    return metrics(golden, predicted), predicted
+
+
+def write_reports(rows: List[Dict], result: Metrics, output_dir: str, name: str = 'blind-out',
+                  columns: List[str] = OUT_COLUMNS, separator: str = '_'):
+    """
+    Write <name>.csv, and the metrics and confusion matrix as <name>_metrics.csv and <name>_confusion.csv.
+    The separator is the one of the graphics of the same test written by the WA-Testing-Tool
+    """
+    with open(os.path.join(output_dir, f'{name}.csv'), 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(output_dir, f'{name}{separator}metrics.csv'), 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['intent', 'precision', 'recall', 'f1', 'support'])
+        writer.writerows(zip(result.labels, result.precision.round(4), result.recall.round(4),
+                             result.f1.round(4), result.support))
+    with open(os.path.join(output_dir, f'{name}{separator}confusion.csv'), 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([GOLDEN_INTENT_COLUMN] + list(result.labels))
+        writer.writerows([intent] + list(counts) for intent, counts in zip(result.labels, result.confusion))
+
+
+def print_metrics(result: Metrics):
+    print(f'{"Intent":<30} Precision  Recall  Support')
+    for intent, precision, recall, support in zip(result.labels, result.precision, result.recall, result.support):
+        print(f'{intent:<30} {precision:>9.2f}  {recall:>6.2f}  {support:>7}')
+
+
+async def _classify(apikey: str, url: str, workspace_id: str, utterances: List[str], concurrency: int) -> List[Dict]:
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await classify(utterances, message_sender(session, apikey, url, workspace_id), concurrency)
+
+
+def run(apikey: str, url: str, workspace_id: str, output_dir: str, concurrency: int, threshold: float) -> bool:
+    """
+    Classify <output_dir>/input.csv and write the reports in output_dir. The accuracy is
+    compared with the one of the previous blind-out.csv, that is kept as blind-out-previous.csv
+    """
+    input_file = os.path.join(output_dir, INPUT_FILE)
+    if not os.path.isfile(input_file):
+        raise ValueError(f'Blind test input file "{input_file}" not found')
+    rows = read_input(input_file)
+    if not rows:
+        raise ValueError(f'Blind test input file "{input_file}" is empty')
+    previous = []
+    report_file = os.path.join(output_dir, OUT_FILE)
+    if os.path.isfile(report_file):
+        previous_report = os.path.join(output_dir, PREVIOUS_OUT_FILE)
+        shutil.copyfile(report_file, previous_report)
+        previous = read_out(previous_report)
+        if previous and not all(column in previous[0] for column in OUT_COLUMNS[:4]):
+            print(f'Not comparing with {previous_report}: unexpected columns')
+            previous = []
+
+    print(f'Classifying {len(rows)} utterances...')
+    results = asyncio.run(_classify(apikey, url, workspace_id, [utterance for utterance, _ in rows], concurrency))
+    out = out_rows(rows, results, threshold)
+    result, predicted = out_metrics(out, threshold)
+    write_reports(out, result, output_dir)
+
+    summary = f'Accuracy: {result.accuracy:.2%} on {len(out)} utterances'
+    if previous:
+        previous_result, previous_predicted = out_metrics(previous, threshold)
+        summary += f' (previous run: {previous_result.accuracy:.2%}'
+        previous_by_utterance = dict(zip((row[UTTERANCE_COLUMN] for row in previous), previous_predicted))
+        changed = sum(1 for row, intent in zip(out, predicted)
+                      if row[UTTERANCE_COLUMN] in previous_by_utterance
+                      and previous_by_utterance[row[UTTERANCE_COLUMN]] != intent)
+        summary += f', {changed} predictions changed)'
+    print(summary)
+    print_metrics(result)
+    print(f'Report written to {output_dir}')
+    return True
@@ -0,0 +1,192 @@
+"""
+In-process dialog flow tests
+
+Reads the WA-Testing-Tool flow test TSV files and runs their conversations
+concurrently with asyncio over a single pooled HTTP session, instead of launching
+a flowtest.py process per file that sends one message at a time. The reports are
+its own: their columns are not the ones that flowtest.py writes.
+"""
+
+import asyncio
+import csv
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from ..helpers import profiler
+from ..wa import wa
+
+NEW_CONVERSATION = 'NEWCONVERSATION'
+INPUT_COLUMNS = ['User Input', 'Match Output', 'Match Intent', 'Match Entity', 'Alternate Intents?',
+                 'Intents Object', 'Entities Object', 'Context Variables', 'System Object']
+REPORT_COLUMNS = INPUT_COLUMNS + ['Output Text', 'Output Intent', 'Output Entities', 'Result', 'Error']
+PASS = 'PASS'
+FAIL = 'FAIL'
+
+# A conversation is a list of (row number, row) turns
+Conversation = List[Tuple[int, Dict]]
+
+
+def read_test_file(file_path: str) -> List[Dict]:
+    "The rows of a TSV test file. Files without a header row use the INPUT_COLUMNS order"
+    with open(file_path, 'r', encoding='utf-8', newline='') as tsv_file:
+        lines = list(csv.reader(tsv_file, delimiter='\t'))
+    if lines and lines[0] and lines[0][0] == INPUT_COLUMNS[0]:
+        header, lines = lines[0], lines[1:]
+    else:
+        header = INPUT_COLUMNS
+    return [{column: (line[index] if index < len(line) else '') for index, column in enumerate(header)}
+            for line in lines if any(cell.strip() for cell in line)]
+
+
+def split_conversations(rows: List[Dict]) -> List[Conversation]:
+    "Split the rows at the NEWCONVERSATION markers"
+    conversations = [[]]
+    for number, row in enumerate(rows):
+        if row['User Input'].strip() == NEW_CONVERSATION:
+            conversations.append([])
+        else:
+            conversations[-1].append((number, row))
+    return [conversation for conversation in conversations if conversation]
+
+
+def _json_cell(row: Dict, column: str) -> object:
+    cell = row.get(column, '').strip()
+    return json.loads(cell) if cell else None
+
+
+def message_body(row: Dict, context: Dict) -> Dict:
+    "The body of the message call for a turn, continuing the conversation in `context`"
+    body = {'input': {'text': row['User Input']}, 'context': dict(context)}
+    if row.get('Alternate Intents?', '').strip().lower() == 'true':
+        body['alternate_intents'] = True
+    for column, key in [('Intents Object', 'intents'), ('Entities Object', 'entities')]:
+        value = _json_cell(row, column)
+        if value is not None:
+            body[key] = value
+    body['context'].update(_json_cell(row, 'Context Variables') or {})
+    system = _json_cell(row, 'System Object')
+    if system is not None:
+        body['context']['system'] = system
+    return body
+
+
+def check_turn(row: Dict, result: Dict) -> Dict:
+    "The report row for a turn: the expectations of `row` compared with the message `result`"
+    output_text = ' '.join(text for text in result.get('output', {}).get('text', []) if text)
+    intents = result.get('intents') or []
+    output_intent = intents[0]['intent'] if intents else ''
+    output_entities = [entity['entity'] for entity in result.get('entities') or []]
+    errors = []
+    if row.get('Match Output', '').strip() and row['Match Output'].strip() != output_text.strip():
+        errors.append('output')
+    if row.get('Match Intent', '').strip() and row['Match Intent'].strip().lstrip('#') != output_intent:
+        errors.append('intent')
+    if row.get('Match Entity', '').strip() and row['Match Entity'].strip().lstrip('@') not in output_entities:
+        errors.append('entity')
+    return dict(row,
+                **{'Output Text': output_text,
+                   'Output Intent': output_intent,
+                   'Output Entities': ','.join(output_entities),
+                   'Result': FAIL if errors else PASS,
+                   'Error': f'Unexpected {", ".join(errors)}' if errors else ''})
+
+
+async def run_conversations(conversations: List[Conversation],
+                            send: Callable[[Dict], Awaitable[Dict]],
+                            concurrency: int) -> Dict[int, Dict]:
+    """
+    Run the conversations, up to `concurrency` at a time, and return the report rows by row number.
+    The turns of a conversation are sent in order; once one fails, the rest are not sent
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    report = {}
+
+    async def run(conversation: Conversation):
+        async with semaphore:
+            context = {}
+            failed = ''
+            for number, row in conversation:
+                if failed:
+                    report[number] = dict(row, Result=FAIL, Error=f'Not sent: {failed}')
+                    continue
+                try:
+                    result = await send(message_body(row, context))
+                except Exception as xcpt:
+                    failed = f'turn {number + 1} failed'
+                    report[number] = dict(row, Result=FAIL, Error=str(xcpt))
+                    continue
+                context = result.get('context') or {}
+                report[number] = check_turn(row, result)
+
+    await asyncio.gather(*(run(conversation) for conversation in conversations))
+    return report
+
+
+def write_reports(rows: List[Dict], report: Dict[int, Dict], output_dir: str, test_name: str):
+    "Write <test_name>_report.tsv and <test_name>_report.json, with the NEWCONVERSATION rows kept in place"
+    report_rows = [{column: report.get(number, row).get(column, '') for column in REPORT_COLUMNS}
+                   for number, row in enumerate(rows)]
+    with open(os.path.join(output_dir, f'{test_name}_report.tsv'), 'w', encoding='utf-8', newline='') as tsv_file:
+        writer = csv.DictWriter(tsv_file, fieldnames=REPORT_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(report_rows)
+    with open(os.path.join(output_dir, f'{test_name}_report.json'), 'w', encoding='utf-8') as json_file:
+        json.dump(report_rows, json_file, ensure_ascii=False, indent=4)
+
+
+def message_sender(session, apikey: str, url: str, workspace_id: str) -> Callable[[Dict], Awaitable[Dict]]:
+    "Send message calls with the rate limits and retries of the SDK calls"
+    service_url, params, authorization, scheduler = wa.request_settings(apikey, url)
+    endpoint = f'{service_url}/v1/workspaces/{workspace_id}/message'
+
+    async def send(body: Dict) -> Dict:
+        attempt = 0
+        while True:
+            delay = scheduler.try_acquire()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            with profiler.span('message', 'api', asynchronous=True, attempt=attempt):
+                async with session.post(endpoint, params=params, json=body,
+                                        headers=authorization()) as response:
+                    scheduler.update(response.headers)
+                    if response.status < 400:
+                        return await response.json()
+                    delay = scheduler.retry_delay(response.status, attempt)
+                    if delay < 0:
+                        raise RuntimeError(f'HTTP {response.status}: {await response.text()}')
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    return send
+
+
+async def _run_files(apikey: str, url: str, workspace_id: str, file_paths: List[str],
+                     output_dir: str, concurrency: int) -> List[int]:
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        send = message_sender(session, apikey, url, workspace_id)
+
+        async def run_file(file_path: str) -> int:
+            test_name = os.path.splitext(os.path.basename(file_path))[0]
+            rows = read_test_file(file_path)
+            report = await run_conversations(split_conversations(rows), send, concurrency)
+            write_reports(rows, report, output_dir, test_name)
+            failures = sum(1 for row in report.values() if row['Result'] != PASS)
+            print(f'{test_name}: {len(report) - failures}/{len(report)} turns passed. '
+                  f'Report written to {output_dir}')
+            return 1 if failures else 0
+
+        # The concurrency limit is shared: the connector pools the connections of all the files
+        return await asyncio.gather(*(run_file(file_path) for file_path in file_paths))
+
+
+def run(apikey: str, url: str, workspace_id: str, file_paths: List[str], output_dir: str, concurrency: int) -> int:
+    "Run the test files, and return 1 if any turn failed, 0 otherwise"
+    if not file_paths:
+        return 0
+    return_codes = asyncio.run(_run_files(apikey, url, workspace_id, file_paths, output_dir, concurrency))
+    return max(return_codes)
@@ -0,0 +1,131 @@
+"""
+In-process k-fold tests
+
+Splits the intent examples of a skill into folds, creates and trains a workspace per
+fold at the same time, and classifies the held out examples of all the folds
+concurrently, instead of running the WA-Testing-Tool folds mostly one after the other.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import random
+from typing import Dict, List, Tuple
+import uuid
+
+from ..wa import wa
+from .blind_runner import classify, out_metrics, out_rows, print_metrics, write_reports, OUT_COLUMNS
+from .flow_runner import message_sender
+
+# The same seed gives the same folds for the same examples, so that runs can be compared
+SEED = 42
+FOLD_COLUMN = 'fold_num'
+KFOLD_COLUMNS = OUT_COLUMNS + [FOLD_COLUMN]
+TRAINING_TIMEOUT = 3600
+MAX_NAME_LENGTH = 64
+
+
+def split_folds(intents: List[Dict], folds: int, seed: int = SEED) -> List[List[Tuple[str, str]]]:
+    """
+    The (example, intent) test rows of each fold. The examples of every intent are shuffled
+    and dealt to the folds in turn, so that each fold has about as many of them
+    """
+    rng = random.Random(seed)
+    tests = [[] for _ in range(folds)]
+    dealt = 0
+    for intent in sorted(intents, key=lambda intent: intent['intent']):
+        examples = sorted(example['text'] for example in intent.get('examples', []))
+        rng.shuffle(examples)
+        for text in examples:
+            tests[dealt % folds].append((text, intent['intent']))
+            dealt += 1
+    return tests
+
+
+def fold_workspace(skill: Dict, test: List[Tuple[str, str]], name: str) -> Dict:
+    "The workspace trained for a fold: the intents without the `test` examples, and the entities"
+    held_out = set((intent, text) for text, intent in test)
+    intents = [dict(intent, examples=[example for example in intent.get('examples', [])
+                                      if (intent['intent'], example['text']) not in held_out])
+               for intent in skill.get('intents', [])]
+    return {'name': name,
+            'description': f'k-fold test of {skill["name"]}',
+            'language': skill.get('language', 'en'),
+            'intents': intents,
+            'entities': skill.get('entities', []),
+            'learning_opt_out': True}
+
+
+async def _classify_folds(apikey: str, url: str, fold_tests: List[Tuple[str, List[str]]],
+                          concurrency: int) -> List[List[Dict]]:
+    import aiohttp
+
+    # The connector limits the connections of all the folds together
+    connector = aiohttp.TCPConnector(limit=max(1, concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*(classify(utterances, message_sender(session, apikey, url, workspace_id),
+                                               concurrency)
+                                      for workspace_id, utterances in fold_tests))
+
+
+def _delete_workspaces(apikey: str, url: str, workspace_ids: List[str]):
+    for workspace_id in workspace_ids:
+        try:
+            wa.delete_skill(apikey, url, skill_id=workspace_id)
+        except Exception as xcpt:
+            message = getattr(xcpt, 'message', str(xcpt))
+            print(f'Error deleting fold workspace {workspace_id}: {message}')
+
+
+def run(apikey: str, url: str, skill: Dict, folds: int, output_dir: str, concurrency: int, threshold: float) -> bool:
+    """
+    Run a k-fold test of the intents of `skill`, and write kfold-out.csv, kfold-out.metrics.csv and
+    kfold-out.confusion.csv in output_dir
+    """
+    if folds < 2:
+        raise ValueError('At least 2 folds are needed')
+    tests = split_folds(skill.get('intents', []), folds)
+    if not all(tests):
+        raise ValueError(f'Skill "{skill["name"]}" does not have enough intent examples for {folds} folds')
+    # Unique names, so that the workspaces of concurrent runs do not mix
+    run_id = uuid.uuid4().hex[:8]
+    suffix = f'__kfold-{run_id}-'
+    names = [f'{skill["name"][:MAX_NAME_LENGTH - len(suffix) - 3]}{suffix}{fold}' for fold in range(folds)]
+
+    workspace_ids = []
+    try:
+        print(f'Creating {folds} fold workspaces...')
+        with ThreadPoolExecutor(max_workers=folds) as executor:
+            futures = [executor.submit(wa.create_skill, apikey, url, fold_workspace(skill, test, name))
+                       for test, name in zip(tests, names)]
+            for future in futures:
+                try:
+                    workspace_ids.append(future.result())
+                except Exception as xcpt:
+                    # The other workspaces are still collected, so that they are deleted
+                    message = getattr(xcpt, 'message', str(xcpt))
+                    print(f'Error creating a fold workspace: {message}')
+        if len(workspace_ids) < folds:
+            raise RuntimeError('Not all the fold workspaces could be created')
+        if not wa.wait_for_skills(apikey, url, names, TRAINING_TIMEOUT):
+            raise RuntimeError('Not all the fold workspaces could be trained')
+
+        print(f'Classifying {sum(len(test) for test in tests)} examples...')
+        results = asyncio.run(_classify_folds(apikey, url,
+                                              [(workspace_id, [text for text, _ in test])
+                                               for workspace_id, test in zip(workspace_ids, tests)],
+                                              concurrency))
+    finally:
+        _delete_workspaces(apikey, url, workspace_ids)
+
+    out = []
+    for fold, (test, fold_results) in enumerate(zip(tests, results)):
+        fold_rows = out_rows(test, fold_results, threshold)
+        fold_result, _ = out_metrics(fold_rows, threshold)
+        print(f'Fold {fold}: accuracy {fold_result.accuracy:.2%} on {len(fold_rows)} examples')
+        out.extend(dict(row, **{FOLD_COLUMN: fold}) for row in fold_rows)
+    result, _ = out_metrics(out, threshold)
+    write_reports(out, result, output_dir, name='kfold-out', columns=KFOLD_COLUMNS, separator='.')
+    print(f'Accuracy: {result.accuracy:.2%} on {len(out)} examples')
+    print_metrics(result)
+    print(f'Report written to {output_dir}')
+    return True
@@ -2,6 +2,8 @@
 # spell-checker:ignore thres
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 from glob import glob
 import inspect
 import json
@@ -11,9 +13,13 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+from typing import Dict, List
 import webbrowser
 
 from ..helpers import cfg
+from ..helpers import profiler
+from ..helpers import skills_index
 from ..wa import wa
 
 
@@ -170,8 +176,9 @@ class TestingToolCoreMode(object):
             script_path,
             '--config_file', cfg_file]
         print(f'Launching {" ".join(command_line)}')
-        completed = subprocess.run(command_line,
-                                   stderr=sys.stderr, stdout=sys.stdout)
+        with profiler.span('run.py', 'wtt', config_file=cfg_file):
+            completed = subprocess.run(command_line,
+                                       stderr=sys.stderr, stdout=sys.stdout)
         if completed.returncode != 0:
             raise RuntimeError(f'Failure running {script_path}')
         return True
@@ -191,44 +198,82 @@ class TestingToolCoreMode(object):
 
 class TestingToolFlowMode(object):
 
+    _output_lock = threading.Lock()
+
+    @classmethod
+    @profiler.traced('wtt', 'flowtest.py')
+    def _run_test_file(cls, script_path: str, file_path: str, output_dir: str, env: Dict, buffered: bool,
+                       slots: threading.Semaphore = None) -> int:
+        """
+        Run a test file in its own working folder. If `buffered`, its output is printed once it completes.
+        The flowtest.py process only starts once one of the `slots`, if any, is free
+        """
+        test_name = os.path.splitext(os.path.basename(file_path))[0]
+        with slots or contextlib.nullcontext(), tempfile.TemporaryDirectory() as tmpdir:
+            command_line = [
+                sys.executable,
+                script_path,
+                file_path]
+            launching = f'Launching {" ".join(command_line)}'
+            if buffered:
+                completed = subprocess.run(command_line,
+                                           stderr=subprocess.STDOUT,
+                                           stdout=subprocess.PIPE,
+                                           env=env,
+                                           cwd=tmpdir)
+            else:
+                print(launching)
+                completed = subprocess.run(command_line,
+                                           stderr=sys.stderr,
+                                           stdout=sys.stdout,
+                                           env=env,
+                                           cwd=tmpdir)
+            for report in ['json', 'tsv']:
+                report_file = os.path.join(tmpdir, 'results', f'{test_name}_report.{report}')
+                if os.path.isfile(report_file):
+                    shutil.copy(report_file, output_dir)
+        moving = f'Moving {test_name}_report.tsv to {output_dir}'
+        if buffered:
+            with cls._output_lock:
+                print(launching)
+                sys.stdout.write(completed.stdout.decode('utf-8', errors='replace'))
+                print(moving, flush=True)
+        else:
+            print(moving)
+        return completed.returncode
+
     @classmethod
-    def run(cls, apikey: str, url: str, skill_name: str, output_dir: str) -> int:
+    def run(cls, apikey: str, url: str, skill_name: str, output_dir: str, jobs: int = 1, native: bool = False,
+            slots: threading.Semaphore = None) -> int:
         if skill_name != os.path.basename(output_dir):
             print(f'Running on a sandbox. Using skill "{skill_name}"')
         final_rc = 0
-        test_count = 0
         workspace_id = wa.workspace_id_from_skill_name(apikey, url, skill_name)
         if not workspace_id:
             raise ValueError(f'Skill "{skill_name}" not found')
-        with tempfile.TemporaryDirectory() as tmpdir:
-            env = os.environ.copy()
-            env['ASSISTANT_PASSWORD'] = apikey
-            env['ASSISTANT_URL'] = url
-            env['WORKSPACE_ID'] = workspace_id
-            script_path = os.path.join(cfg.test_scripts_folder(), 'dialog_test', 'flowtest.py')
-            for file_path in glob(os.path.join(output_dir, '*.tsv')):
-                if file_path.endswith('_report.tsv'):
-                    continue
-                test_count += 1
-                test_name = os.path.splitext(os.path.basename(file_path))[0]
-                command_line = [
-                    sys.executable,
-                    script_path,
-                    file_path]
-                print(f'Launching {" ".join(command_line)}')
-                completed = subprocess.run(command_line,
-                                           stderr=sys.stderr,
-                                           stdout=sys.stdout,
-                                           env=env,
-                                           cwd=tmpdir)
-                for report in ['json', 'tsv']:
-                    report_file = os.path.join(tmpdir, 'results', f'{test_name}_report.{report}')
-                    if os.path.isfile(report_file):
-                        shutil.copy(report_file, output_dir)
-                print(f'Moving {test_name}_report.tsv to {output_dir}')
-                if completed.returncode != 0:
-                    final_rc = completed.returncode
-        if not test_count:
+        env = os.environ.copy()
+        env['ASSISTANT_PASSWORD'] = apikey
+        env['ASSISTANT_URL'] = url
+        env['WORKSPACE_ID'] = workspace_id
+        script_path = os.path.join(cfg.test_scripts_folder(), 'dialog_test', 'flowtest.py')
+        file_paths = [file_path for file_path in sorted(glob(os.path.join(output_dir, '*.tsv')))
+                      if not file_path.endswith('_report.tsv')]
+        jobs = max(1, jobs)
+        if native:
+            from . import flow_runner
+            # Conversations, rather than files, are run `jobs` at a time
+            final_rc = flow_runner.run(apikey, url, workspace_id, file_paths, output_dir, jobs)
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                return_codes = executor.map(lambda file_path: cls._run_test_file(script_path, file_path, output_dir,
+                                                                                 env, jobs > 1 or slots is not None,
+                                                                                 slots),
+                                            file_paths)
+                # In file order, so that the combined return code does not depend on which test ends first
+                for return_code in return_codes:
+                    if return_code != 0:
+                        final_rc = return_code
+        if not file_paths:
             print('No tests have been executed', file=sys.stderr)
             final_rc = 1
         return final_rc
@@ -238,32 +283,70 @@ class wa_testing(object):
 
     @staticmethod
     def _skill_name(skill_file):
-        with open(skill_file, 'r', encoding='utf-8') as json_file:
-            return json.load(json_file)['name']
+        return skills_index.lookup(skill_file)['name']
 
     @classmethod
     def output_dir_for_skill(cls, skill_name, test_type):
         root = cfg.test_folder()
         return os.path.join(root, test_type, skill_name)
 
+    @classmethod
+    def flow_test_skills(cls) -> List[str]:
+        "Names of the skills with a folder in <project_root>/test/flow"
+        flow_folder = os.path.join(cfg.test_folder(), 'flow')
+        if not os.path.isdir(flow_folder):
+            return []
+        return sorted(name for name in os.listdir(flow_folder)
+                      if os.path.isdir(os.path.join(flow_folder, name)))
+
     @classmethod
     def k_fold(cls, apikey: str, url: str, skill_file: str, folds: int, show_graphics: bool,
-               output_dir: str = '', skill_name: str = ''):
+               output_dir: str = '', skill_name: str = '',
+               jobs: int = 10, native: bool = False):
         if not output_dir:
             name = skill_name if skill_name else cls._skill_name(skill_file)
             output_dir = cls.output_dir_for_skill(name, 'kfold')
+        if native:
+            from . import kfold_runner
+            if skill_name:
+                skill_file = wa.get_skill(apikey, url, skill_name)
+                if not skill_file:
+                    raise ValueError(f'Skill "{skill_name}" not found')
+            with open(skill_file, 'r', encoding='utf-8') as json_file:
+                skill = json.load(json_file)
+            os.makedirs(output_dir, exist_ok=True)
+            if show_graphics:
+                print('Graphics are only generated by the WA-Testing-Tool. See the kfold-out.*.csv files instead')
+            return kfold_runner.run(apikey, url, skill, folds, output_dir, jobs,
+                                    TestingToolTestFiles.defaults['conf_threshold'])
         test_files = KFoldTestFiles(apikey, url, skill_name, skill_file, folds, output_dir)
         return TestingToolCoreMode.run(test_files, show_graphics)
 
     @classmethod
-    def blind(cls, apikey: str, url: str, skill_name: str, show_graphics: bool, output_dir: str = ''):
+    def blind(cls, apikey: str, url: str, skill_name: str, show_graphics: bool, output_dir: str = '',
+              jobs: int = 10, native: bool = False):
         if not output_dir:
             output_dir = cls.output_dir_for_skill(skill_name, 'blind')
+        if native:
+            # Imported here, so that NumPy is only loaded when it is needed
+            from . import blind_runner
+            workspace_id = wa.workspace_id_from_skill_name(apikey, url, skill_name)
+            if not workspace_id:
+                raise ValueError(f'Skill "{skill_name}" not found')
+            if show_graphics:
+                print('Graphics are only generated by the WA-Testing-Tool. See the blind-out_*.csv files instead')
+            return blind_runner.run(apikey, url, workspace_id, output_dir, jobs,
+                                    TestingToolTestFiles.defaults['conf_threshold'])
         test_files = BlindTestFiles(apikey, url, skill_name, output_dir)
         return TestingToolCoreMode.run(test_files, show_graphics)
 
     @classmethod
-    def flow(cls, apikey: str, url: str, skill_name: str, output_dir: str = '') -> int:
+    def flow(cls, apikey: str, url: str, skill_name: str, output_dir: str = '',
+             jobs: int = 1, native: bool = False, slots: threading.Semaphore = None) -> int:
+        """
+        Run the flow tests of a skill, `jobs` files at a time. `slots` limits the flowtest.py
+        processes that run at once when several skills are tested concurrently
+        """
         if not output_dir:
             output_dir = cls.output_dir_for_skill(skill_name, 'flow')
-        return TestingToolFlowMode.run(apikey, url, skill_name, output_dir)
+        return TestingToolFlowMode.run(apikey, url, skill_name, output_dir, jobs, native, slots)
@@ -1,21 +1,38 @@
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from glob import glob
+import hashlib
+import importlib
 import json
 import os
 import shutil
 import subprocess
 import sys
-from typing import List
+import tempfile
+from typing import Dict, List, Tuple
 
 import click
 
 from ..helpers import cfg
+from ..helpers import profiler
+from ..helpers import skill_store
+from ..helpers import skills_index
+
+
+class _WawFolder(object):
+    "cfg.waw_target_folder(), resolved when it is used instead of when the module is imported"
+
+    def __get__(self, instance, owner) -> str:
+        return cfg.waw_target_folder()
 
 
 class workbench(object):
 
-    _root = cfg.waw_target_folder()
+    _root = _WawFolder()
+    # workspace_decompose.py stores the counterexamples as the examples of this intent
+    COUNTEREXAMPLES_INTENT = 'IRRELEVANT'
+    STAGING_PREFIX = '.staging-'
 
     @classmethod
     def _make_decompose_folders(cls, skill_name: str):
@@ -26,14 +43,98 @@ class workbench(object):
         for name in names:
             os.makedirs(os.path.join(skill_folder, name), exist_ok=True)
 
+    @staticmethod
+    def _file_digest(full_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(full_path, 'rb') as _file:
+            for chunk in iter(lambda: _file.read(1 << 16), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def _same_contents(cls, path_a: str, path_b: str) -> bool:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        return cls._file_digest(path_a) == cls._file_digest(path_b)
+
+    @classmethod
+    @profiler.traced('io', 'sync decomposed files')
+    def _sync_folders(cls, src_folder: str, tgt_folder: str) -> Tuple[int, int, int]:
+        """
+        Make tgt_folder look like src_folder touching only the files whose contents differ.
+        Changed files are moved atomically from src_folder. Returns (written, deleted, unchanged)
+        """
+        written, deleted, unchanged = 0, 0, 0
+        expected = set()
+        for folder, _, files in os.walk(src_folder):
+            relative_folder = os.path.relpath(folder, src_folder)
+            os.makedirs(os.path.join(tgt_folder, relative_folder), exist_ok=True)
+            for file_name in files:
+                relative_path = os.path.normpath(os.path.join(relative_folder, file_name))
+                expected.add(relative_path)
+                src_path = os.path.join(src_folder, relative_path)
+                tgt_path = os.path.join(tgt_folder, relative_path)
+                if os.path.isfile(tgt_path) and cls._same_contents(src_path, tgt_path):
+                    unchanged += 1
+                else:
+                    os.replace(src_path, tgt_path)
+                    written += 1
+        for folder, _, files in os.walk(tgt_folder, topdown=False):
+            relative_folder = os.path.relpath(folder, tgt_folder)
+            for file_name in files:
+                relative_path = os.path.normpath(os.path.join(relative_folder, file_name))
+                if relative_path not in expected:
+                    os.remove(os.path.join(folder, file_name))
+                    deleted += 1
+            if folder != tgt_folder and not os.path.isdir(os.path.join(src_folder, relative_folder)) \
+                    and not os.listdir(folder):
+                os.rmdir(folder)
+        return (written, deleted, unchanged)
+
     @classmethod
     def _make_reassemble_folder(cls, skill_name: str) -> str:
         folder = os.path.join(cls._root, 're-assembled', skill_name)
         os.makedirs(folder, exist_ok=True)
         return folder
 
+    @staticmethod
+    def _in_process() -> bool:
+        """
+        Whether the WAW scripts are run in this interpreter, with WA_WAW_IN_PROCESS=1. It is not the
+        default until its output has been compared with the one of the subprocesses on a real WAW checkout,
+        see test_workbench.py
+        """
+        return os.environ.get('WA_WAW_IN_PROCESS', '').lower() not in ['', '0', 'false', 'no']
+
+    @classmethod
+    def _run_waw_main(cls, script_name: str, params: List[str]):
+        "Run the main() of a WAW script in this interpreter, so that its imports are only paid once"
+        scripts_folder = cfg.waw_scripts_folder()
+        # Appended, so that the WAW modules cannot shadow the installed ones
+        added = scripts_folder not in sys.path
+        if added:
+            sys.path.append(scripts_folder)
+        print(f'===> (in-process) {script_name} {" ".join(params)}')
+        try:
+            module = importlib.import_module(os.path.splitext(script_name)[0])
+            module.main(params)
+        except SystemExit as xcpt:
+            if xcpt.code:
+                raise RuntimeError(f'Failure in waw {script_name}') from xcpt
+        finally:
+            if added:
+                sys.path.remove(scripts_folder)
+
     @classmethod
-    def _run_waw_script(cls, script_name: str, params: List[str]):
+    def _run_waw_script(cls, script_name: str, params: List[str], in_process: bool = False):
+        with profiler.span(script_name, 'waw', in_process=in_process):
+            cls._run_waw_command(script_name, params, in_process)
+
+    @classmethod
+    def _run_waw_command(cls, script_name: str, params: List[str], in_process: bool):
+        if in_process:
+            cls._run_waw_main(script_name, params)
+            return
         command_line = [
             sys.executable,
             os.path.join(cfg.waw_scripts_folder(), script_name)]
@@ -58,33 +159,56 @@ class workbench(object):
         with open(meta_full_path, 'w', encoding='utf-8') as json_file:
             json.dump(meta, json_file, ensure_ascii=False, indent=4)
 
+    @classmethod
+    @profiler.traced('io', 'write skill sections')
+    def _split_skill(cls, skill_data: dict, skill_name: str, meta: dict):
+        """
+        Write the wa_json files that workspace_decompose.py writes in _to_smaller_json_files,
+        from the skill we have already parsed. The WAW converters read them back
+        """
+        sections = {
+            'intents': skill_data['intents'],
+            'counterexamples': [{'intent': cls.COUNTEREXAMPLES_INTENT,
+                                 'examples': skill_data['counterexamples']}],
+            'entities': skill_data['entities'],
+            'dialog': skill_data['dialog_nodes'],
+        }
+        for name, section in sections.items():
+            section_path = os.path.join(cls._root, skill_name, 'wa_json', f'{name}.json')
+            with open(section_path, 'w', encoding='utf-8') as json_file:
+                json.dump(section, json_file, ensure_ascii=False, indent=4)
+        meta_full_path = os.path.join(cls._root, skill_name, 'meta.json')
+        with open(meta_full_path, 'w', encoding='utf-8') as json_file:
+            json.dump(meta, json_file, ensure_ascii=False, indent=4)
+
     @classmethod
     def _run_to_csv_script(cls,
                            skill_name: str,
                            script_name: str,
-                           types_of_files: List[str]):
+                           types_of_files: List[str],
+                           in_process: bool = False):
 
         for type_of_file in types_of_files:
             cls._run_waw_script(script_name, [
                 os.path.join(cls._root, skill_name, 'wa_json', f'{type_of_file}.json'),
                 os.path.join(cls._root, skill_name, f'{type_of_file}')
-            ])
+            ], in_process)
 
     @classmethod
-    def _to_csv_intents(cls, skill_name: str):
-        cls._run_to_csv_script(skill_name, 'intents_json2csv.py', ['intents', 'counterexamples'])
+    def _to_csv_intents(cls, skill_name: str, in_process: bool = False):
+        cls._run_to_csv_script(skill_name, 'intents_json2csv.py', ['intents', 'counterexamples'], in_process)
 
     @classmethod
-    def _to_csv_entities(cls, skill_name: str):
-        cls._run_to_csv_script(skill_name, 'entities_json2csv.py', ['entities'])
+    def _to_csv_entities(cls, skill_name: str, in_process: bool = False):
+        cls._run_to_csv_script(skill_name, 'entities_json2csv.py', ['entities'], in_process)
 
     @classmethod
-    def _to_xml_dialog(cls, skill_name: str):
+    def _to_xml_dialog(cls, skill_name: str, in_process: bool = False):
         # Cannot use _run_to_csv_script because it has an additional flag
         cls._run_waw_script('dialog_json2xml.py', [
             os.path.join(cls._root, skill_name, 'wa_json', 'dialog.json'),
             '--dialogDir', os.path.join(cls._root, skill_name, 'dialog')
-        ])
+        ], in_process)
 
     @classmethod
     def _reassemble_dialog(cls, skill_name: str, tgt_folder: str):
@@ -147,24 +271,41 @@ class workbench(object):
                              'language',
                              'description']
         skill_file = os.path.join(tgt_folder, 'skill.json')
-        with open(skill_file, 'r', encoding='utf-8') as json_file:
-            skill_dict = json.load(json_file)
-        skill_dict['learning_opt_out'] = meta['learning_opt_out']
-        skill_dict['system_settings'] = meta['system_settings']
-        ordered = OrderedDict([(key, skill_dict[key]) for key in preferred_sorting if key in skill_dict])
-        with open(skill_file, 'w', encoding='utf-8') as json_file:
-            json.dump(ordered, json_file, ensure_ascii=False, indent=2)
-
-    @classmethod
-    def _get_skill_meta(cls, full_path: str) -> str:
-        with open(full_path, 'r', encoding='utf-8') as json_file:
-            cached = json.load(json_file)
-            meta = {key: cached[key] for key in ['description',
+        with profiler.span('rewrite skill.json', 'io', path=skill_file):
+            with open(skill_file, 'r', encoding='utf-8') as json_file:
+                skill_dict = json.load(json_file)
+            skill_dict['learning_opt_out'] = meta['learning_opt_out']
+            skill_dict['system_settings'] = meta['system_settings']
+            ordered = OrderedDict([(key, skill_dict[key]) for key in preferred_sorting if key in skill_dict])
+            with open(skill_file, 'w', encoding='utf-8') as json_file:
+                json.dump(ordered, json_file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _meta_from_skill(skill_data: dict) -> dict:
+        return {key: skill_data[key] for key in ['description',
                                                  'language',
                                                  'learning_opt_out',
                                                  'name',
                                                  'system_settings']}
-            return meta
+
+    @classmethod
+    def _get_skill_meta(cls, full_path: str) -> dict:
+        return skills_index.lookup(full_path)['meta']
+
+    @classmethod
+    def _decompose_in_process(cls, skill_data: dict, skill_name: str, meta: dict):
+        "Run the WAW converters in this interpreter instead of spawning one for each of them"
+        cls._split_skill(skill_data, skill_name, meta)
+        cls._to_csv_intents(skill_name, in_process=True)
+        cls._to_csv_entities(skill_name, in_process=True)
+        cls._to_xml_dialog(skill_name, in_process=True)
+
+    @classmethod
+    def _decompose_with_subprocesses(cls, full_path: str, skill_name: str, meta: dict):
+        cls._to_smaller_json_files(full_path, skill_name, meta)
+        cls._to_csv_intents(skill_name)
+        cls._to_csv_entities(skill_name)
+        cls._to_xml_dialog(skill_name)
 
     @classmethod
     def decompose_skill_file(cls, full_path: str, skill_name: str = '') -> bool:
@@ -172,30 +313,82 @@ class workbench(object):
         Decompose a skill with WAW. Use the internal name as the target folder, or the one supplied.
         """
         full_path = os.path.abspath(full_path)
-        meta = cls._get_skill_meta(full_path)
+        with profiler.span('read skill file', 'io', path=full_path):
+            with open(full_path, 'r', encoding='utf-8') as json_file:
+                skill_data = json.load(json_file)
+        meta = cls._meta_from_skill(skill_data)
         if not skill_name:
             skill_name = meta['name']
-        cls._make_decompose_folders(skill_name)
-        cls._to_smaller_json_files(full_path, skill_name, meta)
-        cls._to_csv_intents(skill_name)
-        cls._to_csv_entities(skill_name)
-        cls._to_xml_dialog(skill_name)
+        # Decompose into a staging folder next to the target one, so that the helpers that build
+        # their paths from _root can be used as they are, and the files can be moved atomically
+        os.makedirs(cls._root, exist_ok=True)
+        staging_folder = tempfile.mkdtemp(prefix=cls.STAGING_PREFIX, dir=cls._root)
+        staging_name = os.path.basename(staging_folder)
+        try:
+            cls._make_decompose_folders(staging_name)
+            decomposed = False
+            if cls._in_process():
+                try:
+                    cls._decompose_in_process(skill_data, staging_name, meta)
+                    decomposed = True
+                except Exception as xcpt:
+                    click.secho(f'In-process decomposition failed ({xcpt}). Using WAW subprocesses.',
+                                fg='yellow', err=True)
+                    cls._make_decompose_folders(staging_name)
+            if not decomposed:
+                cls._decompose_with_subprocesses(full_path, staging_name, meta)
+            written, deleted, unchanged = cls._sync_folders(staging_folder,
+                                                            os.path.join(cls._root, skill_name))
+        finally:
+            shutil.rmtree(staging_folder, ignore_errors=True)
+        click.echo(f'{skill_name}: {written} files written, {deleted} deleted, {unchanged} unchanged')
         return True
 
     @classmethod
-    def decompose_all_skill_files(cls, force) -> bool:
+    def decompose_all_skill_files(cls, force, jobs: int = cfg.DEFAULT_JOBS) -> bool:
+        """
+        Decompose the files in the skills folder, using `jobs` processes
+        """
+        stored_keys = skill_store.keys() if skill_store.enabled() else []
+        # The stored exports are written to a temporary folder instead of the skills folder
+        with skill_store.exported(stored_keys) as stored_paths:
+            return cls._decompose_paths(stored_paths, stored_keys, force, jobs)
+
+    @classmethod
+    def _decompose_paths(cls, stored_paths: List[str], stored_keys: List[str], force, jobs: int) -> bool:
         pattern = os.path.join(cfg.skills_folder(), '*.json')
-        for file_path in glob(pattern):
+        # Skip the plain copies of the stored exports, written when a command needed them
+        file_paths = [file_path for file_path in sorted(glob(pattern))
+                      if os.path.basename(file_path)[:-len('.json')] not in stored_keys]
+        by_folder = OrderedDict()
+        for file_path in sorted(file_paths + stored_paths):
+            dir_name = cls._get_skill_meta(file_path)['name']
             if not force:
-                dir_name = cls._get_skill_meta(file_path)['name']
-                dir_name = os.path.join(cfg.WAW_FOLDER, dir_name)
                 file_name = os.path.basename(file_path)
                 if not click.confirm(f'\nDo you want to use Watson Assistant Workbench\n'
                                      f'to decompose file "{file_name}"\n'
-                                     f'into folder "{dir_name}"?',
+                                     f'into folder "{os.path.join(cfg.WAW_FOLDER, dir_name)}"?',
                                      default=True):
                     continue
-            cls.decompose_skill_file(file_path)
+            # Files that target the same folder are decomposed one after the other
+            by_folder.setdefault(dir_name, []).append(file_path)
+
+        failed = []
+        with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(_decompose_files, file_paths, profiler.worker_start()): file_paths
+                       for file_paths in by_folder.values()}
+            for future in as_completed(futures):
+                try:
+                    errors, events = future.result()
+                    profiler.merge(events)
+                except Exception as xcpt:
+                    errors = [(file_path, str(xcpt)) for file_path in futures[future]]
+                failed.extend(errors)
+        for file_path, error in failed:
+            click.secho(f'Error decomposing "{os.path.basename(file_path)}": {error}', fg='white', bg='red')
+        decomposed = sum(len(file_paths) for file_paths in by_folder.values()) - len(failed)
+        click.echo(f'Decomposed: {decomposed}   Failed: {len(failed)}')
+        return not failed
 
     @classmethod
     def reassemble_skill_file(cls,
@@ -219,3 +412,22 @@ class workbench(object):
         cls._reassemble_intents(skill_name, tgt_folder)
         cls._reassemble_reassembled_json_files(skill_name, tgt_folder)
         return tgt_file
+
+
+def _decompose_files(file_paths: List[str], profile_start: float = None) -> Tuple[List[Tuple[str, str]], List[Dict]]:
+    """
+    Process pool entry point: decompose the files in order, and return (file_path, error) for the failed
+    ones, and the spans recorded if the profile started at `profile_start` is on
+    """
+    if profile_start is not None:
+        profiler.start_worker(profile_start)
+    errors = []
+    try:
+        for file_path in file_paths:
+            try:
+                workbench.decompose_skill_file(file_path)
+            except Exception as xcpt:
+                errors.append((file_path, str(xcpt)))
+    finally:
+        events = profiler.worker_events() if profile_start is not None else []
+    return errors, events
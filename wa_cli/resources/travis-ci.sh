@@ -0,0 +1,29 @@
+#!/bin/bash
+#
+# Deploys, waits for readiness, tests and cleans up the skills in ./test/flow
+# in a single wa-cli process
+# Relies on the following env vars:
+#   DEPLOY_MAIN_BRANCH
+#   TRAINING_TIMEOUT_IN_SECONDS
+#   WA_URL
+#   WA_APIKEY
+#   TRAVIS_*
+#
+
+export PYTHONUNBUFFERED=TRUE
+
+MAIN_BRANCH=$(cat ./.wa-cli/main_branch.txt)
+wa-cli init --no-prompt --main-branch "${MAIN_BRANCH}"
+echo TRAVIS_BRANCH="$TRAVIS_BRANCH"
+echo TRAVIS_PULL_REQUEST_BRANCH="$TRAVIS_PULL_REQUEST_BRANCH"
+echo TRAVIS_PULL_REQUEST="$TRAVIS_PULL_REQUEST"
+
+CI_OPTIONS=(--timeout "$TRAINING_TIMEOUT_IN_SECONDS")
+if [[ "$DEPLOY_MAIN_BRANCH" == TRUE ]]; then
+    CI_OPTIONS+=(--deploy-main)
+fi
+# Only the sandboxes created to run PRs are deleted
+if [[ -n "${TRAVIS_PULL_REQUEST_BRANCH}" ]]; then
+    CI_OPTIONS+=(--cleanup)
+fi
+wa-cli ci run "${CI_OPTIONS[@]}"